@@ -2,44 +2,118 @@
 # coding=UTF-8
 
 import argparse
+import base64
+import difflib
 import getpass
 import json
 import logging
+import math
 import os
+import random
 import re
+import shutil
+import sqlite3
+import threading
 import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Optional
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
 
 import requests
+from lxml import etree, html
 from requests import Response
 from requests.adapters import HTTPAdapter
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    TimeoutException,
+    WebDriverException,
+)
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
+from urllib3.util import Retry
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.core.download_manager import WDMDownloadManager
 from webdriver_manager.core.http import HttpClient
 from webdriver_manager.core.logger import log
-from webdriver_manager.core.os_manager import ChromeType
+from webdriver_manager.core.os_manager import ChromeType, OperationSystemManager
 
 TIMEFORMAT = "%H:%M"
 
+# weekly trainings are looked up this many weeks ahead in one pass over the Sportfahrplan
+LOOKAHEAD_DEFAULT_WEEKS = 4
+
 LESSON_BASE_URL = "https://schalter.asvz.ch"
+LESSON_API_PATH = "/tn-api/api"
+# profile of the logged in member, the cheapest request that needs a valid access token
+MEMBER_API_PATH = "MemberPerson"
+# matches lesson urls like https://schalter.asvz.ch/tn/lessons/200949
+LESSON_URL_REGEX = re.compile(
+    r"^(?P<base>https?://[^/]+)/tn/(?P<kind>lessons|events)/(?P<id>\d+)"
+)
+# schalter API resource name per lesson url kind
+LESSON_API_RESOURCES = {"lessons": "Lessons", "events": "Events"}
 
 SPORTFAHRPLAN_BASE_URL = "https://asvz.ch/426-sportfahrplan"
+SPORTFAHRPLAN_DAY_XPATH = "//div[@class='teaser-list-calendar__day']"
+
+SPORTFAHRPLAN_FILTER_REGEX = re.compile(r"^f\[\d+\]$")
+
+CATALOG_FILENAME = ".asvz-bot-catalog.json"
+# format of the catalog file, catalogs of another format are ignored until they are synced again
+CATALOG_VERSION = 1
+CATALOG_MAX_AGE_DAYS = 30
+# Sportfahrplan filter -> catalog section
+CATALOG_FACETS = {"sport": "sports", "facility": "facilities", "niveau": "levels"}
+CATALOG_SECTION_NAMES = {"sports": "sport", "facilities": "facility", "levels": "level"}
+
+LOOKUP_CACHE_FILENAME = ".asvz-bot-lookup.json"
+LOOKUP_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+JOB_STORE_FILENAME = ".asvz-bot.db"
+JOB_STORE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 CREDENTIALS_FILENAME = ".asvz-bot.json"
 CREDENTIALS_ORG = "organisation"
 CREDENTIALS_UNAME = "username"
 CREDENTIALS_PW = "password"
 
+DRIVER_MANIFEST_FILENAME = ".asvz-bot-driver.json"
+# browser binaries, whose modification indicates a browser update
+BROWSER_BINARIES = {
+    ChromeType.CHROMIUM: [
+        "chromium",
+        "chromium-browser",
+        "/Applications/Chromium.app/Contents/MacOS/Chromium",
+    ],
+    ChromeType.GOOGLE: [
+        "google-chrome",
+        "google-chrome-stable",
+        "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    ],
+}
+
+IDP_CACHE_FILENAME = ".asvz-bot-idp.json"
+# the SWITCH organisation picker remembers the selected IdPs in this cookie
+SAML_IDP_COOKIE = "_saml_idp"
+
+SESSION_CACHE_FILENAME = ".asvz-bot-session.json"
+# fallback lifetime of a cached session, if neither the access token nor the cookies expire
+SESSION_CACHE_DEFAULT_TTL_SECONDS = 60 * 60
+# only the cookies of the schalter (or the origin of the lesson url) and its login server hold the session,
+# trackers and IdP cookies expire on their own schedule
+SESSION_COOKIE_HOSTS = ["schalter.asvz.ch", "auth.asvz.ch"]
+
 ETH_ORGANISATION_NAME = "ETH Zürich"
 UZH_ORGANISATION_NAME = "Universität Zürich"
 ZHAW_ORGANISATION_NAME = "ZHAW - Zürcher Hochschule für Angewandte Wissenschaften"
@@ -57,6 +131,17 @@ ORGANISATIONS = {
     "EDUID": SWITCH_EDUID_ORGANISATION_NAME,
 }
 
+# enrollment backends
+# no browser is started ahead by default, runs that never need one (cached http session, batch of http jobs) should not pay for Chrome
+BROWSER_POOL_DEFAULT_SIZE = 0
+BROWSER_POOL_DEFAULT_MAX_SIZE = 4
+# a browser is restarted after this many uses, to not accumulate memory over a long running daemon
+BROWSER_POOL_MAX_USES = 20
+
+BACKEND_BROWSER = "browser"  # drive the schalter web app with headless Chrome
+BACKEND_HTTP = "http"  # talk to the schalter API directly after a single login
+BACKENDS = [BACKEND_BROWSER, BACKEND_HTTP]
+
 WEEKDAYS = {
     "Mo": "Monday",
     "Tu": "Tuesday",
@@ -97,6 +182,34 @@ class EnvVariables:
     # Enrollment type, e.g. training, lesson, event
     enrollment_type: Optional[str] = os.environ.get("ASVZ_ENROLLMENT_TYPE")
 
+    # Enrollment backend, e.g. browser, http
+    backend: Optional[str] = os.environ.get("ASVZ_BACKEND")
+    lead_time_ms: Optional[str] = os.environ.get("ASVZ_LEAD_TIME_MS")
+    hedge_attempts: Optional[str] = os.environ.get("ASVZ_HEDGE_ATTEMPTS")
+    hedge_stagger_ms: Optional[str] = os.environ.get("ASVZ_HEDGE_STAGGER_MS")
+
+    # Weeks to look ahead for the lessons of trainings
+    lookahead_weeks: Optional[str] = os.environ.get("ASVZ_LOOKAHEAD_WEEKS")
+
+    # Lean browser, e.g. true, false
+    lean_browser: Optional[str] = os.environ.get("ASVZ_LEAN_BROWSER")
+
+    # Wait timeouts in seconds
+    page_timeout: Optional[str] = os.environ.get("ASVZ_PAGE_TIMEOUT")
+    login_timeout: Optional[str] = os.environ.get("ASVZ_LOGIN_TIMEOUT")
+    enrollment_timeout: Optional[str] = os.environ.get("ASVZ_ENROLLMENT_TIMEOUT")
+
+    # Read the API responses of the web app through DevTools, e.g. true, false
+    capture_network: Optional[str] = os.environ.get("ASVZ_CAPTURE_NETWORK")
+
+    # Browser pool
+    browser_pool_size: Optional[str] = os.environ.get("ASVZ_BROWSER_POOL_SIZE")
+    browser_pool_max_size: Optional[str] = os.environ.get("ASVZ_BROWSER_POOL_MAX_SIZE")
+
+    # Metrics export
+    metrics_file: Optional[str] = os.environ.get("ASVZ_METRICS_FILE")
+    prometheus_file: Optional[str] = os.environ.get("ASVZ_PROMETHEUS_FILE")
+
     # Credential values
     cred_organization: Optional[str] = os.environ.get("ASVZ_ORGANIZATION")
     cred_username: Optional[str] = os.environ.get("ASVZ_USERNAME")
@@ -106,6 +219,18 @@ class EnvVariables:
     # Lesson values
     lesson_id: Optional[str] = os.environ.get("ASVZ_LESSON_ID")
 
+    # Batch values
+    job_file: Optional[str] = os.environ.get("ASVZ_JOB_FILE")
+
+    # Waitlist values
+    waitlist_file: Optional[str] = os.environ.get("ASVZ_WAITLIST_FILE")
+
+    # Accounts values
+    accounts_file: Optional[str] = os.environ.get("ASVZ_ACCOUNTS_FILE")
+
+    # Daemon values
+    schedule_file: Optional[str] = os.environ.get("ASVZ_SCHEDULE_FILE")
+
     # Training values
     week_day: Optional[str] = os.environ.get("ASVZ_WEEKDAY")
     start_time: Optional[str] = os.environ.get("ASVZ_START_TIME")
@@ -125,37 +250,239 @@ ISSUES_URL = "https://github.com/fbuetler/asvz-bot/issues"
 NO_SUCH_ELEMENT_ERR_MSG = f"Element on website not found! This may happen when the website was updated recently. Please report this incident to: {ISSUES_URL}"
 
 LESSON_ENROLLMENT_NUMBER_REGEX = re.compile(r".*Du\shast\sdie\sPlatz\-Nr\.\s(\d+).*")
+LESSON_ENROLLMENT_SUCCESS_TEXT = "Du hast dich erfolgreich eingeschrieben"
+# dates on the lesson page are like 'Mo, 04.12.2023 10:00 - Di, 26.12.2023 23:59' or 'Mo, 10.05.2021 06:55 - 08:05'
+PAGE_DATE_REGEX = re.compile(r"\d{2}\.\d{2}\.\d{4}")
+PAGE_TIME_REGEX = re.compile(r"\d{2}:\d{2}")
+
+# the rendered page is read in one round trip and parsed locally
+LESSON_SNAPSHOT_SCRIPT = "return document.documentElement.outerHTML;"
+
+# The schalter web app keeps the OIDC user (incl. the bearer token for the API) in the browser storage
+ACCESS_TOKEN_SCRIPT = """
+for (const storage of [window.sessionStorage, window.localStorage]) {
+    for (let i = 0; i < storage.length; i++) {
+        const key = storage.key(i);
+        if (key.startsWith("oidc.user")) {
+            const user = JSON.parse(storage.getItem(key));
+            return user.access_token;
+        }
+    }
+}
+return null;
+"""
+
+# Fetches a url from the page over the connections of the browser, arguments: url, callback
+PREWARM_SCRIPT = """
+const done = arguments[arguments.length - 1];
+fetch(arguments[0], {cache: "no-store"}).then(
+    (response) => done(response.status),
+    (error) => done(String(error)),
+);
+"""
+
+ENROLLMENT_STATUS_ENROLLED = "enrolled"
+ENROLLMENT_STATUS_ALREADY_ENROLLED = "already_enrolled"
+ENROLLMENT_STATUS_REJECTED = "rejected"
+
+# job states in the job store, besides the enrollment states
+JOB_STATUS_WAITING = "waiting"
+JOB_STATUS_FAILED = "failed"
+# jobs in these states are skipped on the next run
+JOB_FINISHED_STATUSES = (ENROLLMENT_STATUS_ENROLLED, ENROLLMENT_STATUS_ALREADY_ENROLLED)
+
+# how long to keep retrying a rejected enrollment request right after the enrollment opened
+ENROLLMENT_OPENING_GRACE_SECONDS = 10
+ENROLLMENT_RETRY_INTERVAL_SECONDS = 0.1
+
+# the most enrollment requests sent at once at the opening (http backend)
+MAX_HEDGE_ATTEMPTS = 8
+
+LOGIN_BUTTON_XPATH = "//button[@class='btn btn-default' and @title='Login'] | //a[@class='btn btn-default' and @title='Login & Anmelden']"
+
+# The OIDC entries of the browser storage, restored together with the cookies of a cached session
+STORAGE_SNAPSHOT_SCRIPT = """
+const snapshot = {};
+for (const name of ["sessionStorage", "localStorage"]) {
+    snapshot[name] = {};
+    for (let i = 0; i < window[name].length; i++) {
+        const key = window[name].key(i);
+        if (key.startsWith("oidc.")) {
+            snapshot[name][key] = window[name].getItem(key);
+        }
+    }
+}
+return snapshot;
+"""
+# Runs before the scripts of each page, arguments: origin, storage snapshot
+STORAGE_RESTORE_SCRIPT = """
+(function (origin, snapshot) {
+    if (window.location.origin !== origin) {
+        return;
+    }
+    for (const [name, entries] of Object.entries(snapshot)) {
+        for (const [key, value] of Object.entries(entries)) {
+            if (window[name].getItem(key) === null) {
+                window[name].setItem(key, value);
+            }
+        }
+    }
+})(%s, %s);
+"""
+
+# keep the login session alive while waiting for the enrollment to open
+SESSION_KEEPALIVE_INTERVAL_SECONDS = 15 * 60
+# reopen the connections this long before the enrollment opens, idle connections may have been closed
+# by the server or the proxy while waiting, and the handshakes should not delay the enrollment request
+CONNECTION_PREWARM_SECONDS = 5
+# an access token must be valid at least this long after the enrollment opened
+SESSION_REFRESH_MARGIN_SECONDS = 5 * 60
+
+# polling of booked out lessons: fast right after the enrollment opened and shortly before the lesson starts,
+# when most places are freed up, otherwise backing off exponentially as long as the lesson does not change
+FREE_PLACES_MIN_POLL_SECONDS = 1
+FREE_PLACES_MAX_POLL_SECONDS = 30
+FREE_PLACES_OPENING_WINDOW_SECONDS = 5 * 60
+FREE_PLACES_LESSON_START_WINDOW_SECONDS = 60 * 60
+FREE_PLACES_POLL_JITTER = 0.2
+
+# the waitlist watcher polls all lessons with this many requests per minute at most
+WAITLIST_DEFAULT_REQUESTS_PER_MINUTE = 60
+
+# the daemon starts an enrollment (login check, keepalive) this long before the enrollment opens
+DAEMON_PREPARE_SECONDS = 10 * 60
+# the daemon wakes up at least this often to reload its schedule and retry failed lookups
+DAEMON_RESCAN_INTERVAL_SECONDS = 15 * 60
+
+# server clock estimation: the Date header has a resolution of one second, therefore we sample
+# until we observe the server clock ticking over to the next second
+CLOCK_SAMPLE_INTERVAL_SECONDS = 0.02
+CLOCK_MAX_SAMPLES = 80
+# concurrent jobs share the offset to a server, it is only estimated again once older than this
+CLOCK_MAX_AGE_SECONDS = 60
+# the last part of a precise sleep is spent busy waiting, as time.sleep may oversleep
+SPIN_WAIT_SECONDS = 0.002
+
+# all HTTP sessions of the process share keep-alive connection pools, see http_session
+HTTP_POOL_MAXSIZE = 32
+HTTP_TIMEOUT_SECONDS = 10
+# lookups retry with backoff, failed requests to the schalter API are handled by their callers,
+# only connections that could not be opened are retried, as the request was not sent yet
+HTTP_LOOKUP_RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=("GET", "HEAD"),
+    raise_on_status=False,
+)
+HTTP_API_RETRY = Retry(total=2, connect=2, read=0, status=0, other=0)
+
+METRICS_PREFIX = "asvz_bot"
+
+# the lean browser only resolves the hosts of ASVZ and the login providers
+LEAN_BROWSER_ALLOWED_HOSTS = [
+    "asvz.ch",
+    "*.asvz.ch",
+    "*.switch.ch",
+    "*.eduid.ch",
+    "*.ethz.ch",
+    "*.uzh.ch",
+    "*.zhaw.ch",
+    "*.phzh.ch",
+    "localhost",
+]
+# and blocks images, fonts and trackers through DevTools, also when using a proxy
+LEAN_BROWSER_BLOCKED_URLS = [
+    "*.png*",
+    "*.jpg*",
+    "*.jpeg*",
+    "*.gif*",
+    "*.svg*",
+    "*.webp*",
+    "*.ico*",
+    "*.woff*",
+    "*.ttf*",
+    "*.otf*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*hotjar.com*",
+]
 
 
 class AsvzBotException(Exception):
     pass
 
 
+class LessonNotFoundException(AsvzBotException):
+    exit_code = 1
+
+
+class NoLessonOnDateException(LessonNotFoundException):
+    exit_code = 2
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    Adapter with a default timeout, which is shared by the sessions of the whole process unless it is dedicated.
+    """
+
+    def __init__(self, max_retries, shared=True, timeout=HTTP_TIMEOUT_SECONDS):
+        super().__init__(pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=max_retries)
+        self.shared = shared
+        self.timeout = timeout
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+    def close(self):
+        # closing one of the sessions must not drop the connections of the others
+        if not self.shared:
+            super().close()
+
+
+# retry policy -> adapter shared by all sessions with this policy
+_http_adapters = {}
+_http_adapters_lock = threading.Lock()
+
+
+def http_session(proxy_url=None, retry=HTTP_LOOKUP_RETRY, dedicated=False):
+    """
+    Returns a new session with its own cookies, headers and proxy, whose connections are kept alive
+    in a pool shared by all sessions of the process with the same retry policy.
+    A dedicated session gets a pool of its own, e.g. to hold a warm connection that nobody else uses.
+    """
+    if dedicated:
+        adapter = PooledHTTPAdapter(retry, shared=False)
+    else:
+        with _http_adapters_lock:
+            if retry not in _http_adapters:
+                _http_adapters[retry] = PooledHTTPAdapter(retry)
+            adapter = _http_adapters[retry]
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if proxy_url is not None:
+        session.proxies = {"http": proxy_url, "https": proxy_url}
+    return session
+
+
 class CustomHttpClient(HttpClient):
     def __init__(self, proxy) -> None:
         super().__init__()
         self.proxy = proxy
+        self.session = http_session(proxy or None)
 
     def get(self, url, params=None, **kwargs) -> Response:
         """
         Add you own logic here like session or proxy etc.
         """
         log("The call will be done with custom HTTP client")
-
-        if self.proxy:
-            # If a proxy is provided, use it
-            session = requests.Session()
-            session.mount("http://", HTTPAdapter(max_retries=3))
-            session.mount("https://", HTTPAdapter(max_retries=3))
-            session.proxies = {"http": self.proxy, "https": self.proxy}
-            response = session.get(
-                url, params=params, **kwargs
-            )  # Use params as a keyword argument
-        else:
-            # If no proxy is provided, make a regular request
-            response = requests.get(url, params=params, **kwargs)
-
-        return response
+        return self.session.get(url, params=params, **kwargs)
 
 
 class CredentialsManager:
@@ -220,514 +547,4320 @@ class CredentialsManager:
             return data
 
 
-class AsvzEnroller:
-    @classmethod
-    def from_lesson_attributes(
-        cls,
-        chromedriver_path,
-        weekday,
-        start_time,
-        trainer,
-        facility,
-        level,
-        sport_id,
-        proxy_url,
-        creds,
-    ):
-        today = datetime.today()
-        weekday_int = time.strptime(WEEKDAYS[weekday], "%A").tm_wday
-        weekday_date = today + timedelta((weekday_int - today.weekday()) % 7)
-        if level is not None:
-            str_level = f"f[2]=niveau:{LEVELS[level]}&"
-        else:
-            str_level = ""
-        sport_url = (
-            f"{SPORTFAHRPLAN_BASE_URL}?"
-            + f"f[0]=sport:{sport_id}&"
-            + f"f[1]=facility:{FACILITIES[facility]}&"
-            + str_level
-            + f"date={weekday_date.year}-{weekday_date.month:02d}-{weekday_date.day:02d}%20{start_time.hour:02d}:{start_time.minute:02d}"
-        )
-        logging.info("Searching lesson on '{}'".format(sport_url))
-
-        lesson_url = None
-        driver = None
-        try:
-            driver = AsvzEnroller.get_driver(chromedriver_path, proxy_url)
-            driver.get(sport_url)
-            driver.implicitly_wait(3)
-
-            day_ele = driver.find_element(
-                By.XPATH, "//div[@class='teaser-list-calendar__day']"
-            )
+class SessionCache:
+    """
+    Stores the cookies and the access token of a login session per organisation and user,
+    so that the next run can skip the login as long as the session is valid.
+    """
 
-            if trainer:
-                lesson = day_ele.find_element(
-                    By.XPATH,
-                    ".//li[@class='btn-hover-parent'][contains(., '{}')]".format(
-                        trainer,
-                    ),
-                )
-            else:
-                lesson = day_ele.find_element(
-                    By.XPATH, ".//li[@class='btn-hover-parent']"
-                )
-            logging.debug("Found lesson")
+    def __init__(self, filename=SESSION_CACHE_FILENAME):
+        self.filename = filename
 
-            lesson_url = lesson.find_element(
-                By.XPATH, ".//a[starts-with(@href, '{}')]".format(LESSON_BASE_URL)
-            ).get_attribute("href")
-            logging.debug(f"Found lesson url: {lesson_url}")
+    def load(self, org, uname):
+        session = self.__load().get(SessionCache.__key(org, uname))
+        if session is None:
+            return None
+        if session["expires_at"] <= time.time():
+            logging.info("Cached login session expired")
+            self.invalidate(org, uname)
+            return None
+        return session
 
-            # When there is no lesson on the requested day, the ASVZ webpage returns the first lesson on the next day with lessons.
-            driver.get(lesson_url)
-            driver.implicitly_wait(3)
-            lesson_start = AsvzEnroller.__get_enrollment_and_start_time(driver)[1]
-            expected_lesson_start = datetime(
-                weekday_date.year,
-                weekday_date.month,
-                weekday_date.day,
-                start_time.hour,
-                start_time.minute,
-            )
-            if lesson_start != expected_lesson_start:
-                logging.error(
-                    "No lesson on the specified date and time! Most likely, you are trying to enroll on a holiday."
-                )
-                exit(2)
+    def store(self, org, uname, origin, cookies, storage, access_token):
+        hosts = SESSION_COOKIE_HOSTS + [urlparse(origin).hostname]
+        expiries = [
+            c["expires"]
+            for c in cookies
+            if c.get("expires", -1) > 0 and c["domain"].lstrip(".") in hosts
+        ]
+        token_expiry = get_access_token_expiry(access_token)
+        if token_expiry is not None:
+            expiries.append(token_expiry.timestamp())
+        if not expiries:
+            expiries.append(time.time() + SESSION_CACHE_DEFAULT_TTL_SECONDS)
 
-        except NoSuchElementException as e:
-            logging.error(
-                "Lesson not found! Make sure the lesson is visible on the above URL and the name of the trainer matches."
-            )
-            exit(1)
-        finally:
-            if driver is not None:
-                driver.quit()
+        sessions = self.__load()
+        sessions[SessionCache.__key(org, uname)] = {
+            "origin": origin,
+            "cookies": cookies,
+            "storage": storage,
+            "access_token": access_token,
+            "expires_at": min(expiries),
+        }
+        self.__store(sessions)
 
-        return cls(chromedriver_path, lesson_url, creds)
+    def invalidate(self, org, uname):
+        sessions = self.__load()
+        if sessions.pop(SessionCache.__key(org, uname), None) is not None:
+            self.__store(sessions)
 
     @staticmethod
-    def get_driver(chromedriver_path, proxy_url=None):
-        options = Options()
-        options.add_argument("--private")
-        options.add_argument("--headless")
-        options.add_argument(
-            "--no-sandbox"
-        )  # Required for running as root user in Docker container
-        options.add_argument(
-            "--disable-dev-shm-usage"
-        )  # Required for running as root user in Docker container
-        options.add_experimental_option("prefs", {"intl.accept_languages": "de"})
-        if proxy_url is not None:
-            options.add_argument(f"--proxy-server={proxy_url}")
+    def __key(org, uname):
+        return f"{org}/{uname}"
 
-        return webdriver.Chrome(
-            service=Service(chromedriver_path),
-            options=options,
-        )
-
-    @staticmethod
-    def wait_until(enrollment_start):
-        current_time = datetime.today()
+    def __store(self, sessions):
+        # the file contains secrets, only the owner may read it
+        fd = os.open(self.filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w") as f:
+            json.dump(sessions, f)
 
-        logging.info(
-            "\n\tcurrent time: {}\n\tenrollment time: {}".format(
-                current_time.strftime("%H:%M:%S"), enrollment_start.strftime("%H:%M:%S")
-            )
-        )
+    def __load(self):
+        if not Path(self.filename).is_file():
+            return {}
 
-        login_before_enrollment_seconds = 1 * 59
-        if (enrollment_start - current_time).seconds > login_before_enrollment_seconds:
-            sleep_time = (
-                enrollment_start - current_time
-            ).seconds - login_before_enrollment_seconds
-            logging.info(
-                "Sleep for {} seconds until {}".format(
-                    sleep_time,
-                    (current_time + timedelta(seconds=sleep_time)).strftime("%H:%M:%S"),
-                )
-            )
-            time.sleep(sleep_time)
+        with open(self.filename, "r") as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                logging.warning("Ignoring corrupt session cache")
+                return {}
 
-    def __init__(self, chromedriver, lesson_url, creds, proxy_url=None):
-        self.chromedriver = chromedriver
-        self.lesson_url = lesson_url
-        self.creds = creds
-        self.proxy_url = proxy_url
 
-        logging.info(
-            "Summary:\n\tOrganisation: {}\n\tUsername: {}\n\tPassword: {}\n\tLesson: {}".format(
-                self.creds[CREDENTIALS_ORG],
-                self.creds[CREDENTIALS_UNAME],
-                "*" * len(self.creds[CREDENTIALS_PW]),
-                self.lesson_url,
-            )
-        )
+class IdpShortcutCache:
+    """
+    Stores the IdP entity of each organisation, that was selected in the SWITCH organisation picker,
+    so that later logins skip the picker and continue straight to the login form of the IdP.
+    """
 
-    def enroll(self):
-        logging.info("Checking login credentials")
-        try:
-            driver = AsvzEnroller.get_driver(self.chromedriver, self.proxy_url)
-            driver.get(self.lesson_url)
-            driver.implicitly_wait(3)
-            self.__organisation_login(driver)
-            (
-                self.enrollment_start,
-                self.lesson_start,
-            ) = AsvzEnroller.__get_enrollment_and_start_time(driver)
-        except NoSuchElementException as e:
-            logging.error(NO_SUCH_ELEMENT_ERR_MSG)
-            raise e
-        finally:
-            if driver is not None:
-                driver.quit()
+    def __init__(self, filename=IDP_CACHE_FILENAME):
+        self.filename = filename
 
-        if datetime.today() < self.enrollment_start:
-            AsvzEnroller.wait_until(self.enrollment_start)
+    def get(self, org):
+        return self.__load().get(org)
 
-        try:
-            driver = AsvzEnroller.get_driver(self.chromedriver, self.proxy_url)
-            driver.get(self.lesson_url)
-            driver.implicitly_wait(3)
+    def store(self, org, entity_id):
+        idps = self.__load()
+        if idps.get(org) == entity_id:
+            return
+        idps[org] = entity_id
+        with open(self.filename, "w") as f:
+            json.dump(idps, f, indent=4)
 
-            logging.info("Starting enrollment")
+    def invalidate(self, org):
+        idps = self.__load()
+        if idps.pop(org, None) is not None:
+            with open(self.filename, "w") as f:
+                json.dump(idps, f, indent=4)
 
-            enrolled = False
-            while not enrolled:
-                if self.enrollment_start < datetime.today():
-                    logging.info(
-                        "Enrollment is already open. Checking for available places."
-                    )
-                    self.__wait_for_free_places(driver)
+    def __load(self):
+        if not Path(self.filename).is_file():
+            return {}
 
-                logging.info("Lesson has free places")
+        with open(self.filename, "r") as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                logging.warning("Ignoring corrupt IdP cache")
+                return {}
 
-                self.__organisation_login(driver)
 
-                try:
-                    logging.info("Waiting for enrollment")
-                    WebDriverWait(driver, 5 * 60).until(
-                        EC.element_to_be_clickable(
-                            (
-                                By.XPATH,
-                                "//button[@id='btnRegister' and (@class='btn-primary btn enrollmentPlacePadding' or @class='btn btn-default')]",
-                            )
-                        )
-                    ).click()
+def discovery_response_url(discovery_url, entity_id):
+    """
+    Builds the URL the organisation picker redirects to after selecting the IdP (SAML discovery protocol),
+    or returns None if the URL is not a discovery request.
+    """
+    query = parse_qs(urlparse(discovery_url).query)
+    if "return" not in query:
+        return None
 
-                    time.sleep(5)
-                except TimeoutException as e:
-                    logging.info(
-                        "Place was already taken in the meantime. Rechecking for available places."
-                    )
-                    continue
+    return_url = query["return"][0]
+    return_id_param = query.get("returnIDParam", ["entityID"])[0]
+    separator = "&" if "?" in return_url else "?"
+    return return_url + separator + urlencode({return_id_param: entity_id})
 
-                logging.info("Submitted enrollment request.")
-                enrolled = True
 
-                try:
-                    enrollment_el = driver.find_element(
-                        By.TAG_NAME, "app-lessons-enrollment-button"
-                    )
+def parse_saml_idp_cookie(value):
+    """
+    Returns the most recently selected IdP entity of the _saml_idp cookie,
+    which contains the base64 encoded entities separated by spaces.
+    """
+    entities = unquote(value).split()
+    if not entities:
+        return None
+    try:
+        entity_id = base64.b64decode(entities[-1] + "=" * (-len(entities[-1]) % 4))
+        entity_id = entity_id.decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return entity_id if entity_id.startswith("http") else None
 
-                    alert_el = enrollment_el.find_element(
-                        By.XPATH, "//div[contains(@class, 'alert')]"
-                    )
-                    alert_text = alert_el.get_attribute("innerHTML")
 
-                    if "Du hast dich erfolgreich eingeschrieben" in alert_text:
-                        logging.info("Successfully enrolled. Train hard and have fun!")
-                    else:
-                        logging.warning(
-                            "Enrollment might have not been successful. Please check your E-Mail."
-                        )
+def normalize_name(name):
+    # case, accents and whitespace are ignored, e.g. 'sport center honggerberg'
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    return " ".join(
+        "".join(c for c in decomposed if not unicodedata.combining(c)).split()
+    )
 
-                    participation_el = enrollment_el.find_element(By.TAG_NAME, "span")
-                    participation_text = participation_el.get_attribute("innerHTML")
 
-                    m = LESSON_ENROLLMENT_NUMBER_REGEX.match(participation_text)
-                    if m:
-                        enrollment_number = m.group(1)
-                        logging.info(f"Your enrollment number is {enrollment_number}")
-                    else:
-                        logging.warning(
-                            "Enrollment might have not been successful. Please check your E-Mail."
-                        )
-                except NoSuchElementException as e:
-                    logging.error("Failed to get enrollment result!")
-                    raise e
+class Catalog:
+    """
+    Index of the sports, facilities and levels listed on the Sportfahrplan, synced with 'catalog sync'.
+    Names are looked up offline, the built-in facilities and levels are used until a catalog was synced.
+    """
 
-        except NoSuchElementException as e:
-            logging.error(NO_SUCH_ELEMENT_ERR_MSG)
-            raise e
-        finally:
-            if driver is not None:
-                driver.quit()
+    LINK_XPATH = etree.XPath("//a[@href]")
+    COUNT_REGEX = re.compile(r"\s*\(\d+\)\s*$")
 
-    @staticmethod
-    def __get_enrollment_and_start_time(driver):
-        try:
-            try:
-                driver.find_element(By.TAG_NAME, "app-page-not-found")
-            except NoSuchElementException:
-                pass
-            else:
-                logging.error("Lesson not found! Please check your lesson details")
-                raise Exception("Lesson not found")
+    # filename -> (modification time, catalog)
+    loaded = {}
 
-            enrollment_start = AsvzEnroller.__get_enrollment_time(driver)
-            lesson_start = AsvzEnroller.__get_lesson_time(driver)
-        except NoSuchElementException as e:
-            logging.error(NO_SUCH_ELEMENT_ERR_MSG)
-            raise e
+    def __init__(
+        self, sports=None, facilities=None, levels=None, revision=0, synced_at=None
+    ):
+        self.sections = {
+            "sports": dict(sports or {}),
+            "facilities": dict(FACILITIES if facilities is None else facilities),
+            "levels": dict(LEVELS if levels is None else levels),
+        }
+        self.revision = revision
+        self.synced_at = synced_at
+        # section -> normalized name -> name
+        self.index = {
+            section: {normalize_name(name): name for name in entries}
+            for section, entries in self.sections.items()
+        }
 
-        return (enrollment_start, lesson_start)
+    @classmethod
+    def load(cls, filename=None) -> "Catalog":
+        filename = filename or CATALOG_FILENAME
+        try:
+            mtime = os.stat(filename).st_mtime
+        except OSError:
+            return cls()
+        if filename in cls.loaded and cls.loaded[filename][0] == mtime:
+            return cls.loaded[filename][1]
 
-    @staticmethod
-    def __get_enrollment_time(driver):
         try:
-            enrollment_interval_raw = driver.find_element(
-                By.XPATH, "//dl[contains(., 'Einschreibezeitraum')]/dd"
-            )
-        except NoSuchElementException as e:
-            # If no section called "Einschreibezeitraum" is found, look for "dl" with "Anmeldezeitraum"
-            enrollment_interval_raw = driver.find_element(
-                By.XPATH, "//dl[contains(., 'Anmeldezeitraum')]/dd"
+            with open(filename, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logging.warning("Ignoring corrupt catalog, please sync it again")
+            return cls()
+        if data.get("version") != CATALOG_VERSION:
+            logging.warning(
+                "Ignoring catalog of an older version, please sync it again"
             )
+            return cls()
 
-        # enrollment_interval_raw is like 'Mo, 04.12.2023 10:00 - Di, 26.12.2023 23:59'
-        enrollment_start_raw = (
-            enrollment_interval_raw.get_attribute("innerHTML")
-            .split("-")[0]
-            .split(",")[1]
-            .strip()
+        synced_at = datetime.fromisoformat(data["synced_at"])
+        if synced_at < datetime.today() - timedelta(days=CATALOG_MAX_AGE_DAYS):
+            logging.warning(
+                "Catalog was synced on {}, sync it again to pick up new sports and facilities".format(
+                    synced_at.strftime("%d.%m.%Y")
+                )
+            )
+        catalog = cls(
+            data["sports"],
+            data["facilities"],
+            data["levels"],
+            data["revision"],
+            synced_at,
         )
+        cls.loaded[filename] = (mtime, catalog)
+        return catalog
 
-        try:
-            enrollment_start = datetime.strptime(enrollment_start_raw, "%d.%m.%Y %H:%M")
-        except ValueError as e:
-            logging.error(e)
-            raise AsvzBotException(
-                "Failed to parse enrollment start time: '{}'".format(
-                    enrollment_start_raw
-                )
+    def save(self, filename=None):
+        with open(filename or CATALOG_FILENAME, "w") as f:
+            json.dump(
+                {
+                    "version": CATALOG_VERSION,
+                    "revision": self.revision,
+                    "synced_at": self.synced_at.isoformat(),
+                    **self.sections,
+                },
+                f,
             )
 
-        logging.info(
-            "Enrollment starts at {}".format(enrollment_start.strftime("%H:%M:%S"))
-        )
-        return enrollment_start
+    def lookup(self, section, name):
+        """
+        Returns the name and id of an entry, ignoring case, accents and whitespace.
+        Raises ValueError with the closest names if there is no such entry.
+        """
+        entries = self.sections[section]
+        if name in entries:
+            return name, entries[name]
+        normalized = normalize_name(name)
+        if normalized in self.index[section]:
+            name = self.index[section][normalized]
+            return name, entries[name]
 
-    @staticmethod
-    def __get_lesson_time(driver):
-        try:
-            lesson_interval_raw = driver.find_element(
-                By.XPATH, "//dl[contains(., 'Datum/Zeit')]/dd"
+        suggestions = [
+            self.index[section][match]
+            for match in difflib.get_close_matches(
+                normalized, self.index[section], n=3, cutoff=0.6
             )
-        except NoSuchElementException:
-            # If no section called "Datum/Zeit" is found, look for "dt" with "Lektionen"
-            lesson_interval_raw = driver.find_element(
-                By.XPATH, "//dt[contains(., 'Lektionen')]/following-sibling::dd[0]"
+        ]
+        raise ValueError(
+            "unknown {} '{}'{}".format(
+                CATALOG_SECTION_NAMES[section],
+                name,
+                ", did you mean {}?".format(
+                    " or ".join("'{}'".format(s) for s in suggestions)
+                )
+                if suggestions
+                else "",
             )
-
-        # lesson_interval_raw is like 'Mo, 10.05.2021 06:55 - 08:05'
-        lesson_start_raw = (
-            lesson_interval_raw.get_attribute("innerHTML")
-            .split("-")[0]
-            .split(",")[1]
-            .strip()
         )
 
-        try:
-            lesson_start = datetime.strptime(lesson_start_raw, "%d.%m.%Y %H:%M")
-        except ValueError as e:
-            logging.error(e)
-            raise AsvzBotException(
-                "Failed to parse lesson start time: '{}'".format(lesson_start_raw)
+    def sport_id(self, sport) -> int:
+        """
+        Returns the id of a sport given by its id or its name.
+        """
+        if isinstance(sport, int) or str(sport).isdigit():
+            return int(sport)
+        return self.lookup("sports", sport)[1]
+
+    def search(self, query):
+        """
+        Returns the entries whose name contains the query or is close to it, as (section, name, id).
+        """
+        normalized = normalize_name(query)
+        matches = []
+        for section, index in self.index.items():
+            names = [name for name in index if normalized in name]
+            names += [
+                name
+                for name in difflib.get_close_matches(
+                    normalized, index, n=5, cutoff=0.6
+                )
+                if name not in names
+            ]
+            for name in names:
+                matches.append(
+                    (section, index[name], self.sections[section][index[name]])
+                )
+        return matches
+
+    @staticmethod
+    def parse(content):
+        """
+        Returns the entries of the filters linked on the Sportfahrplan per section.
+        """
+        sections = {section: {} for section in CATALOG_FACETS.values()}
+        for link in Catalog.LINK_XPATH(html.fromstring(content)):
+            filters = [
+                values[0]
+                for name, values in parse_qs(urlparse(link.get("href")).query).items()
+                if SPORTFAHRPLAN_FILTER_REGEX.match(name)
+            ]
+            if not filters:
+                continue
+            # a filter link adds its filter to the ones already applied
+            facet, _, value = filters[-1].partition(":")
+            name = Catalog.COUNT_REGEX.sub("", link.text_content()).strip()
+            if facet in CATALOG_FACETS and value.isdigit() and name:
+                sections[CATALOG_FACETS[facet]][name] = int(value)
+        return sections
+
+    @classmethod
+    def sync(cls, session, filename=None) -> "Catalog":
+        """
+        Fetches the filters of the Sportfahrplan and saves them as a new revision of the catalog.
+        """
+        response = session.get(SPORTFAHRPLAN_BASE_URL)
+        response.raise_for_status()
+        # decoded with the charset of the response header
+        sections = Catalog.parse(response.text)
+        if not any(sections.values()):
+            raise AsvzBotException(
+                "Sportfahrplan lists no sports, facilities or levels. Catalog not synced."
+            )
+
+        previous = cls.load(filename)
+        for section, entries in sections.items():
+            if not entries:
+                logging.warning(
+                    "Sportfahrplan lists no {}, keeping the previous ones".format(
+                        section
+                    )
+                )
+                sections[section] = previous.sections[section]
+
+        changes = Catalog.diff(previous, sections)
+        for change in changes:
+            logging.info(change)
+        catalog = cls(
+            revision=previous.revision + 1 if changes else previous.revision,
+            synced_at=datetime.today(),
+            **sections,
+        )
+        catalog.save(filename)
+        return catalog
+
+    @staticmethod
+    def diff(previous, sections):
+        changes = []
+        for section, entries in sections.items():
+            old_entries = previous.sections[section]
+            kind = CATALOG_SECTION_NAMES[section].capitalize()
+            for name, entry_id in entries.items():
+                if name not in old_entries:
+                    changes.append("{} '{}' added ({})".format(kind, name, entry_id))
+                elif old_entries[name] != entry_id:
+                    changes.append(
+                        "{} '{}' renumbered from {} to {}".format(
+                            kind, name, old_entries[name], entry_id
+                        )
+                    )
+            for name in old_entries:
+                if name not in entries:
+                    changes.append("{} '{}' removed".format(kind, name))
+        return changes
+
+
+class LessonLookupCache:
+    """
+    Remembers which lesson was found on the Sportfahrplan for a training,
+    so that repeated runs do not search the Sportfahrplan again.
+    """
+
+    def __init__(self, filename=LOOKUP_CACHE_FILENAME, ttl=LOOKUP_CACHE_TTL_SECONDS):
+        self.filename = filename
+        self.ttl = ttl
+
+    @staticmethod
+    def key(sport_id, facility, level, lesson_start, trainer):
+        return "|".join(
+            str(v)
+            for v in (
+                sport_id,
+                facility,
+                level or "",
+                lesson_start.strftime("%Y-%m-%d"),
+                lesson_start.strftime(TIMEFORMAT),
+                trainer or "",
+            )
+        )
+
+    def get(self, key):
+        entry = self.__load().get(key)
+        if entry is None or entry["resolved_at"] + self.ttl <= time.time():
+            return None
+        return entry["lesson_url"]
+
+    def store(self, key, lesson_url):
+        now = time.time()
+        entries = {
+            k: v for k, v in self.__load().items() if v["resolved_at"] + self.ttl > now
+        }
+        entries[key] = {"lesson_url": lesson_url, "resolved_at": now}
+        with open(self.filename, "w") as f:
+            json.dump(entries, f)
+
+    def __load(self):
+        if not Path(self.filename).is_file():
+            return {}
+
+        with open(self.filename, "r") as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                logging.warning("Ignoring corrupt lookup cache")
+                return {}
+
+
+class JobStore:
+    """
+    SQLite store of the enrollment jobs with their lesson times, attempts and phase durations,
+    so that a restarted bot resumes where it stopped and skips the lessons it already enrolled to.
+    Remembers the lessons found on the Sportfahrplan as well, in place of LessonLookupCache.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            lesson_url TEXT NOT NULL,
+            organisation TEXT NOT NULL,
+            username TEXT NOT NULL,
+            enrollment_start TEXT,
+            lesson_start TEXT,
+            status TEXT NOT NULL,
+            enrollment_number INTEGER,
+            message TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (lesson_url, organisation, username)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_enrollment_start ON jobs (enrollment_start);
+        CREATE TABLE IF NOT EXISTS attempts (
+            lesson_url TEXT NOT NULL,
+            organisation TEXT NOT NULL,
+            username TEXT NOT NULL,
+            attempted_at TEXT NOT NULL,
+            status TEXT NOT NULL,
+            enrollment_number INTEGER,
+            message TEXT
+        );
+        CREATE INDEX IF NOT EXISTS attempts_job ON attempts (lesson_url, organisation, username);
+        CREATE TABLE IF NOT EXISTS phases (
+            lesson_url TEXT NOT NULL,
+            organisation TEXT NOT NULL,
+            username TEXT NOT NULL,
+            recorded_at TEXT NOT NULL,
+            phase TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            runs INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS phases_job ON phases (lesson_url, organisation, username);
+        CREATE TABLE IF NOT EXISTS lookups (
+            key TEXT PRIMARY KEY,
+            lesson_url TEXT NOT NULL,
+            resolved_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, filename=JOB_STORE_FILENAME, ttl=LOOKUP_CACHE_TTL_SECONDS):
+        self.filename = filename
+        self.ttl = ttl
+        # enrollments of a batch or daemon run in several threads
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            filename, check_same_thread=False, isolation_level=None
+        )
+        self.connection.row_factory = sqlite3.Row
+        # survives a crash in the middle of a write, without blocking readers
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(JobStore.SCHEMA)
+
+    def get_job(self, lesson_url, org, uname):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM jobs WHERE lesson_url = ? AND organisation = ? AND username = ?",
+                (lesson_url, org, uname),
+            ).fetchone()
+        return None if row is None else JobStore.__job(row)
+
+    def start_job(self, lesson_url, org, uname):
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO jobs (lesson_url, organisation, username, status, updated_at) VALUES (?, ?, ?, ?, ?) "
+                + "ON CONFLICT DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                (lesson_url, org, uname, JOB_STATUS_WAITING, JobStore.__now()),
+            )
+
+    def set_lesson_times(self, lesson_url, org, uname, enrollment_start, lesson_start):
+        self.__update(
+            lesson_url,
+            org,
+            uname,
+            enrollment_start=enrollment_start.strftime(JOB_STORE_DATETIME_FORMAT),
+            lesson_start=lesson_start.strftime(JOB_STORE_DATETIME_FORMAT),
+        )
+
+    def finish(
+        self, lesson_url, org, uname, status, enrollment_number=None, message=None
+    ):
+        self.__update(
+            lesson_url,
+            org,
+            uname,
+            status=status,
+            enrollment_number=enrollment_number,
+            message=message,
+        )
+
+    def add_attempt(self, lesson_url, org, uname, result):
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO attempts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    lesson_url,
+                    org,
+                    uname,
+                    JobStore.__now(),
+                    result.status,
+                    result.enrollment_number,
+                    result.message,
+                ),
+            )
+
+    def attempts(self, lesson_url, org, uname):
+        with self.lock:
+            return [
+                dict(row)
+                for row in self.connection.execute(
+                    "SELECT attempted_at, status, enrollment_number, message FROM attempts "
+                    + "WHERE lesson_url = ? AND organisation = ? AND username = ? ORDER BY rowid",
+                    (lesson_url, org, uname),
+                )
+            ]
+
+    def record_phases(self, lesson_url, org, uname, timer):
+        now = JobStore.__now()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT INTO phases VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (lesson_url, org, uname, now, phase, seconds, runs)
+                    for phase, (seconds, runs) in timer.durations().items()
+                ],
+            )
+
+    def opening_between(self, start, end):
+        """
+        Returns the unfinished jobs whose enrollment opens in the given time range, ordered by the opening.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM jobs WHERE enrollment_start >= ? AND enrollment_start < ? "
+                + "AND status NOT IN ({}) ORDER BY enrollment_start".format(
+                    ", ".join("?" for _ in JOB_FINISHED_STATUSES)
+                ),
+                (
+                    start.strftime(JOB_STORE_DATETIME_FORMAT),
+                    end.strftime(JOB_STORE_DATETIME_FORMAT),
+                    *JOB_FINISHED_STATUSES,
+                ),
+            ).fetchall()
+        return [JobStore.__job(row) for row in rows]
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT lesson_url, resolved_at FROM lookups WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row["resolved_at"] + self.ttl <= time.time():
+            return None
+        return row["lesson_url"]
+
+    def store(self, key, lesson_url):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM lookups WHERE resolved_at <= ?", (now - self.ttl,)
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO lookups VALUES (?, ?, ?)",
+                (key, lesson_url, now),
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __update(self, lesson_url, org, uname, **columns):
+        columns["updated_at"] = JobStore.__now()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET {} WHERE lesson_url = ? AND organisation = ? AND username = ?".format(
+                    ", ".join(f"{column} = ?" for column in columns)
+                ),
+                (*columns.values(), lesson_url, org, uname),
+            )
+
+    @staticmethod
+    def __now():
+        return datetime.today().strftime(JOB_STORE_DATETIME_FORMAT)
+
+    @staticmethod
+    def __job(row):
+        job = dict(row)
+        for column in ("enrollment_start", "lesson_start"):
+            if job[column] is not None:
+                job[column] = datetime.strptime(job[column], JOB_STORE_DATETIME_FORMAT)
+        return job
+
+
+@dataclass
+class LessonState:
+    enrollment_start: datetime
+    enrollment_end: Optional[datetime]
+    lesson_start: datetime
+    lesson_end: Optional[datetime]
+    places_max: Optional[int]
+    places_taken: Optional[int]
+
+    @property
+    def free_places(self) -> Optional[int]:
+        if self.places_max is None or self.places_taken is None:
+            return None
+        return max(self.places_max - self.places_taken, 0)
+
+    @classmethod
+    def from_api(cls, data):
+        try:
+            return cls(
+                enrollment_start=parse_api_datetime(data["enrollmentFrom"]),
+                enrollment_end=parse_api_datetime(data.get("enrollmentUntil")),
+                lesson_start=parse_api_datetime(data["starts"]),
+                lesson_end=parse_api_datetime(data.get("ends")),
+                places_max=data.get("participantsMax"),
+                places_taken=data.get("participantCount"),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error(e)
+            raise AsvzBotException("Failed to parse lesson details: '{}'".format(data))
+
+
+@dataclass
+class LessonSnapshot:
+    """
+    State of a rendered lesson page.
+    """
+
+    not_found: bool
+    enrollment_start: Optional[datetime] = None
+    enrollment_end: Optional[datetime] = None
+    lesson_start: Optional[datetime] = None
+    lesson_end: Optional[datetime] = None
+    free_places: Optional[int] = None
+    logged_in: bool = False
+    # the enrollment button is shown and enabled
+    enrollment_open: bool = False
+    alert: Optional[str] = None
+    enrolled: bool = False
+    enrollment_number: Optional[int] = None
+
+    ENROLLMENT_INTERVAL_XPATH = etree.XPath(
+        "//dl[contains(., 'Einschreibezeitraum') or contains(., 'Anmeldezeitraum')]/dd"
+    )
+    LESSON_INTERVAL_XPATH = etree.XPath(
+        "//dl[contains(., 'Datum/Zeit')]/dd | //dt[contains(., 'Lektionen')]/following-sibling::dd[1]"
+    )
+    FREE_PLACES_XPATH = etree.XPath("//dl[contains(., 'Freie Plätze')]/dd/span")
+    LOGIN_XPATH = etree.XPath(LOGIN_BUTTON_XPATH)
+    REGISTER_BUTTON_XPATH = etree.XPath("//button[@id='btnRegister']")
+    ALERT_XPATH = etree.XPath(
+        "//app-lessons-enrollment-button//div[contains(@class, 'alert')]"
+    )
+    PARTICIPATION_XPATH = etree.XPath("//app-lessons-enrollment-button//span")
+
+    @property
+    def complete(self):
+        return self.not_found or (
+            self.enrollment_start is not None and self.lesson_start is not None
+        )
+
+    @classmethod
+    def from_html(cls, content):
+        page = html.fromstring(content)
+        if page.xpath("//app-page-not-found"):
+            return cls(not_found=True)
+
+        snapshot = cls(not_found=False)
+        enrollment_interval = LessonSnapshot.__text(
+            LessonSnapshot.ENROLLMENT_INTERVAL_XPATH(page)
+        )
+        if enrollment_interval is not None:
+            (
+                snapshot.enrollment_start,
+                snapshot.enrollment_end,
+            ) = parse_page_interval(enrollment_interval)
+        lesson_interval = LessonSnapshot.__text(
+            LessonSnapshot.LESSON_INTERVAL_XPATH(page)
+        )
+        if lesson_interval is not None:
+            snapshot.lesson_start, snapshot.lesson_end = parse_page_interval(
+                lesson_interval
+            )
+
+        free_places = LessonSnapshot.__text(LessonSnapshot.FREE_PLACES_XPATH(page))
+        if free_places is not None and free_places.isdigit():
+            snapshot.free_places = int(free_places)
+
+        snapshot.logged_in = not LessonSnapshot.LOGIN_XPATH(page)
+        snapshot.enrollment_open = any(
+            b.get("disabled") is None
+            for b in LessonSnapshot.REGISTER_BUTTON_XPATH(page)
+        )
+
+        snapshot.alert = LessonSnapshot.__text(LessonSnapshot.ALERT_XPATH(page))
+        if snapshot.alert is not None:
+            snapshot.enrolled = LESSON_ENROLLMENT_SUCCESS_TEXT in snapshot.alert
+            m = LESSON_ENROLLMENT_NUMBER_REGEX.match(
+                LessonSnapshot.__text(LessonSnapshot.PARTICIPATION_XPATH(page)) or ""
+            )
+            if m:
+                snapshot.enrollment_number = int(m.group(1))
+        return snapshot
+
+    @staticmethod
+    def __text(elements):
+        if not elements:
+            return None
+        return " ".join(elements[0].text_content().split())
+
+
+@dataclass
+class EnrollmentResult:
+    status: str
+    enrollment_number: Optional[int] = None
+    message: Optional[str] = None
+
+    @classmethod
+    def from_api(cls, status_code, data):
+        if 200 <= status_code < 300:
+            return cls(
+                ENROLLMENT_STATUS_ENROLLED,
+                enrollment_number=data.get("data", {}).get("placeNumber"),
+            )
+        if status_code == 409:
+            return cls(ENROLLMENT_STATUS_ALREADY_ENROLLED)
+
+        return cls(
+            ENROLLMENT_STATUS_REJECTED,
+            message="; ".join(e.get("message", "") for e in data.get("errors", []))
+            or f"HTTP {status_code}",
+        )
+
+
+@dataclass
+class WaitTimeouts:
+    """
+    Seconds to wait for a page to render, for the redirect back after the login and for the enrollment result.
+    """
+
+    page: float = 20
+    login: float = 30
+    enrollment: float = 10
+
+
+def parse_api_datetime(raw) -> Optional[datetime]:
+    # the API returns ISO 8601 timestamps with offset, the bot works with naive local times
+    if raw is None:
+        return None
+    return datetime.fromisoformat(raw).astimezone().replace(tzinfo=None)
+
+
+def parse_page_interval(raw):
+    """
+    Parses an interval of the lesson page, the end may omit the date if it is on the same day.
+    """
+    dates = PAGE_DATE_REGEX.findall(raw)
+    times = PAGE_TIME_REGEX.findall(raw)
+    if not dates or not times:
+        raise AsvzBotException("Failed to parse interval: '{}'".format(raw))
+
+    try:
+        start = datetime.strptime(f"{dates[0]} {times[0]}", "%d.%m.%Y %H:%M")
+        end = None
+        if len(times) > 1:
+            end = datetime.strptime(f"{dates[-1]} {times[1]}", "%d.%m.%Y %H:%M")
+    except ValueError as e:
+        logging.error(e)
+        raise AsvzBotException("Failed to parse interval: '{}'".format(raw))
+    return start, end
+
+
+def parse_lesson_url(lesson_url):
+    """
+    Splits a lesson url like https://schalter.asvz.ch/tn/lessons/200949
+    into the API base url and the API path of the lesson, e.g. 'Lessons/200949'.
+    """
+    m = LESSON_URL_REGEX.match(lesson_url)
+    if not m:
+        raise AsvzBotException("Unsupported lesson url: '{}'".format(lesson_url))
+    api_base_url = m.group("base") + LESSON_API_PATH
+    api_path = "{}/{}".format(LESSON_API_RESOURCES[m.group("kind")], m.group("id"))
+    return api_base_url, api_path
+
+
+class SchalterClient:
+    """
+    Minimal client for the API behind the schalter web app.
+    Reuses its connections, so that the enrollment request does not pay for a new TLS handshake.
+    """
+
+    def __init__(
+        self,
+        api_base_url,
+        proxy_url=None,
+        access_token=None,
+        timeout=HTTP_TIMEOUT_SECONDS,
+        dedicated=False,
+    ):
+        self.api_base_url = api_base_url
+        self.timeout = timeout
+
+        # a failed enrollment request is handled by the enrollment loop
+        self.session = http_session(proxy_url, HTTP_API_RETRY, dedicated)
+        self.session.headers.update({"Accept": "application/json"})
+
+        self.set_access_token(access_token)
+
+    def load_session(self, session):
+        for cookie in session["cookies"]:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie["domain"],
+                path=cookie.get("path", "/"),
+            )
+        self.set_access_token(session["access_token"])
+
+    def set_access_token(self, access_token):
+        if access_token is None:
+            self.session.headers.pop("Authorization", None)
+        else:
+            self.session.headers["Authorization"] = f"Bearer {access_token}"
+
+    def is_authorized(self) -> bool:
+        response = self.session.get(
+            f"{self.api_base_url}/{MEMBER_API_PATH}", timeout=self.timeout
+        )
+        if response.status_code in (401, 403):
+            return False
+        response.raise_for_status()
+        return True
+
+    def get_lesson(self, api_path) -> LessonState:
+        response = self.session.get(
+            f"{self.api_base_url}/{api_path}", timeout=self.timeout
+        )
+        if response.status_code == 404:
+            raise AsvzBotException("Lesson not found")
+        response.raise_for_status()
+        return LessonState.from_api(response.json()["data"])
+
+    def enroll(self, api_path) -> EnrollmentResult:
+        response = self.session.post(
+            f"{self.api_base_url}/{api_path}/Enrollment",
+            json={},
+            timeout=self.timeout,
+        )
+        if response.status_code in (401, 403):
+            raise AsvzBotException("Not authorized to enroll. Please login again.")
+
+        return EnrollmentResult.from_api(
+            response.status_code, SchalterClient.__json_or_empty(response)
+        )
+
+    def close(self):
+        self.session.close()
+
+    @staticmethod
+    def __json_or_empty(response):
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+
+class HedgedEnrollment:
+    """
+    Sends the enrollment request over several sessions at once, optionally staggered,
+    so that a single slow connection does not lose the place. The first enrollment wins,
+    staggered attempts that were not sent yet are cancelled.
+    """
+
+    def __init__(self, clients, stagger=0.0):
+        self.clients = clients
+        self.stagger = stagger
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(clients), thread_name_prefix="hedge"
+        )
+
+    def warm_up(self, api_path) -> list:
+        """
+        Every session opens its connection ahead, no attempt should pay for the TLS handshake.
+        Returns the handshake latency of each session, see prewarm_connection.
+        """
+        return list(
+            self.executor.map(
+                lambda client: prewarm_connection(lambda: client.get_lesson(api_path)),
+                self.clients,
+            )
+        )
+
+    def set_access_token(self, access_token):
+        for client in self.clients:
+            client.set_access_token(access_token)
+
+    def enroll(self, api_path) -> EnrollmentResult:
+        done = threading.Event()
+
+        def attempt(index, client):
+            if self.stagger > 0:
+                # Event.wait returns True if another attempt enrolled in the meantime
+                cancelled = done.wait(index * self.stagger)
+            else:
+                cancelled = done.is_set()
+            if cancelled:
+                return None
+            result = client.enroll(api_path)
+            if result.status == ENROLLMENT_STATUS_ENROLLED:
+                done.set()
+            return index, result
+
+        futures = [
+            self.executor.submit(attempt, index, client)
+            for index, client in enumerate(self.clients)
+        ]
+        results = []
+        errors = []
+        try:
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except (requests.RequestException, AsvzBotException) as e:
+                    errors.append(e)
+                    continue
+                if outcome is None:
+                    continue
+
+                index, result = outcome
+                if result.status == ENROLLMENT_STATUS_ENROLLED:
+                    logging.info(
+                        "Enrollment attempt {} of {} succeeded".format(
+                            index + 1, len(self.clients)
+                        )
+                    )
+                    return result
+                results.append(result)
+        finally:
+            done.set()
+
+        # without an enrollment, a duplicate means an attempt enrolled but its response got lost
+        for result in results:
+            if result.status == ENROLLMENT_STATUS_ALREADY_ENROLLED:
+                return result
+        # a missing authorization is raised before a rejection, so that the caller logs in again
+        for e in errors:
+            if isinstance(e, AsvzBotException):
+                raise e
+        for result in results:
+            if result.status == ENROLLMENT_STATUS_REJECTED:
+                return result
+        raise errors[0]
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class NetworkCapture:
+    """
+    Reads the responses of the schalter API, that the web app in the browser received, from the DevTools performance log.
+    This way the bot sees the lesson state and the enrollment result as soon as they arrive, without waiting for the page to render.
+    """
+
+    def __init__(self, driver, api_path):
+        self.driver = driver
+        self.lesson_path = f"/{api_path}"
+        self.enrollment_path = f"/{api_path}/Enrollment"
+        # request id -> (url path, status code) of the responses, whose body is not loaded yet
+        self.pending = {}
+        self.lesson_state = None
+        self.enrollment_result = None
+
+    def poll(self):
+        """
+        Processes the new log entries and returns whether a new lesson state or enrollment result arrived.
+        """
+        updated = False
+        for entry in self.driver.get_log("performance"):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            method = message.get("method")
+            params = message.get("params", {})
+
+            if method == "Network.responseReceived":
+                path = urlparse(params["response"]["url"]).path
+                if path.endswith(self.lesson_path) or path.endswith(
+                    self.enrollment_path
+                ):
+                    self.pending[params["requestId"]] = (
+                        path,
+                        params["response"]["status"],
+                    )
+            elif method == "Network.loadingFinished":
+                response = self.pending.pop(params.get("requestId"), None)
+                if response is not None:
+                    updated |= self.__handle(params["requestId"], *response)
+        return updated
+
+    def wait_for(self, name, timeout):
+        """
+        Waits until a lesson state or an enrollment result arrived.
+        """
+
+        def arrived(_):
+            self.poll()
+            return getattr(self, name)
+
+        return WebDriverWait(self.driver, timeout, poll_frequency=0.05).until(arrived)
+
+    def __handle(self, request_id, path, status_code):
+        try:
+            body = self.driver.execute_cdp_cmd(
+                "Network.getResponseBody", {"requestId": request_id}
+            )
+            data = json.loads(body["body"]) if body.get("body") else {}
+        except (WebDriverException, ValueError) as e:
+            logging.debug("Failed to read response body of '{}': {}".format(path, e))
+            return False
+
+        if path.endswith(self.enrollment_path):
+            if status_code in (401, 403):
+                return False
+            self.enrollment_result = EnrollmentResult.from_api(status_code, data)
+            logging.debug(
+                "Captured enrollment result: {}".format(self.enrollment_result)
+            )
+            return True
+
+        if 200 <= status_code < 300 and "data" in data:
+            self.lesson_state = LessonState.from_api(data["data"])
+            logging.debug("Captured lesson state: {}".format(self.lesson_state))
+            return True
+        return False
+
+
+def sportfahrplan_url(sport_id, facility, level, when):
+    """
+    Returns the Sportfahrplan of a sport at a facility, listing the lessons from 'when' on.
+    """
+    catalog = Catalog.load()
+    if level is not None:
+        str_level = f"f[2]=niveau:{catalog.lookup('levels', level)[1]}&"
+    else:
+        str_level = ""
+    return (
+        f"{SPORTFAHRPLAN_BASE_URL}?"
+        + f"f[0]=sport:{sport_id}&"
+        + f"f[1]=facility:{catalog.lookup('facilities', facility)[1]}&"
+        + str_level
+        + f"date={when.year}-{when.month:02d}-{when.day:02d}%20{when.hour:02d}:{when.minute:02d}"
+    )
+
+
+@dataclass
+class TrainingOccurrence:
+    lesson_start: datetime
+    # None if there is no lesson at this time, e.g. on a holiday
+    lesson_url: Optional[str]
+    enrollment_start: Optional[datetime] = None
+
+
+class SportfahrplanResolver:
+    """
+    Searches lessons on the Sportfahrplan with plain HTTP requests instead of a browser.
+    """
+
+    DAY_XPATH = etree.XPath(SPORTFAHRPLAN_DAY_XPATH)
+    LESSON_XPATH = etree.XPath(".//li[@class='btn-hover-parent']")
+    LESSON_WITH_TRAINER_XPATH = etree.XPath(
+        ".//li[@class='btn-hover-parent'][contains(., $trainer)]"
+    )
+    LESSON_URL_XPATH = etree.XPath(".//a[starts-with(@href, $base_url)]/@href")
+
+    def __init__(self, proxy_url=None, cache=None):
+        self.proxy_url = proxy_url
+        self.cache = cache
+        self.session = http_session(proxy_url)
+        # schalter API client per API base url
+        self.clients = {}
+
+    def find_lesson_url(self, sport_url, trainer) -> Optional[str]:
+        """
+        Returns the url of the first lesson on the first day listed on the Sportfahrplan,
+        or None if the page is not rendered on the server.
+        """
+        response = self.session.get(sport_url)
+        response.raise_for_status()
+        return SportfahrplanResolver.parse_lesson_url(response.content, trainer)
+
+    @staticmethod
+    def parse_lesson_url(content, trainer) -> Optional[str]:
+        days = SportfahrplanResolver.DAY_XPATH(html.fromstring(content))
+        if not days:
+            return None
+
+        if trainer:
+            lessons = SportfahrplanResolver.LESSON_WITH_TRAINER_XPATH(
+                days[0], trainer=trainer
+            )
+        else:
+            lessons = SportfahrplanResolver.LESSON_XPATH(days[0])
+        if not lessons:
+            raise LessonNotFoundException("Lesson not found")
+
+        urls = SportfahrplanResolver.LESSON_URL_XPATH(
+            lessons[0], base_url=LESSON_BASE_URL
+        )
+        if not urls:
+            raise LessonNotFoundException("Lesson not found")
+        return urls[0]
+
+    @staticmethod
+    def parse_lesson_urls(content, trainer, start_time=None) -> Optional[list]:
+        """
+        Returns the urls of the lessons on all days listed on the Sportfahrplan,
+        or None if the page is not rendered on the server.
+        If the page shows the start times, only the lessons at 'start_time' are returned.
+        """
+        days = SportfahrplanResolver.DAY_XPATH(html.fromstring(content))
+        if not days:
+            return None
+
+        lessons = []
+        for day in days:
+            if trainer:
+                lessons.extend(
+                    SportfahrplanResolver.LESSON_WITH_TRAINER_XPATH(
+                        day, trainer=trainer
+                    )
+                )
+            else:
+                lessons.extend(SportfahrplanResolver.LESSON_XPATH(day))
+        if start_time is not None:
+            at_start_time = [
+                lesson
+                for lesson in lessons
+                if start_time.strftime(TIMEFORMAT) in lesson.text_content()
+            ]
+            lessons = at_start_time or lessons
+
+        urls = []
+        for lesson in lessons:
+            for url in SportfahrplanResolver.LESSON_URL_XPATH(
+                lesson, base_url=LESSON_BASE_URL
+            )[:1]:
+                if url not in urls:
+                    urls.append(url)
+        return urls
+
+    def find_occurrences(self, sport_id, facility, level, trainer, lesson_starts):
+        """
+        Looks up the lessons at the given start times with as few Sportfahrplan requests as possible,
+        as each page lists the lessons of several days. Returns an occurrence per start time up to the last listed lesson,
+        or None if the Sportfahrplan is not rendered on the server.
+        Raises requests.RequestException if the Sportfahrplan or a listed lesson could not be loaded.
+        """
+        found = {}
+        listed_until = None
+        when = lesson_starts[0]
+        for _ in lesson_starts:
+            response = self.session.get(
+                sportfahrplan_url(sport_id, facility, level, when)
+            )
+            response.raise_for_status()
+            urls = SportfahrplanResolver.parse_lesson_urls(
+                response.content, trainer, lesson_starts[0]
+            )
+            if urls is None:
+                return None
+            urls = [url for url in urls if url not in found]
+            if not urls:
+                break
+
+            with ThreadPoolExecutor(
+                max_workers=min(8, len(urls)), thread_name_prefix="lookup"
+            ) as executor:
+                for url in urls:
+                    self.__client(url)
+                found.update(zip(urls, executor.map(self.__get_lesson_or_none, urls)))
+            lesson_starts_listed = [
+                found[url].lesson_start for url in urls if found[url] is not None
+            ]
+            if not lesson_starts_listed:
+                break
+            listed_until = max([*lesson_starts_listed, listed_until or when])
+            if listed_until >= lesson_starts[-1]:
+                break
+            when = datetime.combine(
+                listed_until.date() + timedelta(days=1), datetime.min.time()
+            )
+
+        by_start = {}
+        for url, lesson in found.items():
+            if lesson is not None:
+                by_start.setdefault(lesson.lesson_start, (url, lesson))
+        occurrences = []
+        for lesson_start in lesson_starts:
+            if listed_until is None or lesson_start > listed_until:
+                break
+            url, lesson = by_start.get(lesson_start, (None, None))
+            occurrences.append(
+                TrainingOccurrence(
+                    lesson_start,
+                    url,
+                    lesson.enrollment_start if lesson is not None else None,
+                )
+            )
+        return occurrences
+
+    def get_lesson_start(self, lesson_url) -> datetime:
+        try:
+            return (
+                self.__client(lesson_url)
+                .get_lesson(parse_lesson_url(lesson_url)[1])
+                .lesson_start
+            )
+        except AsvzBotException:
+            raise LessonNotFoundException("Lesson not found")
+
+    def __client(self, lesson_url):
+        api_base_url, _ = parse_lesson_url(lesson_url)
+        if api_base_url not in self.clients:
+            self.clients[api_base_url] = SchalterClient(api_base_url, self.proxy_url)
+        return self.clients[api_base_url]
+
+    def __get_lesson_or_none(self, lesson_url) -> Optional[LessonState]:
+        """
+        Returns None if the listed lesson does not exist (anymore).
+        Network and server errors are raised, a lesson that could not be looked up must not be taken for a holiday.
+        """
+        try:
+            return self.__client(lesson_url).get_lesson(parse_lesson_url(lesson_url)[1])
+        except AsvzBotException as e:
+            logging.debug("Failed to look up lesson {}: {}".format(lesson_url, e))
+            return None
+
+    def close(self):
+        self.session.close()
+        for client in self.clients.values():
+            client.close()
+
+
+class AccountSession:
+    """
+    Login of one account, shared by all enrollments of that account running in the same process.
+    """
+
+    def __init__(self, api_base_url, proxy_url=None):
+        self.client = SchalterClient(api_base_url, proxy_url)
+        self.access_token = None
+        self.lock = threading.Lock()
+
+    def get_access_token(self, login, stale_access_token=None):
+        """
+        Returns the shared access token and logs in only if there is none yet
+        or if the token is still the stale one, i.e. no other enrollment logged in again in the meantime.
+        """
+        with self.lock:
+            if self.access_token is None or self.access_token == stale_access_token:
+                self.access_token = login()
+                self.client.set_access_token(self.access_token)
+            return self.access_token
+
+    def close(self):
+        self.client.close()
+
+
+class FreePlacesPoller:
+    """
+    Polls the free places of a booked out lesson through the schalter API, reusing the connection of the client.
+    """
+
+    def __init__(self, client, api_path, enrollment_start, lesson_start):
+        self.client = client
+        self.api_path = api_path
+        self.enrollment_start = enrollment_start
+        self.lesson_start = lesson_start
+        self.places_taken = None
+        self.unchanged_polls = 0
+
+    def next_interval(self, now):
+        opening_window = (
+            self.enrollment_start
+            <= now
+            < self.enrollment_start
+            + timedelta(seconds=FREE_PLACES_OPENING_WINDOW_SECONDS)
+        )
+        lesson_start_window = now >= self.lesson_start - timedelta(
+            seconds=FREE_PLACES_LESSON_START_WINDOW_SECONDS
+        )
+        if opening_window or lesson_start_window:
+            interval = FREE_PLACES_MIN_POLL_SECONDS
+        else:
+            interval = min(
+                FREE_PLACES_MIN_POLL_SECONDS * 2 ** min(self.unchanged_polls, 16),
+                FREE_PLACES_MAX_POLL_SECONDS,
+            )
+        # spread the polls, so that they do not line up with other clients
+        return interval * random.uniform(
+            1 - FREE_PLACES_POLL_JITTER, 1 + FREE_PLACES_POLL_JITTER
+        )
+
+    def observe(self, lesson) -> bool:
+        """
+        Returns whether the lesson has free places and otherwise tracks whether it changed since the last poll.
+        """
+        if lesson.free_places is None or lesson.free_places > 0:
+            # has free places or the lesson has no participant limit
+            return True
+
+        if lesson.places_taken != self.places_taken:
+            self.places_taken = lesson.places_taken
+            self.unchanged_polls = 0
+        else:
+            self.unchanged_polls += 1
+        return False
+
+    def wait_for_free_places(self, after_rejection=False) -> LessonState:
+        """
+        Polls until the lesson has free places. After a rejected enrollment the first poll is delayed
+        by the poll interval, as the free places were just taken by someone else.
+        """
+        if after_rejection:
+            time.sleep(self.next_interval(datetime.today()))
+        while True:
+            lesson = None
+            try:
+                lesson = self.client.get_lesson(self.api_path)
+            except requests.RequestException as e:
+                logging.warning("Failed to check for free places: {}".format(e))
+
+            if lesson is not None and self.observe(lesson):
+                return lesson
+
+            if datetime.today() > self.lesson_start:
+                raise AsvzBotException(
+                    "Stopping enrollment because lesson has started."
+                )
+
+            retry_interval_sec = self.next_interval(datetime.today())
+            # only log changes, the poll interval may be as short as a second
+            log = logging.info if self.unchanged_polls == 0 else logging.debug
+            log(
+                "Lesson is booked out. Rechecking in {:.1f} secs..".format(
+                    retry_interval_sec
+                )
+            )
+            time.sleep(retry_interval_sec)
+
+
+class RequestBudget:
+    """
+    Token bucket limiting the requests of all polls together.
+    """
+
+    def __init__(self, requests_per_minute, burst=None):
+        self.rate = requests_per_minute / 60
+        self.capacity = burst or max(1, requests_per_minute // 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        """
+        Takes a token and waits until one is available, if needed.
+        """
+        while True:
+            self.__refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+    def charge(self):
+        """
+        Takes a token without waiting, an enrollment request must not be delayed.
+        The next polls wait until the budget recovered.
+        """
+        self.__refill()
+        self.tokens -= 1
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+@dataclass
+class WatchedLesson:
+    name: str
+    api_path: str
+    group: int
+    poller: Optional[FreePlacesPoller] = None
+    # monotonic time of the next poll
+    next_poll: float = 0.0
+    result: object = None
+
+
+class WaitlistWatcher:
+    """
+    Watches booked out lessons and events from a single poll loop and enrolls as soon as one of them has a free place.
+    All polls share one connection and a global request budget. Lessons are grouped,
+    a group is done when the wanted number of its lessons is enrolled, e.g. the first free one of three lessons.
+    """
+
+    def __init__(
+        self,
+        groups,
+        client,
+        login,
+        requests_per_minute=WAITLIST_DEFAULT_REQUESTS_PER_MINUTE,
+    ):
+        self.groups = groups
+        self.client = client
+        self.login = login
+        self.budget = RequestBudget(requests_per_minute)
+        self.access_token = None
+        # the lessons in the order of their priority, earlier groups and jobs first
+        self.lessons = []
+        for g, group in enumerate(groups):
+            for job in group["jobs"]:
+                _, api_path = parse_lesson_url(batch_job_lesson_url(job))
+                self.lessons.append(WatchedLesson(describe_batch_job(job), api_path, g))
+        self.enrolled = [0] * len(groups)
+
+    def run(self):
+        """
+        Watches until every group is done or all of its lessons started. Returns whether all groups are done.
+        """
+        self.access_token = self.login(True)
+        self.client.set_access_token(self.access_token)
+
+        while True:
+            watched = [lesson for lesson in self.lessons if lesson.result is None]
+            if not watched:
+                break
+            # the most overdue lesson first, on a tie the one with the higher priority
+            lesson = min(watched, key=lambda lesson: lesson.next_poll)
+            sleep_until_monotonic(lesson.next_poll)
+            self.budget.acquire()
+            self.__poll(lesson)
+
+        return all(
+            enrolled >= group["take"]
+            for enrolled, group in zip(self.enrolled, self.groups)
+        )
+
+    def __poll(self, lesson):
+        try:
+            state = self.client.get_lesson(lesson.api_path)
+        except AsvzBotException as e:
+            lesson.result = e
+            return
+        except requests.RequestException as e:
+            logging.warning("Failed to check {}: {}".format(lesson.name, e))
+            lesson.next_poll = time.monotonic() + FREE_PLACES_MIN_POLL_SECONDS
+            return
+
+        if lesson.poller is None:
+            lesson.poller = FreePlacesPoller(
+                self.client, lesson.api_path, state.enrollment_start, state.lesson_start
+            )
+        now = datetime.today()
+        if now > state.lesson_start:
+            logging.info("Stop watching {}, it has started".format(lesson.name))
+            lesson.result = AsvzBotException("Lesson has started")
+            return
+        if now < state.enrollment_start:
+            lesson.next_poll = time.monotonic() + (
+                (state.enrollment_start - now).total_seconds()
+            )
+            return
+        if not lesson.poller.observe(state):
+            lesson.next_poll = time.monotonic() + lesson.poller.next_interval(now)
+            return
+
+        logging.info("{} has a free place".format(lesson.name))
+        self.__enroll(lesson)
+
+    def __enroll(self, lesson):
+        self.budget.charge()
+        try:
+            try:
+                result = self.client.enroll(lesson.api_path)
+            except AsvzBotException:
+                logging.info("Access token expired. Logging in again.")
+                self.access_token = self.login(False)
+                self.client.set_access_token(self.access_token)
+                result = self.client.enroll(lesson.api_path)
+        except requests.RequestException as e:
+            # the other lessons keep being watched, this one is retried with the next poll
+            logging.warning("Failed to enroll to {}: {}".format(lesson.name, e))
+            lesson.next_poll = time.monotonic() + FREE_PLACES_MIN_POLL_SECONDS
+            return
+
+        if result.status == ENROLLMENT_STATUS_REJECTED:
+            logging.info(
+                "Enrollment to {} was rejected: {}".format(lesson.name, result.message)
+            )
+            # the place was taken in the meantime, but others may follow
+            lesson.poller.unchanged_polls = 0
+            lesson.next_poll = time.monotonic() + FREE_PLACES_MIN_POLL_SECONDS
+            return
+
+        logging.info("Enrolled to {}".format(lesson.name))
+        lesson.result = result
+        self.enrolled[lesson.group] += 1
+        if self.enrolled[lesson.group] >= self.groups[lesson.group]["take"]:
+            for other in self.lessons:
+                if other.group == lesson.group and other.result is None:
+                    other.result = "skipped"
+
+
+# host -> (monotonic time of the estimate, clock), shared by all jobs of the process
+_server_clocks = {}
+_server_clocks_lock = threading.Lock()
+
+
+class ServerClock:
+    """
+    Local clock corrected by the offset to the clock of a web server.
+    All sleeps are done on the monotonic clock, so adjustments of the wall clock do not affect them.
+    """
+
+    def __init__(self, offset=0.0, uncertainty=None):
+        # server time - local time in seconds
+        self.offset = offset
+        # None if the offset could not be estimated
+        self.uncertainty = uncertainty
+
+    @classmethod
+    def shared(cls, session, url, max_age=CLOCK_MAX_AGE_SECONDS):
+        """
+        Returns the clock of the server of url, estimated at most max_age seconds ago by any job of the process.
+        Concurrent callers wait for a running estimate instead of sampling the server next to each other.
+        """
+        host = urlparse(url).netloc
+        with _server_clocks_lock:
+            cached = _server_clocks.get(host)
+            if cached is not None and time.monotonic() - cached[0] < max_age:
+                return cached[1]
+
+            clock = cls.estimate(session, url)
+            # a failed estimate is retried by the next caller
+            if clock.uncertainty is not None:
+                _server_clocks[host] = (time.monotonic(), clock)
+            return clock
+
+    @classmethod
+    def estimate(
+        cls,
+        session,
+        url,
+        sample_interval=CLOCK_SAMPLE_INTERVAL_SECONDS,
+        max_samples=CLOCK_MAX_SAMPLES,
+    ):
+        samples = []
+        tick = ServerClock.__find_tick(
+            session, url, sample_interval, max_samples, samples
+        )
+        if tick is not None:
+            # the next tick is now predictable, sample it back-to-back for a tighter bound
+            tick_time, server_time, uncertainty = tick
+            next_tick_time = tick_time + math.ceil(
+                time.time() - tick_time + uncertainty
+            )
+            time.sleep(max(next_tick_time - uncertainty - time.time(), 0))
+            refined = ServerClock.__find_tick(session, url, 0, max_samples, samples)
+            if refined is not None and refined[2] < uncertainty:
+                tick = refined
+
+        if tick is not None:
+            tick_time, server_time, uncertainty = tick
+            offset = server_time - tick_time
+        elif samples:
+            # no tick observed, the server time is somewhere within the reported second
+            sent, received, server_time = samples[-1]
+            uncertainty, offset = 0.5, server_time + 0.5 - (sent + received) / 2
+        else:
+            logging.warning("Failed to estimate server clock offset. Using local clock")
+            return cls()
+
+        logging.info(
+            "Server clock offset is {:+.1f} ms (+/- {:.1f} ms)".format(
+                offset * 1000, uncertainty * 1000
+            )
+        )
+        return cls(offset, uncertainty)
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(time.time() + self.offset)
+
+    def sleep_until(self, target, lead_time=0.0):
+        """
+        Sleeps until lead_time seconds before target (in server time).
+        Returns how late the wakeup was, in seconds.
+        """
+        remaining = (target - self.now()).total_seconds() - lead_time
+        deadline = time.monotonic() + remaining
+        sleep_until_monotonic(deadline)
+        return time.monotonic() - deadline
+
+    @staticmethod
+    def __find_tick(session, url, sample_interval, max_samples, samples):
+        """
+        Samples the server clock until it ticks over to the next second.
+        Returns the local time of the tick, the server time of the tick and the uncertainty.
+        """
+        previous = None
+        for _ in range(max_samples):
+            sample = ServerClock.__sample(session, url)
+            if sample is None:
+                return None
+            samples.append(sample)
+            if previous is not None and sample[2] > previous[2]:
+                # the server handled the previous request before and this one after the tick
+                previous_mid = (previous[0] + previous[1]) / 2
+                mid = (sample[0] + sample[1]) / 2
+                return (
+                    (previous_mid + mid) / 2,
+                    sample[2],
+                    (sample[1] - previous[0]) / 2,
+                )
+            previous = sample
+            if sample_interval > 0:
+                time.sleep(sample_interval)
+        return None
+
+    @staticmethod
+    def __sample(session, url):
+        try:
+            sent = time.time()
+            response = session.get(url, timeout=5)
+            received = time.time()
+        except requests.RequestException as e:
+            logging.warning(e)
+            return None
+
+        date = response.headers.get("Date")
+        if date is None:
+            return None
+        return sent, received, parsedate_to_datetime(date).timestamp()
+
+
+def get_access_token_expiry(access_token) -> Optional[datetime]:
+    # the access token is a JWT, its payload contains the expiry as unix timestamp
+    try:
+        payload = access_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return datetime.fromtimestamp(
+            json.loads(base64.urlsafe_b64decode(payload))["exp"]
+        )
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def prewarm_connection(request) -> Optional[float]:
+    """
+    Sends the request twice. The first one opens the connection (DNS, TCP, TLS and the CONNECT of a proxy)
+    if it was closed in the meantime, the second one reuses it.
+    Returns the latency of opening the connection in seconds, or None if a request failed.
+    """
+    try:
+        started = time.monotonic()
+        request()
+        cold = time.monotonic() - started
+        started = time.monotonic()
+        request()
+        warm = time.monotonic() - started
+    except (requests.RequestException, AsvzBotException, WebDriverException) as e:
+        logging.warning("Failed to pre-warm connection: {}".format(e))
+        return None
+    return max(cold - warm, 0.0)
+
+
+def sleep_until_monotonic(deadline):
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if remaining > SPIN_WAIT_SECONDS:
+            time.sleep(remaining - SPIN_WAIT_SECONDS)
+
+
+class PhaseTimer:
+    """
+    Measures the phases of one enrollment, e.g. driver startup, login and the enrollment click,
+    and records single values like the offset of the submit time.
+    """
+
+    def __init__(self, labels=None):
+        self.labels = labels if labels is not None else {}
+        # (phase, started at, duration in seconds)
+        self.phases = []
+        self.values = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started_at = time.time()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            logging.debug("Phase '{}' took {:.3f}s".format(name, duration))
+            with self.lock:
+                self.phases.append((name, started_at, duration))
+
+    def record(self, name, value):
+        with self.lock:
+            self.values[name] = value
+
+    def durations(self):
+        """
+        Returns the total duration and the number of runs per phase.
+        """
+        totals = {}
+        with self.lock:
+            for name, _, duration in self.phases:
+                total, runs = totals.get(name, (0.0, 0))
+                totals[name] = (total + duration, runs + 1)
+        return totals
+
+
+class MetricsExporter:
+    """
+    Exports the measurements of the enrollments as JSON lines (appended, one line per phase or value)
+    and as Prometheus textfile (overwritten, the latest enrollment per label set),
+    e.g. for the textfile collector of the node exporter.
+    """
+
+    def __init__(self, jsonl_file=None, prometheus_file=None):
+        self.jsonl_file = jsonl_file
+        self.prometheus_file = prometheus_file
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    def export(self, timer):
+        with self.lock:
+            if self.jsonl_file is not None:
+                self.__export_jsonl(timer)
+            if self.prometheus_file is not None:
+                self.timers[tuple(sorted(timer.labels.items()))] = timer
+                self.__export_prometheus()
+
+    def __export_jsonl(self, timer):
+        with timer.lock:
+            records = [
+                {
+                    "type": "phase",
+                    "phase": name,
+                    "started_at": started_at,
+                    "duration_seconds": duration,
+                    **timer.labels,
+                }
+                for name, started_at, duration in timer.phases
+            ]
+            records += [
+                {"type": "value", "name": name, "value": value, **timer.labels}
+                for name, value in timer.values.items()
+            ]
+        with open(self.jsonl_file, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def __export_prometheus(self):
+        durations = []
+        runs = []
+        values = {}
+        for timer in self.timers.values():
+            for name, (total, count) in timer.durations().items():
+                labels = MetricsExporter.__labels(dict(timer.labels, phase=name))
+                durations.append(
+                    f"{METRICS_PREFIX}_phase_duration_seconds{labels} {total}"
+                )
+                runs.append(f"{METRICS_PREFIX}_phase_runs{labels} {count}")
+            with timer.lock:
+                for name, value in timer.values.items():
+                    values.setdefault(name, []).append(
+                        f"{METRICS_PREFIX}_{name}{MetricsExporter.__labels(timer.labels)} {value}"
+                    )
+
+        lines = [
+            f"# HELP {METRICS_PREFIX}_phase_duration_seconds Total duration of an enrollment phase.",
+            f"# TYPE {METRICS_PREFIX}_phase_duration_seconds gauge",
+            *durations,
+            f"# HELP {METRICS_PREFIX}_phase_runs Number of runs of an enrollment phase.",
+            f"# TYPE {METRICS_PREFIX}_phase_runs gauge",
+            *runs,
+        ]
+        for name, samples in values.items():
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} gauge")
+            lines += samples
+
+        # write atomically, the collector must never read a partial file
+        tmp_file = self.prometheus_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_file, self.prometheus_file)
+
+    @staticmethod
+    def __labels(labels):
+        return (
+            "{"
+            + ",".join(
+                '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                for k, v in sorted(labels.items())
+            )
+            + "}"
+        )
+
+
+class BrowserPool:
+    """
+    Keeps started browsers ready, so that the login and the enrollment do not wait for Chrome to start.
+    Browsers are checked before they are handed out and reset when they are returned.
+    """
+
+    def __init__(
+        self,
+        chromedriver_path,
+        proxy_url=None,
+        lean=False,
+        capture_network=False,
+        size=BROWSER_POOL_DEFAULT_SIZE,
+        max_size=BROWSER_POOL_DEFAULT_MAX_SIZE,
+        max_uses=BROWSER_POOL_MAX_USES,
+    ):
+        if size < 0 or max_size < 1 or size > max_size:
+            raise AsvzBotException(
+                "Invalid browser pool size {} (at most {} browsers)".format(
+                    size, max_size
+                )
+            )
+        self.chromedriver_path = chromedriver_path
+        self.proxy_url = proxy_url
+        self.lean = lean
+        self.capture_network = capture_network
+        self.size = size
+        self.max_size = max_size
+        self.max_uses = max_uses
+
+        self.condition = threading.Condition()
+        self.idle = []
+        # started browser -> number of uses
+        self.uses = {}
+        self.starting = 0
+        self.closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        """
+        Starts the idle browsers in the background.
+        """
+        self.__refill()
+
+    def acquire(self, timeout=None):
+        """
+        Returns an idle browser or starts a new one. If the maximum number of browsers is in use,
+        it waits until one is released.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.condition:
+                while True:
+                    if self.closed:
+                        raise AsvzBotException("Browser pool is closed")
+                    if self.idle:
+                        driver = self.idle.pop()
+                        break
+                    if len(self.uses) + self.starting < self.max_size:
+                        driver = None
+                        self.starting += 1
+                        break
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        raise AsvzBotException(
+                            "All {} browsers are in use".format(self.max_size)
+                        )
+                    self.condition.wait(remaining)
+
+            if driver is None:
+                logging.info("No started browser available, starting a new one")
+                driver = self.__start_driver()
+            elif not BrowserPool.is_healthy(driver):
+                logging.warning("Discarding unresponsive browser")
+                self.__discard(driver)
+                continue
+
+            self.__refill()
+            return driver
+
+    def release(self, driver):
+        """
+        Resets a browser and keeps it for the next use.
+        """
+        with self.condition:
+            self.uses[driver] += 1
+            recycle = self.closed or self.uses[driver] >= self.max_uses
+
+        if not recycle:
+            try:
+                self.__reset(driver)
+            except WebDriverException as e:
+                logging.warning("Failed to reset browser: {}".format(e))
+                recycle = True
+
+        if recycle:
+            self.__discard(driver)
+            self.__refill()
+            return
+
+        with self.condition:
+            if not self.closed:
+                self.idle.append(driver)
+                self.condition.notify()
+                return
+        self.__discard(driver)
+
+    def close(self):
+        """
+        Quits the idle browsers. Browsers in use are quit when they are released.
+        """
+        with self.condition:
+            self.closed = True
+            idle = self.idle
+            self.idle = []
+            self.condition.notify_all()
+        for driver in idle:
+            self.__discard(driver)
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def __refill(self):
+        with self.condition:
+            if self.closed:
+                return
+            missing = min(
+                self.size - len(self.idle) - self.starting,
+                self.max_size - len(self.uses) - self.starting,
+            )
+            self.starting += max(0, missing)
+
+        for _ in range(missing):
+            threading.Thread(
+                target=self.__start_idle_driver, name="browser-pool", daemon=True
+            ).start()
+
+    def __start_idle_driver(self):
+        try:
+            driver = self.__start_driver()
+        except Exception as e:
+            logging.warning("Failed to start browser: {}".format(e))
+            return
+
+        with self.condition:
+            if not self.closed:
+                self.idle.append(driver)
+                self.condition.notify()
+                return
+        self.__discard(driver)
+
+    def __start_driver(self):
+        # the caller reserved a slot by incrementing self.starting
+        driver = None
+        try:
+            driver = AsvzEnroller.get_driver(
+                self.chromedriver_path,
+                self.proxy_url,
+                self.lean,
+                self.capture_network,
+            )
+            return driver
+        finally:
+            with self.condition:
+                self.starting -= 1
+                if driver is not None:
+                    self.uses[driver] = 0
+                self.condition.notify()
+
+    def __reset(self, driver):
+        origins = {LESSON_BASE_URL}
+        origin = driver.execute_script("return window.location.origin;")
+        if origin and origin.startswith("http"):
+            origins.add(origin)
+
+        # a new tab drops the scripts and DevTools settings of the previous use
+        old_handles = driver.window_handles
+        driver.switch_to.new_window("tab")
+        new_handle = driver.current_window_handle
+        for handle in old_handles:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(new_handle)
+
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        for origin in origins:
+            driver.execute_cdp_cmd(
+                "Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"}
+            )
+        if self.lean:
+            AsvzEnroller.block_urls(driver)
+        if self.capture_network:
+            # drop the network events of the previous use
+            driver.get_log("performance")
+
+    def __discard(self, driver):
+        with self.condition:
+            self.uses.pop(driver, None)
+            if driver in self.idle:
+                self.idle.remove(driver)
+            self.condition.notify()
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.debug("Failed to quit browser: {}".format(e))
+
+
+class SharedBrowser:
+    """
+    A single browser shared by the logins of several accounts. Each login gets its own browser context,
+    i.e. its own cookies and storage. The logins take turns, as the browser is driven by one WebDriver session.
+    """
+
+    def __init__(
+        self, chromedriver_path, proxy_url=None, lean=False, browser_pool=None
+    ):
+        self.chromedriver_path = chromedriver_path
+        self.proxy_url = proxy_url
+        self.lean = lean
+        self.browser_pool = browser_pool
+        self.lock = threading.Lock()
+        self.driver = None
+        self.default_handle = None
+        self.context_id = None
+
+    def open_context(self):
+        """
+        Waits for the browser and returns it switched to a new, empty browser context.
+        """
+        self.lock.acquire()
+        try:
+            if self.driver is not None and not BrowserPool.is_healthy(self.driver):
+                logging.warning("Restarting unresponsive shared browser")
+                self.__quit()
+            if self.driver is None:
+                # started on the first login, the accounts with cached sessions do not need it
+                if self.browser_pool is not None:
+                    self.driver = self.browser_pool.acquire()
+                else:
+                    self.driver = AsvzEnroller.get_driver(
+                        self.chromedriver_path, self.proxy_url, self.lean
+                    )
+                self.default_handle = self.driver.current_window_handle
+
+            self.context_id = self.driver.execute_cdp_cmd(
+                "Target.createBrowserContext", {}
+            )["browserContextId"]
+            target_id = self.driver.execute_cdp_cmd(
+                "Target.createTarget",
+                {"url": "about:blank", "browserContextId": self.context_id},
+            )["targetId"]
+            # the window handles of chromedriver are the DevTools target IDs
+            self.driver.switch_to.window(target_id)
+            if self.lean:
+                AsvzEnroller.block_urls(self.driver)
+            return self.driver
+        except Exception:
+            self.lock.release()
+            raise
+
+    def close_context(self, driver):
+        """
+        Drops the browser context with its cookies and hands the browser to the next login.
+        """
+        try:
+            driver.close()
+            driver.switch_to.window(self.default_handle)
+            driver.execute_cdp_cmd(
+                "Target.disposeBrowserContext", {"browserContextId": self.context_id}
+            )
+        except WebDriverException as e:
+            logging.warning("Failed to close browser context: {}".format(e))
+            self.__quit()
+        finally:
+            self.context_id = None
+            self.lock.release()
+
+    def close(self):
+        with self.lock:
+            if self.driver is not None:
+                self.__quit()
+
+    def __quit(self):
+        driver = self.driver
+        self.driver = None
+        if self.browser_pool is not None:
+            self.browser_pool.release(driver)
+        else:
+            driver.quit()
+
+
+class AsvzEnroller:
+    @classmethod
+    def from_lesson_attributes(
+        cls,
+        chromedriver_path,
+        weekday,
+        start_time,
+        trainer,
+        facility,
+        level,
+        sport_id,
+        proxy_url,
+        creds,
+        driver=None,
+        lesson_date=None,
+        resolver=None,
+        **kwargs,
+    ):
+        if lesson_date is not None:
+            weekday_date = lesson_date
+        else:
+            today = datetime.today()
+            weekday_int = time.strptime(WEEKDAYS[weekday], "%A").tm_wday
+            weekday_date = today + timedelta((weekday_int - today.weekday()) % 7)
+        expected_lesson_start = datetime(
+            weekday_date.year,
+            weekday_date.month,
+            weekday_date.day,
+            start_time.hour,
+            start_time.minute,
+        )
+
+        resolver = resolver or SportfahrplanResolver(proxy_url)
+        lookup_key = LessonLookupCache.key(
+            sport_id, facility, level, expected_lesson_start, trainer
+        )
+        lesson_url = resolver.cache.get(lookup_key) if resolver.cache else None
+        if lesson_url is not None:
+            logging.info("Found lesson '{}' in lookup cache".format(lesson_url))
+            return cls(chromedriver_path, lesson_url, creds, proxy_url, **kwargs)
+
+        sport_url = sportfahrplan_url(sport_id, facility, level, expected_lesson_start)
+        logging.info("Searching lesson on '{}'".format(sport_url))
+
+        try:
+            lesson_url = resolver.find_lesson_url(sport_url, trainer)
+            if lesson_url is None:
+                logging.info(
+                    "Sportfahrplan is not rendered on the server, searching with the browser"
+                )
+                lesson_url = AsvzEnroller.__find_lesson_url_with_browser(
+                    chromedriver_path,
+                    proxy_url,
+                    sport_url,
+                    trainer,
+                    driver,
+                    kwargs.get("lean_browser", False),
+                    kwargs.get("timeouts") or WaitTimeouts(),
+                    kwargs.get("browser_pool"),
+                )
+            logging.debug(f"Found lesson url: {lesson_url}")
+
+            # When there is no lesson on the requested day, the ASVZ webpage returns the first lesson on the next day with lessons.
+            lesson_start = resolver.get_lesson_start(lesson_url)
+        except LessonNotFoundException as e:
+            logging.error(
+                "Lesson not found! Make sure the lesson is visible on the above URL and the name of the trainer matches."
+            )
+            raise e
+
+        if lesson_start != expected_lesson_start:
+            logging.error(
+                "No lesson on the specified date and time! Most likely, you are trying to enroll on a holiday."
+            )
+            raise NoLessonOnDateException("No lesson on the specified date")
+
+        if resolver.cache:
+            resolver.cache.store(lookup_key, lesson_url)
+        return cls(chromedriver_path, lesson_url, creds, proxy_url, **kwargs)
+
+    @classmethod
+    def from_next_training(
+        cls,
+        chromedriver_path,
+        training,
+        proxy_url,
+        creds,
+        weeks=LOOKAHEAD_DEFAULT_WEEKS,
+        resolver=None,
+        **kwargs,
+    ):
+        """
+        Enrolls to the next lesson of a weekly training. Looks ahead the given number of weeks
+        and skips the weeks without lesson, e.g. holidays, instead of failing.
+        """
+        resolver = resolver or SportfahrplanResolver(proxy_url)
+        occurrences = find_training_lessons(resolver, training, datetime.today(), weeks)
+        if occurrences is None:
+            logging.info(
+                "Sportfahrplan is not rendered on the server, searching this week's lesson"
+            )
+            return cls.from_lesson_attributes(
+                chromedriver_path,
+                training["weekday"],
+                training["start_time"],
+                training["trainer"],
+                training["facility"],
+                training["level"],
+                training["sport_id"],
+                proxy_url,
+                creds,
+                resolver=resolver,
+                **kwargs,
+            )
+        if not occurrences:
+            logging.error(
+                "Lesson not found! Make sure the lesson is visible on the Sportfahrplan and the name of the trainer matches."
+            )
+            raise LessonNotFoundException("Lesson not found")
+
+        for occurrence in occurrences:
+            if occurrence.lesson_url is None:
+                logging.info(
+                    "No lesson on {}, most likely a holiday. Skipping it.".format(
+                        occurrence.lesson_start.strftime("%d.%m.%Y")
+                    )
+                )
+                continue
+            logging.info(
+                "Found lesson '{}' on {}".format(
+                    occurrence.lesson_url,
+                    occurrence.lesson_start.strftime("%d.%m.%Y %H:%M"),
+                )
+            )
+            return cls(
+                chromedriver_path, occurrence.lesson_url, creds, proxy_url, **kwargs
+            )
+
+        logging.error(
+            "No lesson in the next {} weeks! Most likely, there are holidays.".format(
+                len(occurrences)
+            )
+        )
+        raise NoLessonOnDateException("No lesson in the next weeks")
+
+    @staticmethod
+    def __find_lesson_url_with_browser(
+        chromedriver_path,
+        proxy_url,
+        sport_url,
+        trainer,
+        driver=None,
+        lean=False,
+        timeouts=WaitTimeouts(),
+        browser_pool=None,
+    ):
+        # a driver passed by the caller is reused and not quit
+        own_driver = driver is None
+        try:
+            if own_driver and browser_pool is not None:
+                driver = browser_pool.acquire()
+            elif own_driver:
+                driver = AsvzEnroller.get_driver(chromedriver_path, proxy_url, lean)
+            driver.get(sport_url)
+
+            day_ele = WebDriverWait(driver, timeouts.page).until(
+                EC.presence_of_element_located((By.XPATH, SPORTFAHRPLAN_DAY_XPATH))
+            )
+
+            if trainer:
+                lesson = day_ele.find_element(
+                    By.XPATH,
+                    ".//li[@class='btn-hover-parent'][contains(., '{}')]".format(
+                        trainer,
+                    ),
+                )
+            else:
+                lesson = day_ele.find_element(
+                    By.XPATH, ".//li[@class='btn-hover-parent']"
+                )
+            logging.debug("Found lesson")
+
+            return lesson.find_element(
+                By.XPATH, ".//a[starts-with(@href, '{}')]".format(LESSON_BASE_URL)
+            ).get_attribute("href")
+        except (NoSuchElementException, TimeoutException):
+            raise LessonNotFoundException("Lesson not found")
+        finally:
+            if own_driver and driver is not None and browser_pool is not None:
+                browser_pool.release(driver)
+            elif own_driver and driver is not None:
+                driver.quit()
+
+    @staticmethod
+    def get_driver(
+        chromedriver_path, proxy_url=None, lean=False, capture_network=False
+    ):
+        driver = webdriver.Chrome(
+            service=Service(chromedriver_path),
+            options=AsvzEnroller.get_driver_options(proxy_url, lean, capture_network),
+        )
+        if lean:
+            AsvzEnroller.block_urls(driver)
+        return driver
+
+    @staticmethod
+    def block_urls(driver):
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": LEAN_BROWSER_BLOCKED_URLS}
+        )
+
+    @staticmethod
+    def get_driver_options(proxy_url=None, lean=False, capture_network=False):
+        options = Options()
+        options.add_argument("--private")
+        options.add_argument("--headless")
+        options.add_argument(
+            "--no-sandbox"
+        )  # Required for running as root user in Docker container
+        options.add_argument(
+            "--disable-dev-shm-usage"
+        )  # Required for running as root user in Docker container
+        prefs = {"intl.accept_languages": "de"}
+        if proxy_url is not None:
+            options.add_argument(f"--proxy-server={proxy_url}")
+
+        if lean:
+            # do not wait for images, stylesheets and frames, the bot waits for the elements it needs
+            options.page_load_strategy = "eager"
+            prefs["profile.managed_default_content_settings.images"] = 2
+            options.add_argument("--blink-settings=imagesEnabled=false")
+            options.add_argument("--disable-extensions")
+            options.add_argument("--disable-background-networking")
+            options.add_argument("--disable-component-update")
+            options.add_argument("--disable-default-apps")
+            options.add_argument("--mute-audio")
+            if proxy_url is None:
+                # a proxy resolves the hosts itself
+                options.add_argument(
+                    "--host-resolver-rules=MAP * ~NOTFOUND, {}".format(
+                        ", ".join(
+                            f"EXCLUDE {host}" for host in LEAN_BROWSER_ALLOWED_HOSTS
+                        )
+                    )
+                )
+
+        if capture_network:
+            # the performance log contains the DevTools network events
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+        options.add_experimental_option("prefs", prefs)
+        return options
+
+    @staticmethod
+    def wait_until(enrollment_start, clock=None, keepalive=None):
+        clock = clock or ServerClock()
+        current_time = clock.now()
+
+        logging.info(
+            "\n\tcurrent time: {}\n\tenrollment time: {}".format(
+                current_time.strftime("%H:%M:%S"), enrollment_start.strftime("%H:%M:%S")
+            )
+        )
+
+        login_before_enrollment_seconds = 1 * 59
+        sleep_time = (
+            enrollment_start - current_time
+        ).total_seconds() - login_before_enrollment_seconds
+        if sleep_time > 0:
+            logging.info(
+                "Sleep for {:.0f} seconds until {}".format(
+                    sleep_time,
+                    (current_time + timedelta(seconds=sleep_time)).strftime("%H:%M:%S"),
+                )
+            )
+            deadline = time.monotonic() + sleep_time
+            while (
+                keepalive is not None
+                and deadline - time.monotonic() > SESSION_KEEPALIVE_INTERVAL_SECONDS
+            ):
+                time.sleep(SESSION_KEEPALIVE_INTERVAL_SECONDS)
+                keepalive()
+            sleep_until_monotonic(deadline)
+
+    def __init__(
+        self,
+        chromedriver,
+        lesson_url,
+        creds,
+        proxy_url=None,
+        backend=BACKEND_BROWSER,
+        lead_time=0.0,
+        session_cache=None,
+        account_session=None,
+        metrics=None,
+        lean_browser=False,
+        timeouts=None,
+        capture_network=False,
+        idp_cache=None,
+        browser_pool=None,
+        hedge_attempts=1,
+        hedge_stagger=0.0,
+        shared_browser=None,
+        job_store=None,
+    ):
+        self.chromedriver = chromedriver
+        self.lesson_url = lesson_url
+        self.creds = creds
+        self.proxy_url = proxy_url
+        self.backend = backend
+        self.lead_time = lead_time
+        self.session_cache = session_cache
+        self.account_session = account_session
+        self.metrics = metrics
+        self.lean_browser = lean_browser
+        self.timeouts = timeouts or WaitTimeouts()
+        self.capture_network = capture_network
+        self.network_capture = None
+        self.idp_cache = idp_cache
+        self.browser_pool = browser_pool
+        self.hedge_attempts = hedge_attempts
+        self.hedge_stagger = hedge_stagger
+        self.shared_browser = shared_browser
+        self.job_store = job_store
+        self.timer = PhaseTimer({"lesson": lesson_url, "backend": backend})
+
+        logging.info(
+            "Summary:\n\tOrganisation: {}\n\tUsername: {}\n\tPassword: {}\n\tLesson: {}\n\tBackend: {}".format(
+                self.creds[CREDENTIALS_ORG],
+                self.creds[CREDENTIALS_UNAME],
+                "*" * len(self.creds[CREDENTIALS_PW]),
+                self.lesson_url,
+                self.backend,
+            )
+        )
+
+    def enroll(self):
+        job = (
+            self.lesson_url,
+            self.creds[CREDENTIALS_ORG],
+            self.creds[CREDENTIALS_UNAME],
+        )
+        if self.job_store is not None:
+            stored = self.job_store.get_job(*job)
+            if stored is not None and stored["status"] in JOB_FINISHED_STATUSES:
+                logging.info(
+                    "Skipping lesson, the job store has it as {} (disable with --no-job-store)".format(
+                        stored["status"]
+                    )
+                )
+                return EnrollmentResult(
+                    stored["status"], enrollment_number=stored["enrollment_number"]
+                )
+            self.job_store.start_job(*job)
+
+        try:
+            if self.backend == BACKEND_HTTP:
+                result = self.__enroll_http()
+            else:
+                result = self.__enroll_browser()
+        except Exception as e:
+            if self.job_store is not None:
+                self.job_store.finish(*job, JOB_STATUS_FAILED, message=str(e))
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.export(self.timer)
+            if self.job_store is not None:
+                self.job_store.record_phases(*job, self.timer)
+
+        if self.job_store is not None and result is not None:
+            self.job_store.finish(
+                *job, result.status, result.enrollment_number, result.message
+            )
+        return result
+
+    def __store_lesson_times(self):
+        if self.job_store is not None:
+            self.job_store.set_lesson_times(
+                self.lesson_url,
+                self.creds[CREDENTIALS_ORG],
+                self.creds[CREDENTIALS_UNAME],
+                self.enrollment_start,
+                self.lesson_start,
+            )
+
+    def __prewarm(self, clock, **connections):
+        """
+        Sleeps until shortly before the enrollment opens and reopens the connections.
+        Each keyword is the name of a connection and a function returning the handshake latencies of its sessions.
+        """
+        prewarm_at = self.enrollment_start - timedelta(
+            seconds=CONNECTION_PREWARM_SECONDS + self.lead_time
+        )
+        if clock.now() < prewarm_at:
+            clock.sleep_until(prewarm_at)
+
+        with self.timer.phase("prewarm"):
+            for name, prewarm in connections.items():
+                latencies = [latency for latency in prewarm() if latency is not None]
+                if not latencies:
+                    continue
+                # the slowest session shows what the enrollment request would have paid
+                latency = max(latencies)
+                self.timer.record(f"prewarm_{name}_handshake_seconds", latency)
+                logging.info(
+                    "Pre-warmed {} connection, opening it took {:.1f} ms".format(
+                        name, latency * 1000
+                    )
+                )
+
+    @staticmethod
+    def __fetch_in_browser(driver, url):
+        status = driver.execute_async_script(PREWARM_SCRIPT, url)
+        if not isinstance(status, int):
+            raise WebDriverException("Failed to fetch {}: {}".format(url, status))
+
+    def __store_attempt(self, result):
+        if self.job_store is not None:
+            self.job_store.add_attempt(
+                self.lesson_url,
+                self.creds[CREDENTIALS_ORG],
+                self.creds[CREDENTIALS_UNAME],
+                result,
+            )
+
+    def __enroll_http(self):
+        api_base_url, api_path = parse_lesson_url(self.lesson_url)
+
+        logging.info("Checking login credentials")
+        if self.account_session is not None:
+            client = self.account_session.client
+            access_token = self.account_session.get_access_token(
+                self.__login_for_access_token
+            )
+        else:
+            access_token = self.__login_for_access_token()
+            client = SchalterClient(
+                api_base_url, self.proxy_url, access_token=access_token
+            )
+        hedge = None
+        if self.hedge_attempts > 1:
+            # each attempt has its own session and thus its own connection
+            hedge = HedgedEnrollment(
+                [client]
+                + [
+                    SchalterClient(
+                        api_base_url,
+                        self.proxy_url,
+                        access_token=access_token,
+                        dedicated=True,
+                    )
+                    for _ in range(self.hedge_attempts - 1)
+                ],
+                self.hedge_stagger,
+            )
+        try:
+            with self.timer.phase("lesson_state"):
+                lesson = client.get_lesson(api_path)
+            self.enrollment_start = lesson.enrollment_start
+            self.lesson_start = lesson.lesson_start
+            self.__store_lesson_times()
+            logging.info(
+                "Enrollment starts at {}".format(
+                    self.enrollment_start.strftime("%H:%M:%S")
+                )
+            )
+            logging.info(
+                "Lesson starts at {}".format(self.lesson_start.strftime("%H:%M:%S"))
+            )
+
+            with self.timer.phase("clock_sync"):
+                clock = ServerClock.shared(client.session, f"{api_base_url}/{api_path}")
+            if clock.now() < self.enrollment_start:
+                AsvzEnroller.wait_until(self.enrollment_start, clock)
+
+                expiry = get_access_token_expiry(access_token)
+                if expiry is not None and expiry < self.enrollment_start + timedelta(
+                    seconds=SESSION_REFRESH_MARGIN_SECONDS
+                ):
+                    logging.info(
+                        "Access token expires at {}. Logging in again.".format(
+                            expiry.strftime("%H:%M:%S")
+                        )
+                    )
+                    access_token = self.__login_again(client, access_token)
+
+                # re-estimate, the local clock may have drifted during the long sleep
+                with self.timer.phase("clock_sync"):
+                    clock = ServerClock.shared(
+                        client.session, f"{api_base_url}/{api_path}"
+                    )
+                if hedge is not None:
+                    hedge.set_access_token(access_token)
+                    self.__prewarm(clock, hedge=lambda: hedge.warm_up(api_path))
+                else:
+                    self.__prewarm(
+                        clock,
+                        api=lambda: [
+                            prewarm_connection(lambda: client.get_lesson(api_path))
+                        ],
+                    )
+                lateness = clock.sleep_until(self.enrollment_start, self.lead_time)
+                self.timer.record("wakeup_lateness_seconds", lateness)
+                logging.info(
+                    "Woke up {:.1f} ms after the scheduled time ({} ms before enrollment start)".format(
+                        lateness * 1000, int(self.lead_time * 1000)
+                    )
+                )
+
+            logging.info("Starting enrollment")
+            poller = None
+            rejected = False
+            hedged = False
+            # a token that was rejected right after logging in again is not retried, e.g. without membership
+            fresh_token = False
+            while True:
+                # in server time, the local clock of a container may drift by more than the grace window
+                opening_passed = clock.now() > self.enrollment_start + timedelta(
+                    seconds=ENROLLMENT_OPENING_GRACE_SECONDS
+                )
+                if opening_passed:
+                    logging.info(
+                        "Enrollment is already open. Checking for available places."
+                    )
+                    if poller is None:
+                        poller = FreePlacesPoller(
+                            client, api_path, self.enrollment_start, self.lesson_start
+                        )
+                    with self.timer.phase("free_places"):
+                        poller.wait_for_free_places(after_rejection=rejected)
+                    logging.info("Lesson has free places")
+
+                try:
+                    submitted_at = clock.now()
+                    self.__record_submit_offset(submitted_at)
+                    with self.timer.phase("enroll_request"):
+                        # only the first request at the opening is hedged, retries would just multiply the requests
+                        if hedge is not None and not hedged and not opening_passed:
+                            hedged = True
+                            result = hedge.enroll(api_path)
+                        else:
+                            result = client.enroll(api_path)
+                    logging.info(
+                        "Submitted enrollment request {:+.1f} ms from enrollment start (server time)".format(
+                            (submitted_at - self.enrollment_start).total_seconds()
+                            * 1000
+                        )
+                    )
+                except AsvzBotException:
+                    if fresh_token:
+                        raise
+                    logging.info("Access token expired. Logging in again.")
+                    access_token = self.__login_again(client, access_token)
+                    if hedge is not None:
+                        hedge.set_access_token(access_token)
+                    fresh_token = True
+                    continue
+                except requests.RequestException as e:
+                    # the request may have reached the server, a retry then reports the enrollment as duplicate
+                    logging.warning("Enrollment request failed: {}".format(e))
+                    self.__reread_lesson_state(client, api_path)
+                    time.sleep(ENROLLMENT_RETRY_INTERVAL_SECONDS)
+                    continue
+
+                fresh_token = False
+                self.__store_attempt(result)
+                if result.status == ENROLLMENT_STATUS_ENROLLED:
+                    logging.info("Successfully enrolled. Train hard and have fun!")
+                    if result.enrollment_number is not None:
+                        logging.info(
+                            f"Your enrollment number is {result.enrollment_number}"
+                        )
+                    return result
+                if result.status == ENROLLMENT_STATUS_ALREADY_ENROLLED:
+                    logging.info("Already enrolled to this lesson.")
+                    return result
+
+                logging.info(
+                    "Enrollment request was rejected: {}".format(result.message)
+                )
+                # after the opening, the free places poller takes over right away
+                rejected = True
+                if not opening_passed:
+                    time.sleep(ENROLLMENT_RETRY_INTERVAL_SECONDS)
+        finally:
+            if hedge is not None:
+                hedge.close()
+                for hedge_client in hedge.clients[1:]:
+                    hedge_client.close()
+            if self.account_session is None:
+                client.close()
+
+    def __reread_lesson_state(self, client, api_path):
+        try:
+            lesson = client.get_lesson(api_path)
+        except (AsvzBotException, requests.RequestException) as e:
+            logging.warning("Failed to read lesson state: {}".format(e))
+            return
+        self.enrollment_start = lesson.enrollment_start
+        self.lesson_start = lesson.lesson_start
+
+    def __record_submit_offset(self, submitted_at):
+        # only the first submit is compared against the intended submit time
+        if "submit_offset_seconds" in self.timer.values:
+            return
+        intended = self.enrollment_start - timedelta(seconds=self.lead_time)
+        self.timer.record(
+            "submit_offset_seconds", (submitted_at - intended).total_seconds()
+        )
+
+    def login(self, use_cache=True):
+        """
+        Returns an access token, logging in with the browser unless a cached session is still valid.
+        """
+        return self.__login_for_access_token(use_cache)
+
+    def __login_again(self, client, stale_access_token):
+        if self.account_session is not None:
+            return self.account_session.get_access_token(
+                lambda: self.__login_for_access_token(use_cache=False),
+                stale_access_token,
+            )
+
+        access_token = self.__login_for_access_token(use_cache=False)
+        client.set_access_token(access_token)
+        return access_token
+
+    def __login_for_access_token(self, use_cache=True):
+        session = self.__load_cached_session() if use_cache else None
+        if session is not None:
+            expiry = get_access_token_expiry(session["access_token"])
+            if (
+                expiry is None or expiry > datetime.today()
+            ) and self.__is_session_authorized(session):
+                logging.info("Reusing cached login session")
+                return session["access_token"]
+
+        driver = None
+        try:
+            driver = self.__start_driver()
+            driver.get(self.lesson_url)
+            self.__organisation_login(driver)
+            access_token = self.__wait_for_access_token(driver)
+        except (NoSuchElementException, TimeoutException) as e:
+            logging.error(NO_SUCH_ELEMENT_ERR_MSG)
+            raise e
+        finally:
+            if driver is not None:
+                self.__stop_driver(driver)
+
+        if access_token is None:
+            raise AsvzBotException("Failed to get an access token after login")
+        return access_token
+
+    def __start_driver(self, capture_network=False):
+        with self.timer.phase("driver_startup"):
+            if self.shared_browser is not None:
+                return self.shared_browser.open_context()
+            if self.browser_pool is not None:
+                return self.browser_pool.acquire()
+            return AsvzEnroller.get_driver(
+                self.chromedriver, self.proxy_url, self.lean_browser, capture_network
+            )
+
+    def __stop_driver(self, driver):
+        if self.shared_browser is not None:
+            self.shared_browser.close_context(driver)
+        elif self.browser_pool is not None:
+            self.browser_pool.release(driver)
+        else:
+            driver.quit()
+
+    def __load_cached_session(self):
+        if self.session_cache is None:
+            return None
+        return self.session_cache.load(
+            self.creds[CREDENTIALS_ORG], self.creds[CREDENTIALS_UNAME]
+        )
+
+    def __is_session_authorized(self, session):
+        """
+        A cached access token may be revoked before it expires, e.g. by a logout in another browser.
+        One authenticated request finds out now, instead of the enrollment request at the opening.
+        """
+        api_base_url, _ = parse_lesson_url(self.lesson_url)
+        client = SchalterClient(api_base_url, self.proxy_url)
+        try:
+            client.load_session(session)
+            if client.is_authorized():
+                return True
+        except requests.RequestException as e:
+            # the enrollment finds out about a revoked token as well, the login is not repeated for nothing
+            logging.warning("Failed to check cached login session: {}".format(e))
+            return True
+        finally:
+            client.close()
+
+        logging.info("Cached login session is no longer valid")
+        self.session_cache.invalidate(
+            self.creds[CREDENTIALS_ORG], self.creds[CREDENTIALS_UNAME]
+        )
+        return False
+
+    def __restore_session(self, driver):
+        session = self.__load_cached_session()
+        if session is None:
+            return
+
+        logging.info("Restoring cached login session")
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": session["cookies"]})
+        driver.execute_cdp_cmd(
+            "Page.addScriptToEvaluateOnNewDocument",
+            {
+                "source": STORAGE_RESTORE_SCRIPT
+                % (json.dumps(session["origin"]), json.dumps(session["storage"]))
+            },
+        )
+
+    def __save_session(self, driver):
+        if self.session_cache is None:
+            return
+
+        access_token = self.__wait_for_access_token(driver)
+        if access_token is None:
+            return
+        self.session_cache.store(
+            self.creds[CREDENTIALS_ORG],
+            self.creds[CREDENTIALS_UNAME],
+            LESSON_URL_REGEX.match(self.lesson_url).group("base"),
+            driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"],
+            driver.execute_script(STORAGE_SNAPSHOT_SCRIPT),
+            access_token,
+        )
+
+    def __wait_for_access_token(self, driver):
+        # the web app stores the access token shortly after the page was loaded
+        try:
+            return WebDriverWait(driver, self.timeouts.page).until(
+                lambda d: d.execute_script(ACCESS_TOKEN_SCRIPT)
+            )
+        except TimeoutException:
+            return None
+
+    def __enroll_browser(self):
+        api_base_url, api_path = parse_lesson_url(self.lesson_url)
+        # the browser is only used for the login and the enrollment, polling is done over HTTP
+        client = SchalterClient(api_base_url, self.proxy_url)
+
+        logging.info("Checking login credentials")
+        driver = None
+        try:
+            # the same logged in browser session is used from the login check until the enrollment
+            driver = self.__start_driver(self.capture_network)
+            if self.capture_network:
+                self.network_capture = NetworkCapture(driver, api_path)
+            self.__restore_session(driver)
+            with self.timer.phase("page_load"):
+                self.__refresh_session(driver)
+            with self.timer.phase("lesson_times"):
+                self.enrollment_start, self.lesson_start = self.__get_lesson_times(
+                    driver
+                )
+            self.__store_lesson_times()
+
+            with self.timer.phase("clock_sync"):
+                clock = ServerClock.shared(client.session, self.lesson_url)
+            if clock.now() < self.enrollment_start:
+                AsvzEnroller.wait_until(
+                    self.enrollment_start,
+                    clock,
+                    keepalive=lambda: self.__refresh_session(driver),
+                )
+                self.__refresh_session(driver)
+                api_url = "{}/{}".format(api_base_url, api_path)
+                self.__prewarm(
+                    clock,
+                    browser=lambda: [
+                        prewarm_connection(
+                            lambda: AsvzEnroller.__fetch_in_browser(driver, api_url)
+                        )
+                    ],
+                    api=lambda: [
+                        prewarm_connection(lambda: client.get_lesson(api_path))
+                    ],
+                )
+
+            logging.info("Starting enrollment")
+
+            while True:
+                if self.enrollment_start < clock.now():
+                    logging.info(
+                        "Enrollment is already open. Checking for available places."
+                    )
+                    with self.timer.phase("free_places"):
+                        self.__wait_for_free_places(driver, client, api_path)
+
+                logging.info("Lesson has free places")
+
+                if not self.__is_logged_in(driver):
+                    self.__organisation_login(driver)
+
+                try:
+                    logging.info("Waiting for enrollment")
+                    register_button = WebDriverWait(driver, 5 * 60).until(
+                        EC.element_to_be_clickable(
+                            (
+                                By.XPATH,
+                                "//button[@id='btnRegister' and (@class='btn-primary btn enrollmentPlacePadding' or @class='btn btn-default')]",
+                            )
+                        )
+                    )
+                    if self.network_capture is not None:
+                        self.network_capture.enrollment_result = None
+                    self.__record_submit_offset(clock.now())
+                    with self.timer.phase("click"):
+                        register_button.click()
+                except TimeoutException as e:
+                    logging.info(
+                        "Place was already taken in the meantime. Rechecking for available places."
+                    )
+                    continue
+
+                logging.info("Submitted enrollment request.")
+
+                with self.timer.phase("enrollment_result"):
+                    result = self.__log_enrollment_result(driver)
+                self.__store_attempt(result)
+                return result
+
+        except NoSuchElementException as e:
+            logging.error(NO_SUCH_ELEMENT_ERR_MSG)
+            raise e
+        finally:
+            if driver is not None:
+                self.__stop_driver(driver)
+            client.close()
+
+    def __get_lesson_times(self, driver):
+        if self.network_capture is not None:
+            try:
+                state = self.network_capture.wait_for(
+                    "lesson_state", self.timeouts.page
+                )
+            except TimeoutException:
+                logging.warning("Lesson details were not captured, reading the page")
+            else:
+                logging.info(
+                    "Enrollment starts at {}".format(
+                        state.enrollment_start.strftime("%H:%M:%S")
+                    )
+                )
+                logging.info(
+                    "Lesson starts at {}".format(
+                        state.lesson_start.strftime("%H:%M:%S")
+                    )
+                )
+                return state.enrollment_start, state.lesson_start
+
+        return AsvzEnroller.__get_enrollment_and_start_time(driver, self.timeouts)
+
+    def __log_enrollment_result(self, driver):
+        if self.network_capture is not None:
+            try:
+                result = self.network_capture.wait_for(
+                    "enrollment_result", self.timeouts.enrollment
+                )
+            except TimeoutException:
+                logging.warning("Enrollment result was not captured, reading the page")
+            else:
+                if result.status == ENROLLMENT_STATUS_ENROLLED:
+                    logging.info("Successfully enrolled. Train hard and have fun!")
+                    if result.enrollment_number is not None:
+                        logging.info(
+                            f"Your enrollment number is {result.enrollment_number}"
+                        )
+                elif result.status == ENROLLMENT_STATUS_ALREADY_ENROLLED:
+                    logging.info("Already enrolled to this lesson.")
+                else:
+                    logging.warning(
+                        "Enrollment was rejected: {}. Please check your E-Mail.".format(
+                            result.message
+                        )
+                    )
+                return result
+
+        try:
+            snapshot = AsvzEnroller.wait_for_snapshot(
+                driver,
+                self.timeouts.enrollment,
+                lambda snapshot: snapshot.alert is not None,
+            )
+        except TimeoutException as e:
+            logging.error("Failed to get enrollment result!")
+            raise e
+
+        if snapshot.enrolled:
+            logging.info("Successfully enrolled. Train hard and have fun!")
+        else:
+            logging.warning(
+                "Enrollment might have not been successful. Please check your E-Mail."
+            )
+
+        if snapshot.enrollment_number is not None:
+            logging.info(f"Your enrollment number is {snapshot.enrollment_number}")
+        else:
+            logging.warning(
+                "Enrollment might have not been successful. Please check your E-Mail."
+            )
+
+        if snapshot.enrolled:
+            return EnrollmentResult(
+                ENROLLMENT_STATUS_ENROLLED, enrollment_number=snapshot.enrollment_number
+            )
+        return EnrollmentResult(ENROLLMENT_STATUS_REJECTED, message=snapshot.alert)
+
+    def __refresh_session(self, driver):
+        logging.info("Refreshing login session")
+        driver.get(self.lesson_url)
+        self.__wait_for_lesson_page(driver)
+        if not self.__is_logged_in(driver):
+            logging.info("No valid login session")
+            self.__organisation_login(driver)
+        if self.network_capture is not None:
+            # also drains the performance log, which grows while waiting for the enrollment
+            self.network_capture.poll()
+
+    def __wait_for_lesson_page(self, driver):
+        # the lesson page is rendered once it shows either the login or the enrollment button
+        WebDriverWait(driver, self.timeouts.page).until(
+            EC.any_of(
+                EC.presence_of_element_located((By.XPATH, LOGIN_BUTTON_XPATH)),
+                EC.presence_of_element_located(
+                    (By.TAG_NAME, "app-lessons-enrollment-button")
+                ),
+                EC.presence_of_element_located((By.TAG_NAME, "app-page-not-found")),
+            )
+        )
+
+    @staticmethod
+    def __is_logged_in(driver):
+        return len(driver.find_elements(By.XPATH, LOGIN_BUTTON_XPATH)) == 0
+
+    @staticmethod
+    def read_snapshot(driver):
+        return LessonSnapshot.from_html(driver.execute_script(LESSON_SNAPSHOT_SCRIPT))
+
+    @staticmethod
+    def wait_for_snapshot(driver, timeout, condition):
+        def satisfied(d):
+            snapshot = AsvzEnroller.read_snapshot(d)
+            return snapshot if condition(snapshot) else False
+
+        return WebDriverWait(driver, timeout).until(satisfied)
+
+    @staticmethod
+    def __get_enrollment_and_start_time(driver, timeouts):
+        try:
+            # wait until the lesson details are rendered
+            snapshot = AsvzEnroller.wait_for_snapshot(
+                driver, timeouts.page, lambda snapshot: snapshot.complete
+            )
+        except TimeoutException as e:
+            logging.error(NO_SUCH_ELEMENT_ERR_MSG)
+            raise e
+
+        if snapshot.not_found:
+            logging.error("Lesson not found! Please check your lesson details")
+            raise Exception("Lesson not found")
+
+        logging.info(
+            "Enrollment starts at {}".format(
+                snapshot.enrollment_start.strftime("%H:%M:%S")
+            )
+        )
+        logging.info(
+            "Lesson starts at {}".format(snapshot.lesson_start.strftime("%H:%M:%S"))
+        )
+        return (snapshot.enrollment_start, snapshot.lesson_start)
+
+    def __organisation_login(self, driver):
+        with self.timer.phase("login"):
+            logging.debug("Start login process")
+            WebDriverWait(driver, self.timeouts.page).until(
+                EC.element_to_be_clickable((By.XPATH, LOGIN_BUTTON_XPATH))
+            ).click()
+
+            logging.info("Login to '{}'".format(self.creds[CREDENTIALS_ORG]))
+            # URL of the organisation picker, if the IdP should be learned after the login
+            discovery_url = None
+            if self.creds[CREDENTIALS_ORG] == ASVZ_ORGANISATION_NAME:
+                self.__organisation_login_asvz(driver)
+            else:
+                WebDriverWait(driver, self.timeouts.page).until(
+                    EC.element_to_be_clickable(
+                        (
+                            By.XPATH,
+                            "//button[@class='btn btn-warning btn-block' and @title='SwitchAai Account Login']",
+                        )
+                    )
+                ).click()
+
+                shortcut_url = self.__skip_organisation_picker(driver)
+                if shortcut_url is None:
+                    discovery_url = self.__select_organisation(driver)
+                    self.__organisation_login_idp(driver)
+                else:
+                    try:
+                        self.__organisation_login_idp(driver)
+                    except TimeoutException:
+                        logging.warning(
+                            "Skipping the organisation picker failed. Selecting the organisation."
+                        )
+                        self.idp_cache.invalidate(self.creds[CREDENTIALS_ORG])
+                        driver.get(shortcut_url)
+                        discovery_url = self.__select_organisation(driver)
+                        self.__organisation_login_idp(driver)
+
+            logging.info("Submitted login credentials")
+            try:
+                # wait until redirect is completed
+                WebDriverWait(driver, self.timeouts.login).until(
+                    lambda d: d.current_url.startswith(LESSON_BASE_URL)
+                )
+                self.__wait_for_lesson_page(driver)
+            except TimeoutException:
+                logging.warning(
+                    "Authentication might have failed. Current URL is '{}'".format(
+                        driver.current_url
+                    )
+                )
+            else:
+                logging.info("Valid login credentials")
+                self.__save_session(driver)
+                if discovery_url is not None:
+                    self.__remember_idp(driver, discovery_url)
+
+    def __skip_organisation_picker(self, driver):
+        """
+        Continues straight to the IdP of the organisation, if it was learned on a previous login.
+        Returns the URL of the skipped organisation picker or None.
+        """
+        if self.idp_cache is None:
+            return None
+        entity_id = self.idp_cache.get(self.creds[CREDENTIALS_ORG])
+        if entity_id is None:
+            return None
+
+        # the organisation picker is a SAML discovery service, its URL tells where to continue with the selected IdP
+        try:
+            discovery_url = WebDriverWait(driver, self.timeouts.page).until(
+                lambda d: "return=" in d.current_url and d.current_url
+            )
+        except TimeoutException:
+            logging.warning("Organisation picker not found")
+            return None
+        response_url = discovery_response_url(discovery_url, entity_id)
+        if response_url is None:
+            return None
+
+        logging.info(
+            "Skipping the organisation picker, continuing to '{}'".format(entity_id)
+        )
+        driver.get(response_url)
+        return discovery_url
+
+    def __select_organisation(self, driver):
+        organization = self.__wait_for_input(driver, "userIdPSelection_iddtext")
+        discovery_url = driver.current_url
+        organization.send_keys("{}a".format(Keys.CONTROL))
+        organization.send_keys(self.creds[CREDENTIALS_ORG])
+        organization.send_keys(Keys.ENTER)
+        return discovery_url
+
+    def __remember_idp(self, driver, discovery_url):
+        if self.idp_cache is None:
+            return
+
+        try:
+            cookies = driver.execute_cdp_cmd(
+                "Network.getCookies", {"urls": [discovery_url]}
+            )["cookies"]
+        except WebDriverException as e:
+            logging.debug(
+                "Failed to read the cookies of the organisation picker: {}".format(e)
+            )
+            return
+        for cookie in cookies:
+            if cookie["name"] == SAML_IDP_COOKIE:
+                entity_id = parse_saml_idp_cookie(cookie["value"])
+                if entity_id is not None:
+                    logging.info(
+                        "Remembering IdP '{}' of '{}'".format(
+                            entity_id, self.creds[CREDENTIALS_ORG]
+                        )
+                    )
+                    self.idp_cache.store(self.creds[CREDENTIALS_ORG], entity_id)
+                return
+
+    def __organisation_login_idp(self, driver):
+        # UZH switched to Switch edu-ID login @see https://github.com/fbuetler/asvz-bot/issues/31
+        if (
+            self.creds[CREDENTIALS_ORG] == SWITCH_EDUID_ORGANISATION_NAME
+            or self.creds[CREDENTIALS_ORG] == UZH_ORGANISATION_NAME
+        ):
+            self.__organisation_login_switch_eduid(driver)
+        else:
+            self.__organisation_login_default(driver)
+
+    def __wait_for_input(self, driver, input_id):
+        return WebDriverWait(driver, self.timeouts.page).until(
+            EC.presence_of_element_located(
+                (By.XPATH, "//input[@id='{}']".format(input_id))
             )
+        )
 
-        logging.info("Lesson starts at {}".format(lesson_start.strftime("%H:%M:%S")))
-        return lesson_start
+    def __organisation_login_asvz(self, driver):
+        self.__wait_for_input(driver, "AsvzId").send_keys(self.creds[CREDENTIALS_UNAME])
+        driver.find_element(By.XPATH, "//input[@id='Password']").send_keys(
+            self.creds[CREDENTIALS_PW]
+        )
 
-    def __organisation_login(self, driver):
-        logging.debug("Start login process")
-        WebDriverWait(driver, 20).until(
+        WebDriverWait(driver, self.timeouts.page).until(
             EC.element_to_be_clickable(
                 (
                     By.XPATH,
-                    "//button[@class='btn btn-default' and @title='Login'] | //a[@class='btn btn-default' and @title='Login & Anmelden']",
+                    "//button[@type='submit' and text()='Login']",
                 )
             )
         ).click()
 
-        logging.info("Login to '{}'".format(self.creds[CREDENTIALS_ORG]))
-        if self.creds[CREDENTIALS_ORG] == ASVZ_ORGANISATION_NAME:
-            self.__organisation_login_asvz(driver)
-        else:
-            WebDriverWait(driver, 20).until(
-                EC.element_to_be_clickable(
-                    (
-                        By.XPATH,
-                        "//button[@class='btn btn-warning btn-block' and @title='SwitchAai Account Login']",
+    def __organisation_login_switch_eduid(self, driver):
+        self.__wait_for_input(driver, "username").send_keys(
+            self.creds[CREDENTIALS_UNAME]
+        )
+
+        WebDriverWait(driver, self.timeouts.page).until(
+            EC.element_to_be_clickable(
+                (
+                    By.XPATH,
+                    "//button[@type='submit' and @id='login-button']",
+                )
+            )
+        ).click()
+
+        try:
+            self.__wait_for_input(driver, "password").send_keys(
+                self.creds[CREDENTIALS_PW]
+            )
+        except TimeoutException:
+            logging.error(
+                "Failed to insert password. Please ensure that your username is an email address."
+            )
+            exit(1)
+
+        WebDriverWait(driver, self.timeouts.page).until(
+            EC.element_to_be_clickable(
+                (
+                    By.XPATH,
+                    "//button[@type='submit' and @id='login-button']",
+                )
+            )
+        ).click()
+
+    def __organisation_login_default(self, driver):
+        self.__wait_for_input(driver, "username").send_keys(
+            self.creds[CREDENTIALS_UNAME]
+        )
+        driver.find_element(By.XPATH, "//input[@id='password']").send_keys(
+            self.creds[CREDENTIALS_PW]
+        )
+        driver.find_element(By.XPATH, "//button[@type='submit']").click()
+
+    def __wait_for_free_places(self, driver, client, api_path):
+        free_places = None
+        if self.network_capture is not None:
+            try:
+                free_places = self.network_capture.wait_for(
+                    "lesson_state", self.timeouts.page
+                ).free_places
+            except TimeoutException:
+                logging.warning("Lesson details were not captured, reading the page")
+        if free_places is None:
+            free_places = AsvzEnroller.wait_for_snapshot(
+                driver,
+                self.timeouts.page,
+                lambda snapshot: snapshot.free_places is not None,
+            ).free_places
+
+        if free_places > 0:
+            # has free places
+            return
+
+        FreePlacesPoller(
+            client, api_path, self.enrollment_start, self.lesson_start
+        ).wait_for_free_places()
+        if self.network_capture is not None:
+            # wait for the state loaded by the refreshed page
+            self.network_capture.lesson_state = None
+        driver.refresh()
+        self.__wait_for_lesson_page(driver)
+
+
+def parse_and_validate_start_time(start_time) -> datetime:
+    try:
+        return datetime.strptime(start_time, TIMEFORMAT)
+    except ValueError:
+        msg = "Invalid start time specified. Supported format is {}".format(TIMEFORMAT)
+        raise argparse.ArgumentTypeError(msg)
+
+
+def find_browser_binary(chrome_type):
+    for binary in BROWSER_BINARIES.get(chrome_type, []):
+        path = shutil.which(binary)
+        if path is not None:
+            return os.path.realpath(path)
+    return None
+
+
+def get_browser_version(chrome_type):
+    return OperationSystemManager().get_browser_version_from_os(chrome_type)
+
+
+def major_version(version):
+    if version is None:
+        return None
+    return version.split(".")[0]
+
+
+class ChromedriverResolver:
+    """
+    Resolves the chromedriver for the installed Chrome/Chromium.
+    The resolved driver is recorded in a manifest together with the browser, so that later runs
+    neither probe versions nor need network access until the browser is updated.
+    """
+
+    def __init__(self, proxy_url=None, manifest_filename=DRIVER_MANIFEST_FILENAME):
+        self.proxy_url = proxy_url
+        self.manifest_filename = manifest_filename
+
+    def resolve(self):
+        manifest = self.__load()
+        if manifest is not None and self.__is_valid(manifest):
+            logging.info(
+                "Using cached chromedriver for {} {}".format(
+                    manifest["chrome_type"], manifest["browser_version"]
+                )
+            )
+            return manifest["driver_path"]
+
+        try:
+            chrome_type, browser_version, driver_path = self.__install()
+        except Exception as e:
+            if manifest is not None and os.path.exists(manifest["driver_path"]):
+                logging.warning(
+                    "Failed to update chromedriver ({}). Falling back to the cached chromedriver for {} {}".format(
+                        e, manifest["chrome_type"], manifest["browser_version"]
                     )
                 )
-            ).click()
+                return manifest["driver_path"]
+            raise AsvzBotException("Failed to find chrome/chromium")
 
-            organization = driver.find_element(
-                By.XPATH, "//input[@id='userIdPSelection_iddtext']"
+        self.__store(chrome_type, browser_version, driver_path)
+        return driver_path
+
+    def __is_valid(self, manifest):
+        if not os.path.exists(manifest["driver_path"]):
+            return False
+
+        binary = find_browser_binary(manifest["chrome_type"])
+        if binary is not None and binary == manifest["browser_binary"]:
+            stat = os.stat(binary)
+            if [stat.st_mtime, stat.st_size] == manifest["browser_stat"]:
+                return True
+
+        # the browser binary changed, but a driver is only needed for a new major version
+        browser_version = get_browser_version(manifest["chrome_type"])
+        if browser_version is None or major_version(browser_version) != major_version(
+            manifest["browser_version"]
+        ):
+            logging.info(
+                "Browser version changed from {} to {}".format(
+                    manifest["browser_version"], browser_version
+                )
             )
-            organization.send_keys("{}a".format(Keys.CONTROL))
-            organization.send_keys(self.creds[CREDENTIALS_ORG])
-            organization.send_keys(Keys.ENTER)
+            return False
 
-            # UZH switched to Switch edu-ID login @see https://github.com/fbuetler/asvz-bot/issues/31
-            if (
-                self.creds[CREDENTIALS_ORG] == SWITCH_EDUID_ORGANISATION_NAME
-                or self.creds[CREDENTIALS_ORG] == UZH_ORGANISATION_NAME
-            ):
-                self.__organisation_login_switch_eduid(driver)
-            else:
-                self.__organisation_login_default(driver)
+        self.__store(manifest["chrome_type"], browser_version, manifest["driver_path"])
+        return True
+
+    def __install(self):
+        if self.proxy_url is not None:
+            logging.info(f"Using proxy: {self.proxy_url}")
+        # the download goes through the shared connection pool and its default timeout, with or without proxy
+        download_manager = WDMDownloadManager(CustomHttpClient(proxy=self.proxy_url))
+
+        browsers = [
+            (chrome_type, get_browser_version(chrome_type))
+            for chrome_type in [ChromeType.CHROMIUM, ChromeType.GOOGLE]
+        ]
+        # prefer the installed browsers, the version probe may fail on exotic setups
+        installed = [b for b in browsers if b[1] is not None]
+
+        error = None
+        for chrome_type, browser_version in installed or browsers:
+            try:
+                driver_path = ChromeDriverManager(
+                    chrome_type=chrome_type, download_manager=download_manager
+                ).install()
+                return chrome_type, browser_version, driver_path
+            except Exception as e:
+                logging.debug(
+                    "Failed to install chromedriver for {}".format(chrome_type)
+                )
+                error = e
+        raise error
+
+    def __load(self):
+        try:
+            with open(self.manifest_filename, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def __store(self, chrome_type, browser_version, driver_path):
+        binary = find_browser_binary(chrome_type)
+        browser_stat = None
+        if binary is not None:
+            stat = os.stat(binary)
+            browser_stat = [stat.st_mtime, stat.st_size]
+        with open(self.manifest_filename, "w") as f:
+            json.dump(
+                {
+                    "chrome_type": chrome_type,
+                    "browser_binary": binary,
+                    "browser_stat": browser_stat,
+                    "browser_version": browser_version,
+                    "driver_path": driver_path,
+                },
+                f,
+                indent=4,
+            )
+
+
+def get_chromedriver_path(proxy_url=None):
+    try:
+        return ChromedriverResolver(proxy_url).resolve()
+    except AsvzBotException as e:
+        logging.error(e)
+        exit(1)
+
+
+def load_batch_jobs(filename):
+    """
+    Reads a job file like
+    {"jobs": [{"type": "lesson", "lesson_id": 196346}, {"type": "event", "event_id": 536447},
+              {"type": "training", "weekday": "Mo", "start_time": "18:15", "facility": "Sport Center Hönggerberg",
+               "level": "Fortgeschrittene", "trainer": "Karin Hollenstein", "sport_id": 45743}]}
+    """
+    try:
+        with open(filename, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise AsvzBotException("Failed to read job file '{}': {}".format(filename, e))
+
+    jobs = data.get("jobs") if isinstance(data, dict) else None
+    if not isinstance(jobs, list) or len(jobs) == 0:
+        raise AsvzBotException("Job file '{}' contains no jobs".format(filename))
+
+    return [validate_batch_job(i, job) for i, job in enumerate(jobs)]
+
+
+def validate_batch_job(index, job, catalog=None):
+    catalog = catalog or Catalog.load()
+    try:
+        job_type = job["type"]
+        if job_type == "lesson":
+            return {"type": job_type, "lesson_id": int(job["lesson_id"])}
+        if job_type == "event":
+            return {"type": job_type, "event_id": int(job["event_id"])}
+        if job_type == "training":
+            if job["weekday"] not in WEEKDAYS:
+                raise ValueError("unknown weekday '{}'".format(job["weekday"]))
+            facility, _ = catalog.lookup("facilities", job["facility"])
+            level = job.get("level")
+            if level is not None:
+                level, _ = catalog.lookup("levels", level)
+            return {
+                "type": job_type,
+                "weekday": job["weekday"],
+                "start_time": parse_and_validate_start_time(job["start_time"]),
+                "trainer": job.get("trainer"),
+                "facility": facility,
+                "level": level,
+                "sport_id": catalog.sport_id(job["sport_id"]),
+            }
+        raise ValueError("unknown type '{}'".format(job_type))
+    except (KeyError, TypeError, ValueError, argparse.ArgumentTypeError) as e:
+        raise AsvzBotException("Invalid job #{}: {}".format(index + 1, e))
+
+
+def describe_batch_job(job):
+    if job["type"] == "lesson":
+        return "lesson {}".format(job["lesson_id"])
+    if job["type"] == "event":
+        return "event {}".format(job["event_id"])
+    return "training {} {} at {}".format(
+        job["weekday"], job["start_time"].strftime(TIMEFORMAT), job["facility"]
+    )
+
+
+def run_batch(
+    jobs,
+    chromedriver_path,
+    creds,
+    proxy_url,
+    resolver=None,
+    lookahead_weeks=LOOKAHEAD_DEFAULT_WEEKS,
+    **enroller_options,
+):
+    """
+    Enrolls to all jobs concurrently. All enrollments share a single login and connection pool,
+    the browser is only started to login once.
+    """
+    if enroller_options.get("backend", BACKEND_HTTP) != BACKEND_HTTP:
+        logging.info("Batch mode always uses the http backend")
+    enroller_options["backend"] = BACKEND_HTTP
+
+    account_session = AccountSession(LESSON_BASE_URL + LESSON_API_PATH, proxy_url)
+    enroller_options["account_session"] = account_session
+
+    resolver = resolver or SportfahrplanResolver(proxy_url)
+    try:
+        enrollers, results = create_batch_enrollers(
+            jobs,
+            chromedriver_path,
+            creds,
+            proxy_url,
+            resolver,
+            lookahead_weeks,
+            enroller_options,
+        )
+    finally:
+        resolver.close()
+
+    try:
+        results.update(run_enrollers(enrollers))
+    finally:
+        account_session.close()
+
+    failed, summary = summarize_batch(jobs, results)
+    logging.info("Batch summary:\n\t" + "\n\t".join(summary))
+    return failed == 0
+
+
+def create_batch_enrollers(
+    jobs,
+    chromedriver_path,
+    creds,
+    proxy_url,
+    resolver,
+    lookahead_weeks,
+    enroller_options,
+):
+    """
+    Returns the enrollers of the jobs by job index and the errors of the jobs whose lesson was not found.
+    Trainings enroll to their next lesson within lookahead_weeks, weeks without lesson are skipped.
+    """
+    results = {}
+    enrollers = {}
+    for i, job in enumerate(jobs):
+        lesson_url = batch_job_lesson_url(job)
+        if lesson_url is None:
+            try:
+                enrollers[i] = AsvzEnroller.from_next_training(
+                    chromedriver_path,
+                    job,
+                    proxy_url,
+                    creds,
+                    weeks=lookahead_weeks,
+                    resolver=resolver,
+                    **enroller_options,
+                )
+            except (LessonNotFoundException, requests.RequestException) as e:
+                results[i] = e
+            continue
+
+        enrollers[i] = AsvzEnroller(
+            chromedriver_path, lesson_url, creds, proxy_url, **enroller_options
+        )
+    return enrollers, results
+
+
+def batch_job_lesson_url(job):
+    """
+    Returns the URL of a lesson or event job, trainings have to be searched first.
+    """
+    if job["type"] == "lesson":
+        return "{}/tn/lessons/{}".format(LESSON_BASE_URL, job["lesson_id"])
+    if job["type"] == "event":
+        return "{}/tn/events/{}".format(LESSON_BASE_URL, job["event_id"])
+    return None
+
+
+def run_enrollers(enrollers):
+    """
+    Runs all enrollers concurrently and returns their results, or the exception they raised, by key.
+    """
+    results = {}
+    if not enrollers:
+        return results
+
+    with ThreadPoolExecutor(
+        max_workers=len(enrollers), thread_name_prefix="enroll"
+    ) as executor:
+        futures = {
+            key: executor.submit(enroller.enroll) for key, enroller in enrollers.items()
+        }
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = e
+    return results
+
+
+def summarize_batch(jobs, results):
+    """
+    Returns the number of failed jobs and a summary line per job.
+    """
+    failed = 0
+    summary = []
+    for i, job in enumerate(jobs):
+        name = describe_batch_job(job)
+        result = results.get(i)
+        if isinstance(result, Exception):
+            failed += 1
+            summary.append("{}: failed ({})".format(name, result))
+        elif result is not None and result.enrollment_number is not None:
+            summary.append(
+                "{}: {} (#{})".format(name, result.status, result.enrollment_number)
+            )
+        else:
+            summary.append("{}: {}".format(name, getattr(result, "status", "done")))
+    return failed, summary
+
+
+def load_waitlist(filename):
+    """
+    Reads a waitlist file like
+    {"requests_per_minute": 60,
+     "groups": [{"name": "Volleyball", "take": 1,
+                 "jobs": [{"type": "lesson", "lesson_id": 196346}, {"type": "lesson", "lesson_id": 196347}]}],
+     "jobs": [{"type": "event", "event_id": 536447}]}
+    Jobs outside of a group form a group of their own. Returns the groups and the request budget.
+    """
+    try:
+        with open(filename, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise AsvzBotException(
+            "Failed to read waitlist file '{}': {}".format(filename, e)
+        )
+    if not isinstance(data, dict):
+        raise AsvzBotException("Waitlist file '{}' contains no jobs".format(filename))
+
+    groups = []
+    try:
+        for group in data.get("groups") or []:
+            groups.append(
+                {
+                    "name": str(group.get("name", "group {}".format(len(groups) + 1))),
+                    "take": int(group.get("take", 1)),
+                    "jobs": group["jobs"],
+                }
+            )
+        for job in data.get("jobs") or []:
+            groups.append({"name": None, "take": 1, "jobs": [job]})
+        requests_per_minute = float(
+            data.get("requests_per_minute", WAITLIST_DEFAULT_REQUESTS_PER_MINUTE)
+        )
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise AsvzBotException("Invalid waitlist file '{}': {}".format(filename, e))
+    if not groups:
+        raise AsvzBotException("Waitlist file '{}' contains no jobs".format(filename))
+    if requests_per_minute <= 0:
+        raise AsvzBotException("requests_per_minute must be positive")
+
+    for group in groups:
+        if not isinstance(group["jobs"], list) or not group["jobs"]:
+            raise AsvzBotException("Group '{}' has no jobs".format(group["name"]))
+        if not 1 <= group["take"] <= len(group["jobs"]):
+            raise AsvzBotException(
+                "Group '{}' can not take {} of {} lessons".format(
+                    group["name"], group["take"], len(group["jobs"])
+                )
+            )
+        group["jobs"] = [
+            validate_batch_job(i, job) for i, job in enumerate(group["jobs"])
+        ]
+        for job in group["jobs"]:
+            if batch_job_lesson_url(job) is None:
+                raise AsvzBotException(
+                    "Waitlists only watch lessons and events, not trainings"
+                )
+    return groups, requests_per_minute
+
+
+def run_waitlist(
+    groups,
+    requests_per_minute,
+    chromedriver_path,
+    creds,
+    proxy_url,
+    **enroller_options,
+):
+    """
+    Watches the booked out lessons of the groups and enrolls as soon as places are freed.
+    The browser is only used to login.
+    """
+    enroller_options["backend"] = BACKEND_HTTP
+    login_enroller = AsvzEnroller(
+        chromedriver_path,
+        batch_job_lesson_url(groups[0]["jobs"][0]),
+        creds,
+        proxy_url,
+        **enroller_options,
+    )
+    client = SchalterClient(LESSON_BASE_URL + LESSON_API_PATH, proxy_url)
+    watcher = WaitlistWatcher(groups, client, login_enroller.login, requests_per_minute)
+    try:
+        succeeded = watcher.run()
+    finally:
+        client.close()
+
+    summary = []
+    for lesson in watcher.lessons:
+        group = groups[lesson.group]
+        name = (
+            lesson.name
+            if group["name"] is None
+            else "{}: {}".format(group["name"], lesson.name)
+        )
+        if isinstance(lesson.result, EnrollmentResult):
+            status = lesson.result.status
+            if lesson.result.enrollment_number is not None:
+                status += " (#{})".format(lesson.result.enrollment_number)
+        elif isinstance(lesson.result, Exception):
+            status = "failed ({})".format(lesson.result)
+        else:
+            status = lesson.result
+        summary.append("{}: {}".format(name, status))
+    logging.info("Waitlist summary:\n\t" + "\n\t".join(summary))
+    return succeeded
+
+
+def load_accounts(filename):
+    """
+    Reads an accounts file like
+    {"jobs": [{"type": "lesson", "lesson_id": 196346}],
+     "accounts": [{"organisation": "ETH", "username": "flbuetle", "password": "..."},
+                  {"organisation": "UZH", "username": "jdoe", "password": "...", "max_enrollments": 1,
+                   "jobs": [{"type": "event", "event_id": 536447}, {"type": "lesson", "lesson_id": 196346}]}]}
+    Accounts without own jobs enroll to the jobs of the file.
+    """
+    try:
+        with open(filename, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise AsvzBotException(
+            "Failed to read accounts file '{}': {}".format(filename, e)
+        )
+
+    accounts = data.get("accounts") if isinstance(data, dict) else None
+    if not isinstance(accounts, list) or len(accounts) == 0:
+        raise AsvzBotException(
+            "Accounts file '{}' contains no accounts".format(filename)
+        )
+    shared_jobs = [
+        validate_batch_job(i, job) for i, job in enumerate(data.get("jobs") or [])
+    ]
+
+    loaded = []
+    for index, account in enumerate(accounts):
+        try:
+            if account["organisation"] not in ORGANISATIONS:
+                raise ValueError(
+                    "unknown organisation '{}'".format(account["organisation"])
+                )
+            creds = {
+                CREDENTIALS_ORG: ORGANISATIONS[account["organisation"]],
+                CREDENTIALS_UNAME: str(account["username"]),
+                CREDENTIALS_PW: str(account["password"]),
+            }
+            max_enrollments = account.get("max_enrollments")
+            if max_enrollments is not None and int(max_enrollments) < 1:
+                raise ValueError("max_enrollments must be at least 1")
+        except (KeyError, TypeError, ValueError) as e:
+            raise AsvzBotException("Invalid account #{}: {}".format(index + 1, e))
+
+        if "jobs" in account:
+            jobs = [validate_batch_job(i, job) for i, job in enumerate(account["jobs"])]
+        else:
+            jobs = shared_jobs
+        if not jobs:
+            raise AsvzBotException(
+                "Account '{}' has no jobs".format(creds[CREDENTIALS_UNAME])
+            )
+
+        loaded.append(
+            {
+                "creds": creds,
+                "jobs": jobs,
+                "max_enrollments": None
+                if max_enrollments is None
+                else int(max_enrollments),
+            }
+        )
+    return loaded
+
+
+def run_accounts(
+    accounts,
+    chromedriver_path,
+    proxy_url,
+    resolver=None,
+    lookahead_weeks=LOOKAHEAD_DEFAULT_WEEKS,
+    **enroller_options,
+):
+    """
+    Enrolls all accounts to their jobs concurrently. Each account has its own login and HTTP session.
+    The logins share a single browser, each in its own browser context.
+    """
+    if enroller_options.get("backend", BACKEND_HTTP) != BACKEND_HTTP:
+        logging.info("Multi-account mode always uses the http backend")
+    enroller_options["backend"] = BACKEND_HTTP
+
+    shared_browser = SharedBrowser(
+        chromedriver_path,
+        proxy_url,
+        enroller_options.get("lean_browser", False),
+        enroller_options.pop("browser_pool", None),
+    )
+    enroller_options["shared_browser"] = shared_browser
+
+    resolver = resolver or SportfahrplanResolver(proxy_url)
+    account_sessions = []
+    enrollers = {}
+    results = {}
+    try:
+        for a, account in enumerate(accounts):
+            jobs = account["jobs"][: account["max_enrollments"]]
+            account_session = AccountSession(
+                LESSON_BASE_URL + LESSON_API_PATH, proxy_url
+            )
+            account_sessions.append(account_session)
+
+            account_enrollers, account_results = create_batch_enrollers(
+                jobs,
+                chromedriver_path,
+                account["creds"],
+                proxy_url,
+                resolver,
+                lookahead_weeks,
+                dict(enroller_options, account_session=account_session),
+            )
+            enrollers.update({(a, i): e for i, e in account_enrollers.items()})
+            results.update({(a, i): r for i, r in account_results.items()})
+    finally:
+        resolver.close()
+
+    try:
+        results.update(run_enrollers(enrollers))
+    finally:
+        for account_session in account_sessions:
+            account_session.close()
+        shared_browser.close()
+
+    failed = 0
+    summary = []
+    for a, account in enumerate(accounts):
+        jobs = account["jobs"][: account["max_enrollments"]]
+        account_failed, account_summary = summarize_batch(
+            jobs, {i: r for (k, i), r in results.items() if k == a}
+        )
+        failed += account_failed
+        summary.append(
+            "{} ({}): {} of {} jobs succeeded".format(
+                account["creds"][CREDENTIALS_UNAME],
+                account["creds"][CREDENTIALS_ORG],
+                len(jobs) - account_failed,
+                len(jobs),
+            )
+        )
+        summary.extend("\t" + line for line in account_summary)
+        summary.extend(
+            "\t{}: skipped (limit of {} enrollments)".format(
+                describe_batch_job(job), account["max_enrollments"]
+            )
+            for job in account["jobs"][len(jobs) :]
+        )
+    logging.info("Accounts summary:\n\t" + "\n\t".join(summary))
+    return failed == 0
+
+
+def next_training_date(weekday, start_time, after):
+    """
+    Returns the date of the first lesson on the given weekday and start time, that starts after 'after'.
+    """
+    weekday_int = time.strptime(WEEKDAYS[weekday], "%A").tm_wday
+    day = after.date() + timedelta((weekday_int - after.weekday()) % 7)
+    if datetime.combine(day, start_time.time()) <= after:
+        day += timedelta(7)
+    return day
+
+
+def find_training_lessons(resolver, training, after, weeks):
+    """
+    Returns the lessons of a weekly training in the next 'weeks' weeks after 'after', looked up in one pass over the Sportfahrplan.
+    Weeks without lesson, e.g. holidays, have no lesson url. Returns None if the Sportfahrplan is not rendered on the server.
+    """
+    lesson_starts = []
+    for _ in range(weeks):
+        lesson_date = next_training_date(
+            training["weekday"], training["start_time"], after
+        )
+        after = datetime.combine(lesson_date, training["start_time"].time())
+        lesson_starts.append(after)
+
+    keys = [
+        LessonLookupCache.key(
+            training["sport_id"],
+            training["facility"],
+            training["level"],
+            lesson_start,
+            training["trainer"],
+        )
+        for lesson_start in lesson_starts
+    ]
+    if resolver.cache is not None:
+        cached = [resolver.cache.get(key) for key in keys]
+        if all(url is not None for url in cached):
+            logging.info("Found the next {} lessons in lookup cache".format(weeks))
+            return [
+                TrainingOccurrence(lesson_start, url)
+                for lesson_start, url in zip(lesson_starts, cached)
+            ]
+
+    occurrences = resolver.find_occurrences(
+        training["sport_id"],
+        training["facility"],
+        training["level"],
+        training["trainer"],
+        lesson_starts,
+    )
+    if occurrences is not None and resolver.cache is not None:
+        for key, occurrence in zip(keys, occurrences):
+            if occurrence.lesson_url is not None:
+                resolver.cache.store(key, occurrence.lesson_url)
+    return occurrences
+
+
+def training_key(training):
+    return (
+        training["weekday"],
+        training["start_time"].strftime(TIMEFORMAT),
+        training["facility"],
+        training["level"],
+        training["sport_id"],
+        training["trainer"],
+    )
+
+
+def load_training_schedule(filename):
+    """
+    Reads a schedule file like
+    {"trainings": [{"weekday": "Mo", "start_time": "18:15", "facility": "Sport Center Hönggerberg",
+                    "level": "Fortgeschrittene", "trainer": "Karin Hollenstein", "sport_id": 45743}]}
+    """
+    try:
+        with open(filename, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise AsvzBotException(
+            "Failed to read schedule file '{}': {}".format(filename, e)
+        )
+
+    trainings = data.get("trainings") if isinstance(data, dict) else None
+    if not isinstance(trainings, list) or len(trainings) == 0:
+        raise AsvzBotException(
+            "Schedule file '{}' contains no trainings".format(filename)
+        )
+
+    return [
+        validate_batch_job(i, {**training, "type": "training"})
+        for i, training in enumerate(trainings)
+    ]
 
-        logging.info("Submitted login credentials")
-        time.sleep(3)  # wait until redirect is completed
 
-        if not driver.current_url.startswith(LESSON_BASE_URL):
-            logging.warning(
-                "Authentication might have failed. Current URL is '{}'".format(
-                    driver.current_url
-                )
-            )
-        else:
-            logging.info("Valid login credentials")
+class TrainingDaemon:
+    """
+    Enrolls to recurring weekly trainings without exiting.
+    For each training the next lesson is searched, the daemon sleeps until shortly before its enrollment opens
+    and then enrolls in the background, while the next lessons are already being scheduled.
+    """
 
-    def __organisation_login_asvz(self, driver):
-        driver.find_element(By.XPATH, "//input[@id='AsvzId']").send_keys(
-            self.creds[CREDENTIALS_UNAME]
-        )
-        driver.find_element(By.XPATH, "//input[@id='Password']").send_keys(
-            self.creds[CREDENTIALS_PW]
-        )
+    def __init__(
+        self,
+        schedule_file,
+        chromedriver_path,
+        creds,
+        proxy_url,
+        resolver=None,
+        lookahead_weeks=LOOKAHEAD_DEFAULT_WEEKS,
+        **enroller_options,
+    ):
+        self.schedule_file = schedule_file
+        self.schedule_mtime = None
+        self.trainings = {}
+        self.chromedriver_path = chromedriver_path
+        self.creds = creds
+        self.proxy_url = proxy_url
+        self.enroller_options = enroller_options
+        self.resolver = resolver or SportfahrplanResolver(proxy_url)
 
-        WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable(
-                (
-                    By.XPATH,
-                    "//button[@type='submit' and text()='Login']",
-                )
+        self.client = SchalterClient(LESSON_BASE_URL + LESSON_API_PATH, proxy_url)
+        if enroller_options.get("backend") == BACKEND_HTTP:
+            # all trainings share one login
+            enroller_options["account_session"] = AccountSession(
+                LESSON_BASE_URL + LESSON_API_PATH, proxy_url
             )
-        ).click()
 
-    def __organisation_login_switch_eduid(self, driver):
-        driver.find_element(By.XPATH, "//input[@id='username']").send_keys(
-            self.creds[CREDENTIALS_UNAME]
-        )
+        # training key -> date of the last lesson that was handled
+        self.handled = {}
+        # training key -> (lesson date, enroller, enrollment start)
+        self.scheduled = {}
+        # training key -> running enrollment thread
+        self.running = {}
+        # training key -> error of a training that cannot be looked up until the schedule changes
+        self.failed = {}
+        self.lookahead_weeks = lookahead_weeks
+        # training key -> (resolved at, next lessons of the training)
+        self.lookahead = {}
 
-        WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable(
-                (
-                    By.XPATH,
-                    "//button[@type='submit' and @id='login-button']",
+    def run(self):
+        logging.info("Starting training daemon")
+        while True:
+            wake_at = self.run_once()
+
+            sleep_time = (wake_at - datetime.today()).total_seconds()
+            if sleep_time > 0:
+                logging.info(
+                    "Sleeping until {}".format(wake_at.strftime("%Y-%m-%d %H:%M:%S"))
                 )
-            )
-        ).click()
+                sleep_until_monotonic(time.monotonic() + sleep_time)
+
+    def run_once(self) -> datetime:
+        """
+        Reloads the schedule, schedules the next lessons and starts the enrollments that are due.
+        Returns when the daemon should wake up again.
+        """
+        self.__reload_schedule()
+        self.__collect_finished()
+        self.__schedule_next_lessons()
+
+        now = datetime.today()
+        wake_at = now + timedelta(seconds=DAEMON_RESCAN_INTERVAL_SECONDS)
+        for key, (lesson_date, enroller, enrollment_start) in list(
+            self.scheduled.items()
+        ):
+            start_at = enrollment_start - timedelta(seconds=DAEMON_PREPARE_SECONDS)
+            if start_at <= now:
+                self.__start_enrollment(key)
+            else:
+                wake_at = min(wake_at, start_at)
+        return wake_at
 
+    def __reload_schedule(self):
         try:
-            driver.find_element(By.XPATH, "//input[@id='password']").send_keys(
-                self.creds[CREDENTIALS_PW]
-            )
-        except NoSuchElementException:
-            logging.error(
-                "Failed to insert password. Please ensure that your username is an email address."
-            )
-            exit(1)
+            mtime = os.stat(self.schedule_file).st_mtime
+            if mtime == self.schedule_mtime:
+                return
+            trainings = load_training_schedule(self.schedule_file)
+        except (OSError, AsvzBotException) as e:
+            if self.schedule_mtime is None:
+                raise AsvzBotException(e)
+            logging.error("Keeping the previous schedule: {}".format(e))
+            return
 
-        WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable(
-                (
-                    By.XPATH,
-                    "//button[@type='submit' and @id='login-button']",
-                )
-            )
-        ).click()
+        self.schedule_mtime = mtime
+        self.trainings = {training_key(t): t for t in trainings}
+        # the changed schedule may have fixed the failed trainings
+        self.failed = {}
+        for key in list(self.scheduled):
+            if key not in self.trainings:
+                del self.scheduled[key]
+        for key in list(self.lookahead):
+            if key not in self.trainings:
+                del self.lookahead[key]
+        logging.info("Loaded {} trainings".format(len(self.trainings)))
 
-    def __organisation_login_default(self, driver):
-        driver.find_element(By.XPATH, "//input[@id='username']").send_keys(
-            self.creds[CREDENTIALS_UNAME]
-        )
-        driver.find_element(By.XPATH, "//input[@id='password']").send_keys(
-            self.creds[CREDENTIALS_PW]
-        )
-        driver.find_element(By.XPATH, "//button[@type='submit']").click()
+    def __collect_finished(self):
+        for key, thread in list(self.running.items()):
+            if not thread.is_alive():
+                del self.running[key]
 
-    def __wait_for_free_places(self, driver):
-        while True:
-            num_free_spots_raw = driver.find_element(
-                By.XPATH, "//dl[contains(., 'Freie Plätze')]/dd/span"
-            )
-            num_free_spots = int(num_free_spots_raw.get_attribute("innerHTML"))
+    def __schedule_next_lessons(self):
+        for key, training in self.trainings.items():
+            if key in self.scheduled or key in self.running or key in self.failed:
+                continue
 
-            if num_free_spots > 0:
-                # has free places
-                return
+            after = datetime.today()
+            if key in self.handled:
+                after = max(
+                    after,
+                    datetime.combine(self.handled[key], training["start_time"].time()),
+                )
+            lesson_date = next_training_date(
+                training["weekday"], training["start_time"], after
+            )
 
-            if datetime.today() > self.lesson_start:
-                raise AsvzBotException(
-                    "Stopping enrollment because lesson has started."
+            try:
+                occurrence = self.__next_occurrence(key, training, after)
+                if occurrence is None:
+                    enroller = AsvzEnroller.from_lesson_attributes(
+                        self.chromedriver_path,
+                        training["weekday"],
+                        training["start_time"],
+                        training["trainer"],
+                        training["facility"],
+                        training["level"],
+                        training["sport_id"],
+                        self.proxy_url,
+                        self.creds,
+                        resolver=self.resolver,
+                        lesson_date=datetime.combine(lesson_date, datetime.min.time()),
+                        **self.enroller_options,
+                    )
+                    enrollment_start = None
+                else:
+                    lesson_date = occurrence.lesson_start.date()
+                    if occurrence.lesson_url is None:
+                        raise NoLessonOnDateException("No lesson on this date")
+                    enroller = AsvzEnroller(
+                        self.chromedriver_path,
+                        occurrence.lesson_url,
+                        self.creds,
+                        self.proxy_url,
+                        **self.enroller_options,
+                    )
+                    enrollment_start = occurrence.enrollment_start
+                if enrollment_start is None:
+                    _, api_path = parse_lesson_url(enroller.lesson_url)
+                    enrollment_start = self.client.get_lesson(api_path).enrollment_start
+            except NoLessonOnDateException:
+                logging.info(
+                    "Skipping lesson on {}".format(lesson_date.strftime("%d.%m.%Y"))
                 )
+                self.handled[key] = lesson_date
+                continue
+            except (AsvzBotException, requests.RequestException) as e:
+                logging.error(
+                    "Failed to schedule training, retrying later: {}".format(e)
+                )
+                continue
+            except ValueError as e:
+                # e.g. a facility or level that is no longer in the synced catalog
+                logging.error(
+                    "Failed to schedule training, skipping it until the schedule changes: {}".format(
+                        e
+                    )
+                )
+                self.failed[key] = str(e)
+                continue
 
-            retry_interval_sec = 1 * 30
             logging.info(
-                "Lesson is booked out. Rechecking in {} secs..".format(
-                    retry_interval_sec
+                "Scheduled {} on {}, enrollment opens at {}".format(
+                    enroller.lesson_url,
+                    lesson_date.strftime("%d.%m.%Y"),
+                    enrollment_start.strftime("%Y-%m-%d %H:%M:%S"),
                 )
             )
-            time.sleep(retry_interval_sec)
-            driver.refresh()
+            self.scheduled[key] = (lesson_date, enroller, enrollment_start)
 
+    def __next_occurrence(self, key, training, after) -> Optional[TrainingOccurrence]:
+        """
+        Returns the next lesson of the training from the lookahead, which is refreshed once it is used up or outdated.
+        Returns None if the Sportfahrplan is not rendered on the server.
+        """
+        now = datetime.today()
+        resolved_at, occurrences = self.lookahead.get(key, (None, []))
+        upcoming = [o for o in occurrences if o.lesson_start > after]
+        if not upcoming or resolved_at < now - timedelta(
+            seconds=LOOKUP_CACHE_TTL_SECONDS
+        ):
+            occurrences = find_training_lessons(
+                self.resolver, training, after, self.lookahead_weeks
+            )
+            if occurrences is None:
+                return None
+            self.lookahead[key] = (now, occurrences)
+            upcoming = occurrences
+        if not upcoming:
+            raise LessonNotFoundException("Lesson not found")
+        return upcoming[0]
 
-def parse_and_validate_start_time(start_time) -> datetime:
-    try:
-        return datetime.strptime(start_time, TIMEFORMAT)
-    except ValueError:
-        msg = "Invalid start time specified. Supported format is {}".format(TIMEFORMAT)
-        raise argparse.ArgumentTypeError(msg)
+    def __start_enrollment(self, key):
+        lesson_date, enroller, _ = self.scheduled.pop(key)
+        self.handled[key] = lesson_date
 
+        def enroll():
+            try:
+                enroller.enroll()
+            except Exception as e:
+                logging.error(
+                    "Enrollment to {} failed: {}".format(enroller.lesson_url, e)
+                )
 
-def get_chromedriver_path(proxy_url=None):
-    if proxy_url is not None:
-        logging.info(f"Using proxy: {proxy_url}")
-        http_client = CustomHttpClient(proxy=proxy_url)
-        download_manager = WDMDownloadManager(http_client)
+        thread = threading.Thread(target=enroll, name="enroll", daemon=True)
+        self.running[key] = thread
+        thread.start()
 
-    webdriver_manager = None
-    try:
-        if proxy_url is not None:
-            webdriver_manager = ChromeDriverManager(
-                chrome_type=ChromeType.CHROMIUM, download_manager=download_manager
+
+def run_catalog(action, query, proxy_url):
+    if action == "sync":
+        catalog = Catalog.sync(http_session(proxy_url))
+        logging.info(
+            "Catalog revision {} has {} sports, {} facilities and {} levels".format(
+                catalog.revision,
+                len(catalog.sections["sports"]),
+                len(catalog.sections["facilities"]),
+                len(catalog.sections["levels"]),
             )
-        else:
-            webdriver_manager = ChromeDriverManager(chrome_type=ChromeType.CHROMIUM)
-    except:
-        webdriver_manager = None
+        )
+        return
 
-    if webdriver_manager is None:
-        try:
-            if proxy_url is not None:
-                webdriver_manager = ChromeDriverManager(
-                    chrome_type=ChromeType.GOOGLE, download_manager=download_manager
-                )
-            else:
-                webdriver_manager = ChromeDriverManager(chrome_type=ChromeType.GOOGLE)
-        except:
-            webdriver_manager = None
+    catalog = Catalog.load()
+    if catalog.synced_at is None:
+        logging.info(
+            "Catalog was never synced, only built-in facilities and levels are known"
+        )
+    matches = catalog.search(query)
+    if not matches:
+        logging.info("Nothing found for '{}'".format(query))
+        return
+    logging.info(
+        "Found:\n\t"
+        + "\n\t".join(
+            "{:<8} {} ({})".format(CATALOG_SECTION_NAMES[section], name, entry_id)
+            for section, name, entry_id in matches
+        )
+    )
 
-    if webdriver_manager is None:
-        logging.error("Failed to find chrome/chromium")
-        exit(1)
 
-    return webdriver_manager.install()
+def list_upcoming_jobs(job_store, minutes):
+    now = datetime.today()
+    jobs = job_store.opening_between(now, now + timedelta(minutes=minutes))
+    if not jobs:
+        logging.info("No enrollment opens in the next {} minutes".format(minutes))
+        return
+
+    logging.info(
+        "Enrollments opening in the next {} minutes:\n\t".format(minutes)
+        + "\n\t".join(
+            "{} {} ({}): {}".format(
+                job["enrollment_start"].strftime("%H:%M:%S"),
+                job["lesson_url"],
+                job["username"],
+                job["status"],
+            )
+            for job in jobs
+        )
+    )
 
 
 def main():
@@ -754,6 +4887,119 @@ def main():
     parser.add_argument(
         "-x", "--proxy", type=str, help="Proxy URL", required=False, default=None
     )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        help="Enrollment backend. 'http' logs in once with the browser and then talks to the schalter API directly.",
+    )
+    parser.add_argument(
+        "--lead-time-ms",
+        type=int,
+        help="Send the enrollment request this many milliseconds before the enrollment opens (http backend)",
+    )
+    parser.add_argument(
+        "--hedge-attempts",
+        type=int,
+        help="Send this many enrollment requests over separate connections when the enrollment opens, the first enrollment wins (http backend, at most {})".format(
+            MAX_HEDGE_ATTEMPTS
+        ),
+    )
+    parser.add_argument(
+        "--hedge-stagger-ms",
+        type=int,
+        help="Milliseconds between the hedged enrollment requests (http backend)",
+    )
+    parser.add_argument(
+        "--lookahead-weeks",
+        type=int,
+        help="Weeks to look ahead for the lessons of trainings, weeks without lesson e.g. holidays are skipped (default: {})".format(
+            LOOKAHEAD_DEFAULT_WEEKS
+        ),
+    )
+    parser.add_argument(
+        "--no-session-cache",
+        dest="session_cache",
+        default=True,
+        action="store_false",
+        help="Do not reuse or store login sessions in {}".format(
+            SESSION_CACHE_FILENAME
+        ),
+    )
+    parser.add_argument(
+        "--lean-browser",
+        default=False,
+        action="store_true",
+        help="Start the browser without images, fonts and third-party hosts and do not wait for the full page load",
+    )
+    parser.add_argument(
+        "--capture-network",
+        default=False,
+        action="store_true",
+        help="Read the lesson state and the enrollment result from the API responses the browser received (browser backend)",
+    )
+    parser.add_argument(
+        "--browser-pool-size",
+        type=int,
+        help="Number of browsers started ahead and kept ready between uses, 0 starts a browser for each use (default: {})".format(
+            BROWSER_POOL_DEFAULT_SIZE
+        ),
+    )
+    parser.add_argument(
+        "--browser-pool-max-size",
+        type=int,
+        help="Maximum number of browsers running at the same time (default: {})".format(
+            BROWSER_POOL_DEFAULT_MAX_SIZE
+        ),
+    )
+    parser.add_argument(
+        "--page-timeout",
+        type=float,
+        help="Seconds to wait for a page to render (default: {})".format(
+            WaitTimeouts.page
+        ),
+    )
+    parser.add_argument(
+        "--login-timeout",
+        type=float,
+        help="Seconds to wait for the redirect back to ASVZ after the login (default: {})".format(
+            WaitTimeouts.login
+        ),
+    )
+    parser.add_argument(
+        "--enrollment-timeout",
+        type=float,
+        help="Seconds to wait for the enrollment result after the click (default: {})".format(
+            WaitTimeouts.enrollment
+        ),
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        help="Append the duration of each enrollment phase and the submit offset as JSON lines to this file",
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        type=str,
+        help="Write the duration of each enrollment phase and the submit offset to this Prometheus textfile",
+    )
+    parser.add_argument(
+        "--no-job-store",
+        dest="job_store",
+        default=True,
+        action="store_false",
+        help="Do not record jobs, attempts and lesson times in {} and do not skip lessons that were already enrolled".format(
+            JOB_STORE_FILENAME
+        ),
+    )
+    parser.add_argument(
+        "--no-idp-cache",
+        dest="idp_cache",
+        default=True,
+        action="store_false",
+        help="Always select the organisation in the SWITCH organisation picker instead of using the IdP remembered in {}".format(
+            IDP_CACHE_FILENAME
+        ),
+    )
     parser.add_argument(
         "--save-credentials",
         default=False,
@@ -779,6 +5025,70 @@ def main():
         help="ID of a particular event e.g. 536447 in https://schalter.asvz.ch/tn/events/536447",
     )
 
+    parser_batch = subparsers.add_parser(
+        "batch",
+        help="For many lessons, events and trainings enrolled concurrently in one process",
+    )
+    parser_batch.add_argument(
+        "job_file",
+        type=str,
+        help='JSON file with the jobs to enroll to, e.g. {"jobs": [{"type": "lesson", "lesson_id": 196346}]}',
+    )
+
+    parser_jobs = subparsers.add_parser(
+        "jobs",
+        help="Lists the jobs of the job store whose enrollment opens soon",
+    )
+    parser_jobs.add_argument(
+        "--within",
+        type=int,
+        default=60,
+        help="Minutes from now (default: 60)",
+    )
+
+    parser_catalog = subparsers.add_parser(
+        "catalog",
+        help="Syncs or searches the local catalog of the sports, facilities and levels on the Sportfahrplan",
+    )
+    parser_catalog.add_argument(
+        "action",
+        choices=["sync", "search"],
+        help="'sync' fetches the catalog from the Sportfahrplan, 'search' looks up a name offline",
+    )
+    parser_catalog.add_argument(
+        "query", nargs="?", default="", help="Name to search, e.g. 'volley'"
+    )
+
+    parser_waitlist = subparsers.add_parser(
+        "waitlist",
+        help="For booked out lessons and events, enrolled as soon as a place is freed",
+    )
+    parser_waitlist.add_argument(
+        "waitlist_file",
+        type=str,
+        help='JSON file with the lessons to watch, e.g. {"requests_per_minute": 60, "groups": [{"name": "Volleyball", "take": 1, "jobs": [{"type": "lesson", "lesson_id": 196346}, {"type": "lesson", "lesson_id": 196347}]}]}',
+    )
+
+    parser_accounts = subparsers.add_parser(
+        "accounts",
+        help="For several accounts enrolled concurrently in one process, sharing a single browser for the logins",
+    )
+    parser_accounts.add_argument(
+        "accounts_file",
+        type=str,
+        help='JSON file with the accounts and their jobs, e.g. {"jobs": [{"type": "lesson", "lesson_id": 196346}], "accounts": [{"organisation": "ETH", "username": "flbuetle", "password": "...", "max_enrollments": 1}]}',
+    )
+
+    parser_daemon = subparsers.add_parser(
+        "daemon",
+        help="For trainings visited every week, enrolled without restarting the bot",
+    )
+    parser_daemon.add_argument(
+        "schedule_file",
+        type=str,
+        help='JSON file with the weekly trainings, e.g. {"trainings": [{"weekday": "Mo", "start_time": "18:15", "facility": "Sport Center Hönggerberg", "sport_id": 45743}]}. Changes are picked up while running.',
+    )
+
     parser_training = subparsers.add_parser(
         "training",
         help="For lessons visited periodically",
@@ -810,20 +5120,20 @@ def main():
         "-f",
         "--facility",
         required=True,
-        choices=list(FACILITIES.keys()),
-        help="Facility where the lesson takes place e.g. 'Sport Center Polyterrasse'",
+        type=str,
+        help="Facility where the lesson takes place e.g. 'Sport Center Polyterrasse', see 'catalog search'",
     )
     parser_training.add_argument(
         "-l",
         "--level",
         required=False,
-        choices=list(LEVELS.keys()),
-        help="Level of the lesson e.g. 'Alle'",
+        type=str,
+        help="Level of the lesson e.g. 'Alle', see 'catalog search'",
     )
     parser_training.add_argument(
         "sport_id",
-        type=int,
-        help="Number at the end of link to a particular sport on ASVZ Sportfahrplan, e.g. 45743 in https://asvz.ch/426-sportfahrplan?f[0]=sport:45743 for volleyball",
+        type=str,
+        help="Number at the end of link to a particular sport on ASVZ Sportfahrplan, e.g. 45743 in https://asvz.ch/426-sportfahrplan?f[0]=sport:45743 for volleyball, or the name of the sport in the synced catalog",
     )
 
     parser.set_defaults(
@@ -842,7 +5152,64 @@ def main():
         type=EnvVariables.enrollment_type
         if EnvVariables.enrollment_type != ""
         else None,
+        backend=EnvVariables.backend
+        if EnvVariables.backend is not None and EnvVariables.backend != ""
+        else BACKEND_BROWSER,
+        lead_time_ms=int(EnvVariables.lead_time_ms)
+        if EnvVariables.lead_time_ms is not None and EnvVariables.lead_time_ms != ""
+        else 0,
+        hedge_attempts=int(EnvVariables.hedge_attempts)
+        if EnvVariables.hedge_attempts is not None and EnvVariables.hedge_attempts != ""
+        else 1,
+        hedge_stagger_ms=int(EnvVariables.hedge_stagger_ms)
+        if EnvVariables.hedge_stagger_ms is not None
+        and EnvVariables.hedge_stagger_ms != ""
+        else 0,
+        lookahead_weeks=int(EnvVariables.lookahead_weeks)
+        if EnvVariables.lookahead_weeks is not None
+        and EnvVariables.lookahead_weeks != ""
+        else LOOKAHEAD_DEFAULT_WEEKS,
+        lean_browser=EnvVariables.lean_browser.lower() == "true"
+        if EnvVariables.lean_browser is not None
+        else False,
+        capture_network=EnvVariables.capture_network.lower() == "true"
+        if EnvVariables.capture_network is not None
+        else False,
+        browser_pool_size=int(EnvVariables.browser_pool_size)
+        if EnvVariables.browser_pool_size is not None
+        and EnvVariables.browser_pool_size != ""
+        else BROWSER_POOL_DEFAULT_SIZE,
+        browser_pool_max_size=int(EnvVariables.browser_pool_max_size)
+        if EnvVariables.browser_pool_max_size is not None
+        and EnvVariables.browser_pool_max_size != ""
+        else BROWSER_POOL_DEFAULT_MAX_SIZE,
+        page_timeout=float(EnvVariables.page_timeout)
+        if EnvVariables.page_timeout is not None and EnvVariables.page_timeout != ""
+        else WaitTimeouts.page,
+        login_timeout=float(EnvVariables.login_timeout)
+        if EnvVariables.login_timeout is not None and EnvVariables.login_timeout != ""
+        else WaitTimeouts.login,
+        enrollment_timeout=float(EnvVariables.enrollment_timeout)
+        if EnvVariables.enrollment_timeout is not None
+        and EnvVariables.enrollment_timeout != ""
+        else WaitTimeouts.enrollment,
+        metrics_file=EnvVariables.metrics_file
+        if EnvVariables.metrics_file != ""
+        else None,
+        prometheus_file=EnvVariables.prometheus_file
+        if EnvVariables.prometheus_file != ""
+        else None,
         lesson_id=EnvVariables.lesson_id if EnvVariables.lesson_id != "" else None,
+        job_file=EnvVariables.job_file if EnvVariables.job_file != "" else None,
+        waitlist_file=EnvVariables.waitlist_file
+        if EnvVariables.waitlist_file != ""
+        else None,
+        accounts_file=EnvVariables.accounts_file
+        if EnvVariables.accounts_file != ""
+        else None,
+        schedule_file=EnvVariables.schedule_file
+        if EnvVariables.schedule_file != ""
+        else None,
         weekday=EnvVariables.week_day if EnvVariables.week_day != "" else None,
         start_time=parse_and_validate_start_time(EnvVariables.start_time)
         if EnvVariables.start_time is not None
@@ -856,36 +5223,221 @@ def main():
     args = parser.parse_args()
     logging.debug(f"Parsed {args=}")
 
-    creds = None
-    try:
-        creds = CredentialsManager(
-            args.organisation, args.username, args.password, args.save_credentials
-        ).get()
-    except AsvzBotException as e:
-        logging.error(e)
+    if args.type == "catalog":
+        try:
+            run_catalog(args.action, args.query, args.proxy)
+        except (AsvzBotException, requests.RequestException) as e:
+            logging.error(e)
+            exit(1)
+        return
+
+    if args.type == "training":
+        try:
+            catalog = Catalog.load()
+            args.facility, _ = catalog.lookup("facilities", args.facility)
+            if args.level is not None:
+                args.level, _ = catalog.lookup("levels", args.level)
+            args.sport_id = catalog.sport_id(args.sport_id)
+        except ValueError as e:
+            logging.error(e)
+            exit(1)
+
+    if args.type == "jobs":
+        job_store = JobStore()
+        try:
+            list_upcoming_jobs(job_store, args.within)
+        finally:
+            job_store.close()
+        return
+
+    jobs = None
+    if args.type == "batch":
+        try:
+            jobs = load_batch_jobs(args.job_file)
+        except AsvzBotException as e:
+            logging.error(e)
+            exit(1)
+
+    if not 1 <= args.hedge_attempts <= MAX_HEDGE_ATTEMPTS:
+        logging.error(
+            "Hedge attempts must be between 1 and {}".format(MAX_HEDGE_ATTEMPTS)
+        )
         exit(1)
+    if args.lookahead_weeks < 1:
+        logging.error("Lookahead weeks must be at least 1")
+        exit(1)
+
+    waitlist = None
+    if args.type == "waitlist":
+        try:
+            waitlist = load_waitlist(args.waitlist_file)
+        except AsvzBotException as e:
+            logging.error(e)
+            exit(1)
+
+    accounts = None
+    if args.type == "accounts":
+        try:
+            accounts = load_accounts(args.accounts_file)
+        except AsvzBotException as e:
+            logging.error(e)
+            exit(1)
+
+    creds = None
+    if accounts is None:
+        try:
+            creds = CredentialsManager(
+                args.organisation, args.username, args.password, args.save_credentials
+            ).get()
+        except AsvzBotException as e:
+            logging.error(e)
+            exit(1)
 
     chromedriver_path = get_chromedriver_path(args.proxy)
 
+    browser_pool = None
+    if args.browser_pool_size > 0:
+        try:
+            browser_pool = BrowserPool(
+                chromedriver_path,
+                args.proxy,
+                args.lean_browser,
+                args.capture_network,
+                args.browser_pool_size,
+                args.browser_pool_max_size,
+            )
+        except AsvzBotException as e:
+            logging.error(e)
+            exit(1)
+        # the browsers start while the lesson is searched
+        browser_pool.start()
+
+    job_store = JobStore() if args.job_store else None
+    try:
+        run_enrollment(
+            args,
+            jobs,
+            waitlist,
+            accounts,
+            creds,
+            chromedriver_path,
+            browser_pool,
+            job_store,
+        )
+    finally:
+        if browser_pool is not None:
+            browser_pool.close()
+        if job_store is not None:
+            job_store.close()
+
+
+def run_enrollment(
+    args, jobs, waitlist, accounts, creds, chromedriver_path, browser_pool, job_store
+):
+    enroller_options = {
+        "backend": args.backend,
+        "lead_time": args.lead_time_ms / 1000,
+        "hedge_attempts": args.hedge_attempts,
+        "hedge_stagger": args.hedge_stagger_ms / 1000,
+        "session_cache": SessionCache() if args.session_cache else None,
+        "idp_cache": IdpShortcutCache() if args.idp_cache else None,
+        "lean_browser": args.lean_browser,
+        "capture_network": args.capture_network,
+        "timeouts": WaitTimeouts(
+            args.page_timeout, args.login_timeout, args.enrollment_timeout
+        ),
+        "metrics": MetricsExporter(args.metrics_file, args.prometheus_file)
+        if args.metrics_file is not None or args.prometheus_file is not None
+        else None,
+        "browser_pool": browser_pool,
+        "job_store": job_store,
+    }
+
+    # the job store remembers the found lessons as well
+    resolver = SportfahrplanResolver(args.proxy, job_store or LessonLookupCache())
+
     enroller = None
     if args.type == "lesson":
         lesson_url = "{}/tn/lessons/{}".format(LESSON_BASE_URL, args.lesson_id)
-        enroller = AsvzEnroller(chromedriver_path, lesson_url, creds, args.proxy)
+        enroller = AsvzEnroller(
+            chromedriver_path, lesson_url, creds, args.proxy, **enroller_options
+        )
     elif args.type == "event":
         lesson_url = "{}/tn/events/{}".format(LESSON_BASE_URL, args.event_id)
-        enroller = AsvzEnroller(chromedriver_path, lesson_url, creds, args.proxy)
+        enroller = AsvzEnroller(
+            chromedriver_path, lesson_url, creds, args.proxy, **enroller_options
+        )
     elif args.type == "training":
-        enroller = AsvzEnroller.from_lesson_attributes(
+        training = {
+            "weekday": args.weekday,
+            "start_time": args.start_time,
+            "trainer": args.trainer,
+            "facility": args.facility,
+            "level": args.level,
+            "sport_id": args.sport_id,
+        }
+        try:
+            enroller = AsvzEnroller.from_next_training(
+                chromedriver_path,
+                training,
+                args.proxy,
+                creds,
+                weeks=args.lookahead_weeks,
+                resolver=resolver,
+                **enroller_options,
+            )
+        except LessonNotFoundException as e:
+            exit(e.exit_code)
+    elif args.type == "batch":
+        if not run_batch(
+            jobs,
             chromedriver_path,
-            args.weekday,
-            args.start_time,
-            args.trainer,
-            args.facility,
-            args.level,
-            args.sport_id,
+            creds,
             args.proxy,
+            resolver=resolver,
+            lookahead_weeks=args.lookahead_weeks,
+            **enroller_options,
+        ):
+            exit(1)
+        return
+    elif args.type == "waitlist":
+        groups, requests_per_minute = waitlist
+        if not run_waitlist(
+            groups,
+            requests_per_minute,
+            chromedriver_path,
             creds,
-        )
+            args.proxy,
+            **enroller_options,
+        ):
+            exit(1)
+        return
+    elif args.type == "accounts":
+        if not run_accounts(
+            accounts,
+            chromedriver_path,
+            args.proxy,
+            resolver=resolver,
+            lookahead_weeks=args.lookahead_weeks,
+            **enroller_options,
+        ):
+            exit(1)
+        return
+    elif args.type == "daemon":
+        try:
+            TrainingDaemon(
+                args.schedule_file,
+                chromedriver_path,
+                creds,
+                args.proxy,
+                resolver=resolver,
+                lookahead_weeks=args.lookahead_weeks,
+                **enroller_options,
+            ).run()
+        except AsvzBotException as e:
+            logging.error(e)
+            exit(1)
+        return
     else:
         raise AsvzBotException("Unknown enrollment type: '{}".format(args.type))
 
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+# coding=UTF-8
+
+"""
+Measures the time from the opening of the enrollment until the enrollment request of the bot
+reaches the server, against the local ASVZ stand-in.
+
+    python benchmark_enrollment.py --rounds 5 --lead-times-ms 0 20 50 --browser --lean-browser
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import asvz_bot
+from asvz_bot import (
+    BACKEND_BROWSER,
+    BACKEND_HTTP,
+    CREDENTIALS_ORG,
+    CREDENTIALS_PW,
+    CREDENTIALS_UNAME,
+    AsvzBotException,
+    AsvzEnroller,
+    SessionCache,
+    get_chromedriver_path,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+CREDS = {
+    CREDENTIALS_ORG: "ETH Zürich",
+    CREDENTIALS_UNAME: "benchmark",
+    CREDENTIALS_PW: "benchmark",
+}
+
+
+def run_round(backend, lead_time, lean, chromedriver, warmup, places, competitors):
+    """
+    Runs one enrollment against a fresh server and returns the latencies in milliseconds
+    from the enrollment start until the first request and until the successful request.
+    """
+    with FakeAsvz() as fake, tempfile.TemporaryDirectory() as tmp:
+        fake.add_user(CREDS[CREDENTIALS_UNAME], CREDS[CREDENTIALS_PW])
+        enrollment_start = datetime.today().replace(microsecond=0) + timedelta(
+            seconds=warmup
+        )
+        lesson = fake.add_lesson(
+            1,
+            FakeLesson(
+                enrollment_start,
+                enrollment_start + timedelta(hours=1),
+                places,
+            ),
+        )
+        fake.add_competitors(lesson, competitors)
+        asvz_bot.LESSON_BASE_URL = fake.base_url
+
+        session_cache = None
+        if backend == BACKEND_HTTP:
+            # log in beforehand, the http backend would need a browser for it otherwise
+            session_cache = SessionCache(str(Path(tmp) / "session.json"))
+            cookie = fake.login(CREDS[CREDENTIALS_UNAME], CREDS[CREDENTIALS_PW])
+            session_cache.store(
+                CREDS[CREDENTIALS_ORG],
+                CREDS[CREDENTIALS_UNAME],
+                fake.base_url,
+                [],
+                {},
+                fake.sessions[cookie],
+            )
+
+        enroller = AsvzEnroller(
+            chromedriver,
+            fake.lesson_url(1),
+            CREDS,
+            backend=backend,
+            lead_time=lead_time,
+            session_cache=session_cache,
+            lean_browser=lean,
+        )
+        try:
+            enroller.enroll()
+        except AsvzBotException as e:
+            logging.warning("Enrollment failed: {}".format(e))
+
+        opened_at = enrollment_start.timestamp()
+        own = [r for r in lesson.requests if not r[1].startswith("competitor-")]
+        enrolled = [r for r in own if r[2] == 201]
+        return {
+            "first_request_ms": (own[0][0] - opened_at) * 1000 if own else None,
+            "enrolled_ms": (enrolled[0][0] - opened_at) * 1000 if enrolled else None,
+            "requests": len(own),
+            "place_number": next(iter(lesson.enrollments.values()), None)
+            if enrolled
+            else None,
+        }
+
+
+def summarize(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {
+        "median": statistics.median(values),
+        "p90": values[min(len(values) - 1, int(0.9 * len(values)))],
+        "min": values[0],
+        "max": values[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the time to enroll against a local ASVZ stand-in"
+    )
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds per setting")
+    parser.add_argument(
+        "--lead-times-ms",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="Lead times of the http backend to compare",
+    )
+    parser.add_argument(
+        "--browser",
+        action="store_true",
+        help="Benchmark the browser backend as well (requires Chrome)",
+    )
+    parser.add_argument(
+        "--lean-browser",
+        action="store_true",
+        help="Benchmark the lean browser as well (requires Chrome)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=8,
+        help="Seconds between the start of a round and the opening of the enrollment",
+    )
+    parser.add_argument("--places", type=int, default=10, help="Places per lesson")
+    parser.add_argument(
+        "--competitors",
+        type=float,
+        nargs="*",
+        default=[],
+        help="Latencies in seconds of competing clients after the opening",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO if args.verbose else logging.WARNING,
+    )
+
+    settings = [(BACKEND_HTTP, ms, False) for ms in args.lead_times_ms]
+    chromedriver = None
+    if args.browser or args.lean_browser:
+        chromedriver = get_chromedriver_path()
+    if args.browser:
+        settings.append((BACKEND_BROWSER, 0, False))
+    if args.lean_browser:
+        settings.append((BACKEND_BROWSER, 0, True))
+
+    results = []
+    for backend, lead_time_ms, lean in settings:
+        rounds = [
+            run_round(
+                backend,
+                lead_time_ms / 1000,
+                lean,
+                chromedriver,
+                args.warmup,
+                args.places,
+                args.competitors,
+            )
+            for _ in range(args.rounds)
+        ]
+        result = {
+            "backend": backend,
+            "lead_time_ms": lead_time_ms,
+            "lean": lean,
+            "rounds": rounds,
+            "first_request_ms": summarize(r["first_request_ms"] for r in rounds),
+            "enrolled_ms": summarize(r["enrolled_ms"] for r in rounds),
+            "enrolled": sum(r["enrolled_ms"] is not None for r in rounds),
+        }
+        results.append(result)
+
+        enrolled = result["enrolled_ms"]
+        print(
+            "{:<15} lead {:>4} ms: enrolled {}/{}, median {}, p90 {}".format(
+                backend + (" (lean)" if lean else ""),
+                lead_time_ms,
+                result["enrolled"],
+                args.rounds,
+                "-" if enrolled is None else "{:.1f} ms".format(enrolled["median"]),
+                "-" if enrolled is None else "{:.1f} ms".format(enrolled["p90"]),
+            )
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,608 @@
+#!/usr/bin/python3
+# coding=UTF-8
+
+"""
+Local stand-in for the ASVZ websites, used by the tests and the benchmarks.
+
+It serves the schalter API, simplified lesson pages with the same elements as the schalter web app,
+the Sportfahrplan and the login pages (ASVZ login, SwitchAAI organisation picker and IdP).
+"""
+
+import base64
+import html
+import json
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlencode, urlparse
+
+LESSON_API_REGEX = re.compile(
+    r"^/tn-api/api/(?P<resource>Lessons|Events)/(?P<id>\d+)(?P<enrollment>/Enrollment)?$"
+)
+MEMBER_API_PATH = "/tn-api/api/MemberPerson"
+LESSON_PAGE_REGEX = re.compile(r"^/tn/(?P<kind>lessons|events)/(?P<id>\d+)$")
+IDP_LOGIN_REGEX = re.compile(r"^/idp/(?P<idp>[a-z0-9-]+)/login$")
+SPORTFAHRPLAN_FILTER_REGEX = re.compile(r"^f\[\d+\]$")
+
+RESOURCES = {"lessons": "Lessons", "events": "Events"}
+WEEKDAYS = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+SESSION_COOKIE = "fake_session"
+
+
+def to_api_datetime(dt):
+    return dt.astimezone().isoformat()
+
+
+def to_page_datetime(dt):
+    return "{}, {}".format(WEEKDAYS[dt.weekday()], dt.strftime("%d.%m.%Y %H:%M"))
+
+
+def idp_slug(organisation):
+    return re.sub(r"[^a-z0-9]+", "-", organisation.lower()).strip("-")[:20]
+
+
+def idp_entity_id(organisation):
+    return "https://{}.example.org/idp/shibboleth".format(idp_slug(organisation))
+
+
+# organisations that log in through SWITCH edu-ID
+EDUID_IDPS = [idp_slug("SWITCH edu-ID"), idp_slug("Universität Zürich")]
+
+
+class FakeLesson:
+    def __init__(
+        self,
+        enrollment_start,
+        lesson_start,
+        places_max,
+        participants=0,
+        sport_id=None,
+        facility_id=None,
+        level_id=None,
+        trainer=None,
+        title="Volleyball",
+    ):
+        self.enrollment_start = enrollment_start
+        self.lesson_start = lesson_start
+        self.places_max = places_max
+        self.participants = participants
+        self.sport_id = sport_id
+        self.facility_id = facility_id
+        self.level_id = level_id
+        self.trainer = trainer
+        self.title = title
+        # access token -> place number
+        self.enrollments = {}
+        # (received at, access token, HTTP status) of every enrollment request
+        self.requests = []
+
+    @property
+    def places_taken(self):
+        return self.participants + len(self.enrollments)
+
+    def to_api(self):
+        return {
+            "enrollmentFrom": to_api_datetime(self.enrollment_start),
+            "enrollmentUntil": to_api_datetime(self.lesson_start),
+            "starts": to_api_datetime(self.lesson_start),
+            "ends": to_api_datetime(self.lesson_start),
+            "participantsMax": self.places_max,
+            "participantCount": self.places_taken,
+        }
+
+
+LESSON_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body><app-root><app-lesson-details>
+<h1>{title}</h1>
+<dl><dt>Datum/Zeit</dt><dd>{lesson_time}</dd></dl>
+<dl><dt>Einschreibezeitraum</dt><dd>{enrollment_time}</dd></dl>
+<dl><dt>Freie Plätze</dt><dd><span>{free_places}</span></dd></dl>
+<app-lessons-enrollment-button>{enrollment_button}</app-lessons-enrollment-button>
+</app-lesson-details></app-root>
+<script>
+const accessToken = {access_token};
+if (accessToken !== null) {{
+    sessionStorage.setItem("oidc.user:fake", JSON.stringify({{access_token: accessToken}}));
+}}
+const button = document.getElementById("btnRegister");
+if (button !== null && {open_for_enrollment}) {{
+    // the web app enables the button as soon as the enrollment opens
+    const wait = {enrollment_start_ms} - Date.now();
+    if (wait <= 0) {{
+        button.disabled = false;
+    }} else {{
+        setTimeout(() => {{ button.disabled = false; }}, wait);
+    }}
+    button.addEventListener("click", async () => {{
+        const response = await fetch("{enrollment_api_url}", {{
+            method: "POST",
+            headers: {{"Authorization": "Bearer " + accessToken, "Content-Type": "application/json"}},
+            body: "{{}}",
+        }});
+        const data = await response.json();
+        const el = document.querySelector("app-lessons-enrollment-button");
+        if (response.ok) {{
+            el.innerHTML = '<div class="alert alert-success">Du hast dich erfolgreich eingeschrieben.</div>'
+                + '<span>Du hast die Platz-Nr. ' + data.data.placeNumber + '.</span>';
+        }} else {{
+            el.innerHTML = '<div class="alert alert-danger">'
+                + data.errors.map(e => e.message).join(" ") + '</div><span></span>';
+        }}
+    }});
+}}
+</script>
+</body></html>
+"""
+
+LOGIN_BUTTON = """<button class="btn btn-default" title="Login" onclick="window.location.href='{login_url}'">Login</button>"""
+
+REGISTER_BUTTON = """<button id="btnRegister" class="btn-primary btn enrollmentPlacePadding" disabled>Einschreiben</button>"""
+
+ENROLLED = """<div class="alert alert-success">Du hast dich erfolgreich eingeschrieben.</div><span>Du hast die Platz-Nr. {place_number}.</span>"""
+
+ASVZ_LOGIN_PAGE = """<!DOCTYPE html>
+<html><body>
+<button class="btn btn-warning btn-block" title="SwitchAai Account Login" onclick="window.location.href='{wayf_url}'">SwitchAai</button>
+<form method="post" action="/Account/Login">
+<input id="AsvzId" name="AsvzId">
+<input id="Password" name="Password" type="password">
+<input type="hidden" name="returnUrl" value="{return_url}">
+<button type="submit">Login</button>
+</form>
+</body></html>
+"""
+
+WAYF_PAGE = """<!DOCTYPE html>
+<html><body>
+<form method="get" action="/wayf/select">
+<input id="userIdPSelection_iddtext" name="user_idp">
+<input type="hidden" name="return" value="{return_url}">
+<input type="submit" value="Select">
+</form>
+</body></html>
+"""
+
+IDP_LOGIN_PAGE = """<!DOCTYPE html>
+<html><body>
+<form method="post" action="/idp/{idp}/login">
+<input id="username" name="username">
+<input id="password" name="password" type="password">
+<input type="hidden" name="target" value="{target}">
+<button type="submit">Login</button>
+</form>
+</body></html>
+"""
+
+# SWITCH edu-ID asks for the username first and for the password on a second page
+EDUID_USERNAME_PAGE = """<!DOCTYPE html>
+<html><body>
+<form method="get" action="/idp/{idp}/login">
+<input id="username" name="username">
+<input type="hidden" name="target" value="{target}">
+<button type="submit" id="login-button">Weiter</button>
+</form>
+</body></html>
+"""
+
+EDUID_PASSWORD_PAGE = """<!DOCTYPE html>
+<html><body>
+<form method="post" action="/idp/{idp}/login">
+<input type="hidden" name="username" value="{username}">
+<input id="password" name="password" type="password">
+<input type="hidden" name="target" value="{target}">
+<button type="submit" id="login-button">Login</button>
+</form>
+</body></html>
+"""
+
+SPORTFAHRPLAN_PAGE = """<!DOCTYPE html>
+<html><body><ul class="facets">{facets}</ul><div class="teaser-list-calendar">{days}</div></body></html>
+"""
+
+SPORTFAHRPLAN_FACET = """<li><a href="/426-sportfahrplan?{query}">{name} <span>({count})</span></a></li>"""
+
+SPORTFAHRPLAN_DAY = (
+    """<div class="teaser-list-calendar__day"><h2>{day}</h2><ul>{lessons}</ul></div>"""
+)
+
+SPORTFAHRPLAN_LESSON = """<li class="btn-hover-parent"><span>{time}</span> <span>{title}</span> <span>{trainer}</span> <a href="{lesson_url}">Anmelden</a></li>"""
+
+
+class FakeAsvz:
+    """
+    Serves lessons on 127.0.0.1 with the same urls and payloads as schalter.asvz.ch.
+    Only requests with one of the known access tokens may enroll, logging in as one of the users creates one.
+    """
+
+    def __init__(self):
+        self.lessons = {}
+        self.access_tokens = set()
+        # logged in, but not allowed to enroll, e.g. without membership
+        self.forbidden_tokens = set()
+        # username -> password
+        self.users = {}
+        # session cookie -> access token
+        self.sessions = {}
+        # seconds the server clock is ahead of the local clock
+        self.clock_offset = 0.0
+        # page served as Sportfahrplan instead of the lessons, regardless of the filters
+        self.sportfahrplan_html = None
+        # Sportfahrplan filters, e.g. "facility" -> {45598: "Sport Center Hönggerberg"}
+        self.facets = {}
+        # number of requests per path, without query
+        self.hits = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.__handler())
+        self.thread = None
+        self.timers = []
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    @property
+    def sportfahrplan_url(self):
+        return self.base_url + "/426-sportfahrplan"
+
+    @property
+    def api_base_url(self):
+        return self.base_url + "/tn-api/api"
+
+    def lesson_url(self, lesson_id, kind="lessons"):
+        return "{}/tn/{}/{}".format(self.base_url, kind, lesson_id)
+
+    def now(self):
+        """
+        Time of the server clock, the enrollment opens in server time.
+        """
+        return datetime.fromtimestamp(time.time() + self.clock_offset)
+
+    def add_lesson(self, lesson_id, lesson, resource="Lessons"):
+        self.lessons[(resource, lesson_id)] = lesson
+        return lesson
+
+    def add_user(self, username, password):
+        self.users[username] = password
+
+    def add_competitors(self, lesson, latencies):
+        """
+        Competing clients, the i-th one enrolls latencies[i] seconds after the enrollment opened.
+        """
+        for i, latency in enumerate(latencies):
+            delay = (lesson.enrollment_start - self.now()).total_seconds()
+            timer = threading.Timer(
+                max(delay + latency, 0), self.enroll, (lesson, f"competitor-{i}")
+            )
+            timer.daemon = True
+            timer.start()
+            self.timers.append(timer)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        for timer in self.timers:
+            timer.cancel()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def enroll(self, lesson, token):
+        received_at = time.time()
+        with self.lock:
+            status, payload = self.__enroll(lesson, token)
+            lesson.requests.append((received_at, token, status))
+        return status, payload
+
+    def __enroll(self, lesson, token):
+        if token in self.forbidden_tokens:
+            return 403, {"errors": [{"message": "No valid membership"}]}
+        if token in lesson.enrollments:
+            return 409, {"errors": [{"message": "Already enrolled"}]}
+        if self.now() < lesson.enrollment_start:
+            return 422, {"errors": [{"message": "Enrollment not open yet"}]}
+        if lesson.places_taken >= lesson.places_max:
+            return 422, {"errors": [{"message": "Lesson is booked out"}]}
+
+        place_number = lesson.places_taken + 1
+        lesson.enrollments[token] = place_number
+        return 201, {"data": {"placeNumber": place_number}}
+
+    def login(self, username, password):
+        """
+        Returns a new session cookie, or None if the credentials are wrong.
+        """
+        if username not in self.users or self.users[username] != password:
+            return None
+
+        token = secrets.token_hex(16)
+        cookie = secrets.token_hex(16)
+        with self.lock:
+            self.access_tokens.add(token)
+            self.sessions[cookie] = token
+        return cookie
+
+    def find_lesson(self, m):
+        if m is None:
+            return None
+        return self.lessons.get((m.group("resource"), int(m.group("id"))))
+
+    def render_lesson_page(self, resource, lesson_id, lesson, token, page_url):
+        if token is None:
+            login_url = "/Account/Login?" + urlencode({"returnUrl": page_url})
+            enrollment_button = LOGIN_BUTTON.format(login_url=login_url)
+        elif token in lesson.enrollments:
+            enrollment_button = ENROLLED.format(place_number=lesson.enrollments[token])
+        else:
+            enrollment_button = REGISTER_BUTTON
+
+        return LESSON_PAGE.format(
+            title=html.escape(lesson.title),
+            lesson_time="{} - {}".format(
+                to_page_datetime(lesson.lesson_start),
+                lesson.lesson_start.strftime("%H:%M"),
+            ),
+            enrollment_time="{} - {}".format(
+                to_page_datetime(lesson.enrollment_start),
+                to_page_datetime(lesson.lesson_start),
+            ),
+            free_places=max(lesson.places_max - lesson.places_taken, 0),
+            enrollment_button=enrollment_button,
+            access_token=json.dumps(token),
+            open_for_enrollment="true"
+            if lesson.places_taken < lesson.places_max
+            else "false",
+            enrollment_start_ms=int(lesson.enrollment_start.timestamp() * 1000),
+            enrollment_api_url="/tn-api/api/{}/{}/Enrollment".format(
+                resource, lesson_id
+            ),
+        )
+
+    def render_sportfahrplan(self, query):
+        if self.sportfahrplan_html is not None:
+            return self.sportfahrplan_html
+
+        filters = {}
+        for name, values in query.items():
+            if SPORTFAHRPLAN_FILTER_REGEX.match(name):
+                key, _, value = values[0].partition(":")
+                filters[key] = int(value)
+        start = (
+            datetime.strptime(query["date"][0], "%Y-%m-%d %H:%M")
+            if "date" in query
+            else datetime.today()
+        )
+
+        days = {}
+        for (resource, lesson_id), lesson in sorted(
+            self.lessons.items(), key=lambda item: item[1].lesson_start
+        ):
+            if (
+                resource != "Lessons"
+                or lesson.lesson_start < start
+                or filters.get("sport", lesson.sport_id) != lesson.sport_id
+                or filters.get("facility", lesson.facility_id) != lesson.facility_id
+                or filters.get("niveau", lesson.level_id) != lesson.level_id
+            ):
+                continue
+            days.setdefault(lesson.lesson_start.date(), []).append(
+                SPORTFAHRPLAN_LESSON.format(
+                    time=lesson.lesson_start.strftime("%H:%M"),
+                    title=html.escape(lesson.title),
+                    trainer=html.escape(lesson.trainer or ""),
+                    lesson_url=self.lesson_url(lesson_id),
+                )
+            )
+
+        return SPORTFAHRPLAN_PAGE.format(
+            facets="".join(
+                SPORTFAHRPLAN_FACET.format(
+                    query=urlencode({"f[0]": "{}:{}".format(facet, facet_id)}),
+                    name=html.escape(name),
+                    count=len(self.lessons),
+                )
+                for facet, entries in self.facets.items()
+                for facet_id, name in entries.items()
+            ),
+            days="".join(
+                SPORTFAHRPLAN_DAY.format(
+                    day=day.strftime("%d.%m.%Y"), lessons="".join(lessons)
+                )
+                for day, lessons in days.items()
+            ),
+        )
+
+    def __handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                fake.hits[url.path] = fake.hits.get(url.path, 0) + 1
+
+                if url.path == "/426-sportfahrplan":
+                    return self.__respond_html(fake.render_sportfahrplan(query))
+
+                if url.path == "/Account/Login":
+                    return_url = query.get("returnUrl", ["/"])[0]
+                    wayf_url = "/wayf?" + urlencode(
+                        {
+                            "entityID": fake.base_url + "/shibboleth",
+                            "return": "/Shibboleth.sso/Login?"
+                            + urlencode({"target": return_url}),
+                        }
+                    )
+                    return self.__respond_html(
+                        ASVZ_LOGIN_PAGE.format(
+                            wayf_url=html.escape(wayf_url),
+                            return_url=html.escape(return_url),
+                        )
+                    )
+
+                if url.path == "/wayf":
+                    return self.__respond_html(
+                        WAYF_PAGE.format(
+                            return_url=html.escape(query.get("return", ["/"])[0])
+                        )
+                    )
+
+                if url.path == "/wayf/select":
+                    # SAML discovery: return to the service provider with the entity of the selected IdP
+                    organisation = query.get("user_idp", [""])[0]
+                    return_url = query.get("return", ["/"])[0]
+                    separator = "&" if "?" in return_url else "?"
+                    return self.__redirect(
+                        return_url
+                        + separator
+                        + urlencode({"entityID": idp_entity_id(organisation)}),
+                        cookie=(
+                            "_saml_idp",
+                            quote(
+                                base64.b64encode(
+                                    idp_entity_id(organisation).encode()
+                                ).decode(),
+                                safe="",
+                            ),
+                        ),
+                    )
+
+                if url.path == "/Shibboleth.sso/Login":
+                    entity_id = query.get("entityID", [""])[0]
+                    m = re.match(r"^https://([a-z0-9-]+)\.example\.org/", entity_id)
+                    if m is None:
+                        return self.__respond(400, {})
+                    return self.__redirect(
+                        "/idp/{}/login?".format(m.group(1))
+                        + urlencode({"target": query.get("target", ["/"])[0]})
+                    )
+
+                m = IDP_LOGIN_REGEX.match(url.path)
+                if m is not None:
+                    idp = m.group("idp")
+                    target = html.escape(query.get("target", ["/"])[0])
+                    if idp not in EDUID_IDPS:
+                        page = IDP_LOGIN_PAGE.format(idp=idp, target=target)
+                    elif "username" in query:
+                        page = EDUID_PASSWORD_PAGE.format(
+                            idp=idp,
+                            target=target,
+                            username=html.escape(query["username"][0]),
+                        )
+                    else:
+                        page = EDUID_USERNAME_PAGE.format(idp=idp, target=target)
+                    return self.__respond_html(page)
+
+                m = LESSON_PAGE_REGEX.match(url.path)
+                if m is not None:
+                    resource = RESOURCES[m.group("kind")]
+                    lesson_id = int(m.group("id"))
+                    lesson = fake.lessons.get((resource, lesson_id))
+                    if lesson is None:
+                        return self.__respond_html(
+                            "<html><body><app-page-not-found></app-page-not-found></body></html>"
+                        )
+                    return self.__respond_html(
+                        fake.render_lesson_page(
+                            resource,
+                            lesson_id,
+                            lesson,
+                            self.__session_token(),
+                            fake.base_url + url.path,
+                        )
+                    )
+
+                if url.path == MEMBER_API_PATH:
+                    token = self.headers.get("Authorization", "").removeprefix(
+                        "Bearer "
+                    )
+                    if token not in fake.access_tokens:
+                        return self.__respond(401, {"errors": []})
+                    return self.__respond(200, {"data": {"id": token}})
+
+                m = LESSON_API_REGEX.match(url.path)
+                lesson = fake.find_lesson(m)
+                if lesson is None or m.group("enrollment"):
+                    return self.__respond(404, {"errors": []})
+                self.__respond(200, {"data": lesson.to_api()})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                url = urlparse(self.path)
+                fake.hits[url.path] = fake.hits.get(url.path, 0) + 1
+
+                if url.path == "/Account/Login" or IDP_LOGIN_REGEX.match(url.path):
+                    form = parse_qs(body.decode())
+                    username = (form.get("AsvzId") or form.get("username") or [""])[0]
+                    password = (form.get("Password") or form.get("password") or [""])[0]
+                    target = (form.get("returnUrl") or form.get("target") or ["/"])[0]
+                    cookie = fake.login(username, password)
+                    if cookie is None:
+                        return self.__respond_html(
+                            "<html><body>Login failed</body></html>"
+                        )
+                    return self.__redirect(target, cookie=(SESSION_COOKIE, cookie))
+
+                m = LESSON_API_REGEX.match(url.path)
+                lesson = fake.find_lesson(m)
+                if lesson is None or not m.group("enrollment"):
+                    return self.__respond(404, {"errors": []})
+
+                token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                if token not in fake.access_tokens:
+                    return self.__respond(401, {"errors": []})
+                self.__respond(*fake.enroll(lesson, token))
+
+            def date_time_string(self, timestamp=None):
+                return super().date_time_string(time.time() + fake.clock_offset)
+
+            def log_message(self, format, *args):
+                pass
+
+            def __session_token(self):
+                for cookie in self.headers.get("Cookie", "").split(";"):
+                    name, _, value = cookie.strip().partition("=")
+                    if name == SESSION_COOKIE and value in fake.sessions:
+                        return fake.sessions[value]
+                return None
+
+            def __redirect(self, location, cookie=None):
+                self.send_response(302)
+                self.send_header("Location", location)
+                if cookie is not None:
+                    self.send_header("Set-Cookie", "{}={}; Path=/".format(*cookie))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def __respond_html(self, content):
+                if content is None:
+                    return self.__respond(404, {})
+                body = content.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def __respond(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
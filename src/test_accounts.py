@@ -0,0 +1,188 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import asvz_bot
+from asvz_bot import (
+    CREDENTIALS_ORG,
+    CREDENTIALS_PW,
+    CREDENTIALS_UNAME,
+    ETH_ORGANISATION_NAME,
+    AsvzBotException,
+    SessionCache,
+    SharedBrowser,
+    load_accounts,
+    run_accounts,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+
+def write_accounts(tmp_path, data):
+    filename = tmp_path / "accounts.json"
+    filename.write_text(json.dumps(data))
+    return str(filename)
+
+
+def account(username, **kwargs):
+    return dict(organisation="ETH", username=username, password="password", **kwargs)
+
+
+def test_load_accounts(tmp_path):
+    accounts = load_accounts(
+        write_accounts(
+            tmp_path,
+            {
+                "jobs": [{"type": "lesson", "lesson_id": 1}],
+                "accounts": [
+                    account("alice"),
+                    account(
+                        "bob",
+                        max_enrollments=1,
+                        jobs=[{"type": "event", "event_id": "2"}],
+                    ),
+                ],
+            },
+        )
+    )
+
+    assert accounts[0] == {
+        "creds": {
+            CREDENTIALS_ORG: ETH_ORGANISATION_NAME,
+            CREDENTIALS_UNAME: "alice",
+            CREDENTIALS_PW: "password",
+        },
+        "jobs": [{"type": "lesson", "lesson_id": 1}],
+        "max_enrollments": None,
+    }
+    assert accounts[1]["jobs"] == [{"type": "event", "event_id": 2}]
+    assert accounts[1]["max_enrollments"] == 1
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"accounts": []},
+        {"accounts": [account("alice")]},
+        {"jobs": [{"type": "lesson", "lesson_id": 1}], "accounts": [{"username": "a"}]},
+        {
+            "jobs": [{"type": "lesson", "lesson_id": 1}],
+            "accounts": [account("alice", max_enrollments=0)],
+        },
+        {
+            "jobs": [{"type": "lesson", "lesson_id": 1}],
+            "accounts": [dict(account("alice"), organisation="MIT")],
+        },
+    ],
+)
+def test_load_invalid_accounts(tmp_path, data):
+    with pytest.raises(AsvzBotException):
+        load_accounts(write_accounts(tmp_path, data))
+
+
+def test_run_accounts(tmp_path, monkeypatch):
+    now = datetime.today().replace(microsecond=0)
+    with FakeAsvz() as fake:
+        for lesson_id in (1, 2):
+            fake.add_lesson(
+                lesson_id,
+                FakeLesson(now - timedelta(hours=1), now + timedelta(hours=1), 10),
+            )
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+
+        # cached login sessions, so that no browser is needed
+        session_cache = SessionCache(str(tmp_path / "session.json"))
+        for username in ("alice", "bob"):
+            fake.access_tokens.add(username + "-token")
+            session_cache.store(
+                ETH_ORGANISATION_NAME,
+                username,
+                fake.base_url,
+                [],
+                {},
+                username + "-token",
+            )
+
+        accounts = load_accounts(
+            write_accounts(
+                tmp_path,
+                {
+                    "jobs": [
+                        {"type": "lesson", "lesson_id": 1},
+                        {"type": "lesson", "lesson_id": 2},
+                    ],
+                    "accounts": [account("alice"), account("bob", max_enrollments=1)],
+                },
+            )
+        )
+        assert run_accounts(accounts, None, None, session_cache=session_cache)
+
+        assert fake.lessons[("Lessons", 1)].enrollments.keys() == {
+            "alice-token",
+            "bob-token",
+        }
+        assert fake.lessons[("Lessons", 2)].enrollments.keys() == {"alice-token"}
+
+
+class FakeDriver:
+    def __init__(self):
+        self.current_window_handle = "default"
+        self.contexts = set()
+        self.switch_to = self
+        self.quit_called = False
+
+    def execute_script(self, script):
+        return 1
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == "Target.createBrowserContext":
+            context_id = "context-{}".format(len(self.contexts))
+            self.contexts.add(context_id)
+            return {"browserContextId": context_id}
+        if cmd == "Target.createTarget":
+            return {"targetId": "target-" + params["browserContextId"]}
+        if cmd == "Target.disposeBrowserContext":
+            self.contexts.remove(params["browserContextId"])
+        return {}
+
+    def window(self, handle):
+        self.current_window_handle = handle
+
+    def close(self):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_shared_browser(monkeypatch):
+    started = []
+
+    def get_driver(*args, **kwargs):
+        started.append(FakeDriver())
+        return started[-1]
+
+    monkeypatch.setattr(asvz_bot.AsvzEnroller, "get_driver", staticmethod(get_driver))
+    browser = SharedBrowser(None)
+
+    driver = browser.open_context()
+    assert driver.current_window_handle == "target-context-0"
+    assert driver.contexts == {"context-0"}
+
+    # the next login waits until the context is closed
+    thread = threading.Thread(
+        target=lambda: browser.close_context(browser.open_context())
+    )
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()
+
+    browser.close_context(driver)
+    thread.join(1)
+    assert not thread.is_alive()
+    assert driver.contexts == set()
+    assert len(started) == 1
+
+    browser.close()
+    assert driver.quit_called
@@ -0,0 +1,172 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import asvz_bot
+from asvz_bot import (
+    CREDENTIALS_ORG,
+    CREDENTIALS_PW,
+    CREDENTIALS_UNAME,
+    FACILITIES,
+    WEEKDAYS,
+    AsvzBotException,
+    SessionCache,
+    load_batch_jobs,
+    run_batch,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+ACCESS_TOKEN = "secret-token"
+CREDS = {
+    CREDENTIALS_ORG: "ETH Zürich",
+    CREDENTIALS_UNAME: "flbuetle",
+    CREDENTIALS_PW: "password",
+}
+
+
+def write_jobs(tmp_path, jobs):
+    filename = tmp_path / "jobs.json"
+    filename.write_text(json.dumps({"jobs": jobs}))
+    return str(filename)
+
+
+def test_load_batch_jobs(tmp_path):
+    jobs = load_batch_jobs(
+        write_jobs(
+            tmp_path,
+            [
+                {"type": "lesson", "lesson_id": "196346"},
+                {"type": "event", "event_id": 536447},
+                {
+                    "type": "training",
+                    "weekday": "Mo",
+                    "start_time": "18:15",
+                    "facility": "Sport Center Hönggerberg",
+                    "sport_id": 45743,
+                },
+            ],
+        )
+    )
+
+    assert jobs[0] == {"type": "lesson", "lesson_id": 196346}
+    assert jobs[1] == {"type": "event", "event_id": 536447}
+    assert jobs[2]["start_time"].hour == 18
+    assert jobs[2]["level"] is None
+
+
+@pytest.mark.parametrize(
+    "job",
+    [
+        {"type": "lesson"},
+        {"type": "course", "lesson_id": 1},
+        {
+            "type": "training",
+            "weekday": "Monday",
+            "start_time": "18:15",
+            "facility": "Sport Center Hönggerberg",
+            "sport_id": 45743,
+        },
+        {
+            "type": "training",
+            "weekday": "Mo",
+            "start_time": "6 pm",
+            "facility": "Sport Center Hönggerberg",
+            "sport_id": 45743,
+        },
+    ],
+)
+def test_load_invalid_batch_job(tmp_path, job):
+    with pytest.raises(AsvzBotException, match="Invalid job #1"):
+        load_batch_jobs(write_jobs(tmp_path, [job]))
+
+
+def test_load_empty_job_file(tmp_path):
+    with pytest.raises(AsvzBotException):
+        load_batch_jobs(write_jobs(tmp_path, []))
+
+
+def test_run_batch(tmp_path, monkeypatch):
+    now = datetime.today().replace(microsecond=0)
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        for lesson_id in (1, 2):
+            fake.add_lesson(
+                lesson_id,
+                FakeLesson(now - timedelta(hours=1), now + timedelta(hours=1), 10),
+            )
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+
+        # a cached login session, so that no browser is needed
+        session_cache = SessionCache(str(tmp_path / "session.json"))
+        session_cache.store(
+            CREDS[CREDENTIALS_ORG],
+            CREDS[CREDENTIALS_UNAME],
+            fake.base_url,
+            [],
+            {},
+            ACCESS_TOKEN,
+        )
+
+        jobs = [
+            {"type": "lesson", "lesson_id": 1},
+            {"type": "lesson", "lesson_id": 2},
+            {"type": "lesson", "lesson_id": 3},
+        ]
+        succeeded = run_batch(jobs, None, CREDS, None, session_cache=session_cache)
+
+        assert not succeeded
+        assert fake.lessons[("Lessons", 1)].enrollments == {ACCESS_TOKEN: 1}
+        assert fake.lessons[("Lessons", 2)].enrollments == {ACCESS_TOKEN: 1}
+
+
+def test_run_batch_training_skips_holiday(tmp_path, monkeypatch):
+    now = datetime.today().replace(microsecond=0)
+    tomorrow = now + timedelta(days=1)
+    lesson_start = (tomorrow + timedelta(weeks=1)).replace(hour=18, minute=15, second=0)
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        # no lesson tomorrow, e.g. a holiday, but a week later
+        lesson = fake.add_lesson(
+            1,
+            FakeLesson(
+                now - timedelta(hours=1),
+                lesson_start,
+                10,
+                sport_id=45743,
+                facility_id=FACILITIES["Sport Center Hönggerberg"],
+            ),
+        )
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        monkeypatch.setattr(asvz_bot, "SPORTFAHRPLAN_BASE_URL", fake.sportfahrplan_url)
+
+        session_cache = SessionCache(str(tmp_path / "session.json"))
+        session_cache.store(
+            CREDS[CREDENTIALS_ORG],
+            CREDS[CREDENTIALS_UNAME],
+            fake.base_url,
+            [],
+            {},
+            ACCESS_TOKEN,
+        )
+
+        jobs = load_batch_jobs(
+            write_jobs(
+                tmp_path,
+                [
+                    {
+                        "type": "training",
+                        "weekday": list(WEEKDAYS)[tomorrow.weekday()],
+                        "start_time": "18:15",
+                        "facility": "Sport Center Hönggerberg",
+                        "sport_id": 45743,
+                    }
+                ],
+            )
+        )
+        succeeded = run_batch(
+            jobs, None, CREDS, None, lookahead_weeks=2, session_cache=session_cache
+        )
+
+        assert succeeded
+        assert lesson.enrollments == {ACCESS_TOKEN: 1}
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+import asvz_bot
+from asvz_bot import AsvzBotException, BrowserPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.healthy = True
+        self.quit_called = False
+        self.handles = ["tab-0"]
+        self.current_window_handle = "tab-0"
+        self.cdp_commands = []
+        self.switch_to = self
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise ConnectionError("browser crashed")
+        if "origin" in script:
+            return "https://schalter.asvz.ch"
+        return 1
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.cdp_commands.append(cmd)
+        return {}
+
+    @property
+    def window_handles(self):
+        return list(self.handles)
+
+    def new_window(self, kind):
+        handle = "tab-{}".format(len(self.cdp_commands) + len(self.handles))
+        self.handles.append(handle)
+        self.current_window_handle = handle
+
+    def window(self, handle):
+        self.current_window_handle = handle
+
+    def close(self):
+        self.handles.remove(self.current_window_handle)
+
+    def get_log(self, kind):
+        return []
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def started(monkeypatch):
+    drivers = []
+
+    def get_driver(*args, **kwargs):
+        driver = FakeDriver()
+        drivers.append(driver)
+        return driver
+
+    monkeypatch.setattr(asvz_bot.AsvzEnroller, "get_driver", staticmethod(get_driver))
+    return drivers
+
+
+def wait_for_idle(pool, count):
+    deadline = time.monotonic() + 2
+    while len(pool.idle) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(pool.idle) == count
+
+
+def test_prestarted_browser(started):
+    with BrowserPool(None, size=1, max_size=2) as pool:
+        wait_for_idle(pool, 1)
+        driver = pool.acquire()
+        assert driver is started[0]
+
+        # another browser is started in the background to replace it
+        wait_for_idle(pool, 1)
+        assert len(started) == 2
+
+        pool.release(driver)
+        assert "Network.clearBrowserCookies" in driver.cdp_commands
+        # the previous tab with its scripts is closed
+        assert "tab-0" not in driver.handles
+        assert len(driver.handles) == 1
+        assert len(pool.idle) == 2
+
+    assert all(driver.quit_called for driver in started)
+
+
+def test_unhealthy_browser_is_replaced(started):
+    pool = BrowserPool(None, size=1, max_size=1)
+    pool.start()
+    wait_for_idle(pool, 1)
+    started[0].healthy = False
+
+    driver = pool.acquire()
+    assert driver is started[1]
+    assert started[0].quit_called
+    pool.close()
+
+
+def test_max_size(started):
+    pool = BrowserPool(None, size=0, max_size=1)
+    driver = pool.acquire()
+    with pytest.raises(AsvzBotException):
+        pool.acquire(timeout=0.05)
+
+    threading.Timer(0.05, pool.release, [driver]).start()
+    assert pool.acquire(timeout=1) is driver
+    assert len(started) == 1
+    pool.close()
+
+
+def test_recycle_after_max_uses(started):
+    pool = BrowserPool(None, size=0, max_size=1, max_uses=2)
+    for _ in range(2):
+        pool.release(pool.acquire())
+    assert started[0].quit_called
+    assert pool.acquire() is started[1]
+    pool.close()
+
+
+def test_invalid_size():
+    with pytest.raises(AsvzBotException):
+        BrowserPool(None, size=3, max_size=2)
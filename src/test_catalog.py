@@ -0,0 +1,110 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import asvz_bot
+from asvz_bot import (
+    AsvzBotException,
+    Catalog,
+    http_session,
+    sportfahrplan_url,
+    validate_batch_job,
+)
+from fake_asvz import FakeAsvz
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    with FakeAsvz() as fake:
+        monkeypatch.setattr(asvz_bot, "SPORTFAHRPLAN_BASE_URL", fake.sportfahrplan_url)
+        monkeypatch.setattr(
+            asvz_bot, "CATALOG_FILENAME", str(tmp_path / "catalog.json")
+        )
+        fake.facets = {
+            "sport": {45743: "Volleyball", 45645: "Badminton"},
+            "facility": {
+                45598: "Sport Center Hönggerberg",
+                45594: "Sport Center Polyterrasse",
+            },
+            "niveau": {2104: "Alle", 726: "Fortgeschrittene"},
+        }
+        yield fake
+
+
+def test_lookup():
+    catalog = Catalog()
+
+    assert catalog.lookup("facilities", "Sport Center Hönggerberg") == (
+        "Sport Center Hönggerberg",
+        45598,
+    )
+    assert catalog.lookup("facilities", " sport center  honggerberg") == (
+        "Sport Center Hönggerberg",
+        45598,
+    )
+    with pytest.raises(ValueError, match="did you mean 'Sport Center Irchel'"):
+        catalog.lookup("facilities", "Sport Centre Irchl")
+    with pytest.raises(ValueError):
+        catalog.sport_id("Volleyball")
+    assert catalog.sport_id("45743") == 45743
+
+
+def test_sync(fake, tmp_path):
+    catalog = Catalog.sync(http_session())
+
+    assert catalog.revision == 1
+    assert catalog.sections["sports"] == {"Volleyball": 45743, "Badminton": 45645}
+    assert Catalog.load().sport_id("volleyball") == 45743
+    assert ("sports", "Volleyball", 45743) in Catalog.load().search("volley")
+
+    # unchanged filters keep the revision, a renumbered facility is picked up
+    assert Catalog.sync(http_session()).revision == 1
+    fake.facets["facility"] = {45599: "Sport Center Hönggerberg"}
+    catalog = Catalog.sync(http_session())
+    assert catalog.revision == 2
+    assert catalog.sections["facilities"] == {"Sport Center Hönggerberg": 45599}
+    assert "f[1]=facility:45599&" in sportfahrplan_url(
+        45743, "Sport Center Hönggerberg", None, datetime(2023, 12, 11, 18, 15)
+    )
+
+
+def test_sync_without_filters(fake, tmp_path):
+    fake.facets = {}
+    with pytest.raises(AsvzBotException):
+        Catalog.sync(http_session())
+    assert not (tmp_path / "catalog.json").exists()
+
+
+def test_load_other_version(fake, tmp_path):
+    Catalog.sync(http_session())
+    filename = tmp_path / "catalog.json"
+    data = json.loads(filename.read_text())
+    filename.write_text(json.dumps({**data, "version": 0, "sports": {}}))
+
+    # the built-in facilities are used until the catalog is synced again
+    catalog = Catalog.load()
+    assert catalog.synced_at is None
+    assert catalog.lookup("facilities", "Sport Center Irchel")[1] == 45577
+
+
+def test_validate_training_job(fake):
+    Catalog.sync(http_session())
+    job = {
+        "type": "training",
+        "weekday": "Mo",
+        "start_time": "18:15",
+        "facility": "sport center hönggerberg",
+        "level": "alle",
+        "sport_id": "Volleyball",
+    }
+
+    validated = validate_batch_job(0, job)
+    assert (validated["facility"], validated["level"], validated["sport_id"]) == (
+        "Sport Center Hönggerberg",
+        "Alle",
+        45743,
+    )
+
+    with pytest.raises(AsvzBotException, match="did you mean 'Badminton'"):
+        validate_batch_job(0, {**job, "sport_id": "Badmintn"})
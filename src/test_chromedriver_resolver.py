@@ -0,0 +1,108 @@
+import pytest
+
+import asvz_bot
+from asvz_bot import AsvzBotException, ChromedriverResolver
+
+
+@pytest.fixture
+def browser(tmp_path, monkeypatch):
+    """
+    A fake Chromium installation with version 120 and a chromedriver manager counting its installs.
+    """
+    binary = tmp_path / "chromium"
+    binary.write_text("120")
+    versions = {asvz_bot.ChromeType.CHROMIUM: "120.0.6099.109"}
+    installs = []
+
+    class FakeChromeDriverManager:
+        def __init__(self, chrome_type, download_manager=None):
+            self.chrome_type = chrome_type
+
+        def install(self):
+            if self.chrome_type not in versions:
+                raise ValueError("Browser not installed")
+            driver = tmp_path / "chromedriver-{}".format(versions[self.chrome_type])
+            driver.write_text("")
+            installs.append(str(driver))
+            return str(driver)
+
+    monkeypatch.setattr(asvz_bot, "ChromeDriverManager", FakeChromeDriverManager)
+    monkeypatch.setattr(
+        asvz_bot,
+        "find_browser_binary",
+        lambda chrome_type: str(binary) if chrome_type in versions else None,
+    )
+    monkeypatch.setattr(asvz_bot, "get_browser_version", versions.get)
+    return binary, versions, installs
+
+
+def test_resolve_cached(tmp_path, browser, monkeypatch):
+    _, _, installs = browser
+    resolver = ChromedriverResolver(manifest_filename=str(tmp_path / "driver.json"))
+
+    driver_path = resolver.resolve()
+    assert installs == [driver_path]
+
+    # neither probing the version nor downloading when the browser is unchanged
+    monkeypatch.setattr(asvz_bot, "get_browser_version", None)
+    assert resolver.resolve() == driver_path
+    assert len(installs) == 1
+
+
+def test_resolve_browser_update(tmp_path, browser):
+    binary, versions, installs = browser
+    resolver = ChromedriverResolver(manifest_filename=str(tmp_path / "driver.json"))
+    resolver.resolve()
+
+    # a patch release keeps the driver
+    binary.write_text("120 patched")
+    versions[asvz_bot.ChromeType.CHROMIUM] = "120.0.6099.129"
+    resolver.resolve()
+    assert len(installs) == 1
+
+    # a major release needs a new driver
+    binary.write_text("121")
+    versions[asvz_bot.ChromeType.CHROMIUM] = "121.0.6167.85"
+    assert resolver.resolve().endswith("chromedriver-121.0.6167.85")
+    assert len(installs) == 2
+
+
+def test_resolve_offline(tmp_path, browser, monkeypatch):
+    binary, versions, installs = browser
+    resolver = ChromedriverResolver(manifest_filename=str(tmp_path / "driver.json"))
+    driver_path = resolver.resolve()
+
+    def offline():
+        raise ConnectionError("offline")
+
+    binary.write_text("121")
+    versions[asvz_bot.ChromeType.CHROMIUM] = "121.0.6167.85"
+    monkeypatch.setattr(asvz_bot.ChromeDriverManager, "install", lambda self: offline())
+    assert resolver.resolve() == driver_path
+
+
+def test_resolve_no_browser(tmp_path, browser):
+    _, versions, _ = browser
+    versions.clear()
+    with pytest.raises(AsvzBotException):
+        ChromedriverResolver(manifest_filename=str(tmp_path / "driver.json")).resolve()
+
+
+def test_install_uses_shared_session(tmp_path, browser, monkeypatch):
+    download_managers = []
+
+    class RecordingChromeDriverManager(asvz_bot.ChromeDriverManager):
+        def __init__(self, chrome_type, download_manager=None):
+            super().__init__(chrome_type, download_manager)
+            download_managers.append(download_manager)
+
+    monkeypatch.setattr(asvz_bot, "ChromeDriverManager", RecordingChromeDriverManager)
+    ChromedriverResolver(manifest_filename=str(tmp_path / "driver.json")).resolve()
+
+    # also without a proxy, the download does not fall back to a session of its own
+    (download_manager,) = download_managers
+    assert isinstance(download_manager._http_client, asvz_bot.CustomHttpClient)
+    assert isinstance(
+        download_manager._http_client.session.get_adapter("https://"),
+        asvz_bot.PooledHTTPAdapter,
+    )
@@ -0,0 +1,208 @@
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import asvz_bot
+from asvz_bot import (
+    FACILITIES,
+    WEEKDAYS,
+    AsvzBotException,
+    AsvzEnroller,
+    SportfahrplanResolver,
+    TrainingDaemon,
+    load_training_schedule,
+    next_training_date,
+    parse_and_validate_start_time,
+    training_key,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+START_TIME = parse_and_validate_start_time("18:15")
+CREDS = {"organisation": "ETH Zürich", "username": "flbuetle", "password": "pw"}
+
+
+@pytest.mark.parametrize(
+    "after,expected",
+    [
+        # Wednesday morning -> Monday next week
+        (datetime(2023, 12, 6, 8, 0), date(2023, 12, 11)),
+        # Monday before the lesson -> same day
+        (datetime(2023, 12, 11, 18, 14), date(2023, 12, 11)),
+        # Monday when the lesson starts -> one week later
+        (datetime(2023, 12, 11, 18, 15), date(2023, 12, 18)),
+        # Sunday across the year boundary
+        (datetime(2023, 12, 31, 23, 0), date(2024, 1, 1)),
+    ],
+)
+def test_next_training_date(after, expected):
+    assert next_training_date("Mo", START_TIME, after) == expected
+
+
+def test_load_training_schedule(tmp_path):
+    filename = tmp_path / "schedule.json"
+    training = {
+        "weekday": "Mo",
+        "start_time": "18:15",
+        "facility": "Sport Center Hönggerberg",
+        "sport_id": 45743,
+    }
+    filename.write_text(json.dumps({"trainings": [training, training]}))
+
+    trainings = load_training_schedule(str(filename))
+
+    assert len(trainings) == 2
+    assert training_key(trainings[0]) == (
+        "Mo",
+        "18:15",
+        "Sport Center Hönggerberg",
+        None,
+        45743,
+        None,
+    )
+
+
+def test_load_invalid_training_schedule(tmp_path):
+    filename = tmp_path / "schedule.json"
+    filename.write_text(json.dumps({"trainings": [{"weekday": "Mo"}]}))
+    with pytest.raises(AsvzBotException):
+        load_training_schedule(str(filename))
+
+
+def training(day, facility="Sport Center Hönggerberg"):
+    return {
+        "weekday": list(WEEKDAYS)[day.weekday()],
+        "start_time": "18:15",
+        "facility": facility,
+        "sport_id": 45743,
+    }
+
+
+def add_lesson(fake, lesson_id, day, enrollment_start):
+    fake.add_lesson(
+        lesson_id,
+        FakeLesson(
+            enrollment_start,
+            datetime.combine(day.date(), START_TIME.time()),
+            10,
+            sport_id=45743,
+            facility_id=FACILITIES["Sport Center Hönggerberg"],
+        ),
+    )
+
+
+def test_daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(asvz_bot, "DAEMON_RESCAN_INTERVAL_SECONDS", 3 * 60 * 60)
+    enrolled = []
+    monkeypatch.setattr(
+        AsvzEnroller, "enroll", lambda self: enrolled.append(self.lesson_url)
+    )
+
+    now = datetime.today().replace(microsecond=0)
+    # training A: no lesson tomorrow, the enrollment to the lesson a week later opens in 5 minutes
+    # training B: the enrollment to the lesson in two days opens in an hour
+    tomorrow = now + timedelta(days=1)
+    in_two_days = now + timedelta(days=2)
+    trainings = [training(tomorrow), training(in_two_days)]
+    schedule_file = tmp_path / "schedule.json"
+    schedule_file.write_text(json.dumps({"trainings": trainings}))
+
+    with FakeAsvz() as fake:
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        monkeypatch.setattr(asvz_bot, "SPORTFAHRPLAN_BASE_URL", fake.sportfahrplan_url)
+        add_lesson(fake, 1, tomorrow + timedelta(weeks=1), now + timedelta(minutes=5))
+        add_lesson(fake, 2, in_two_days, now + timedelta(hours=1))
+        add_lesson(fake, 3, tomorrow + timedelta(weeks=2), now + timedelta(days=8))
+
+        daemon = TrainingDaemon(
+            str(schedule_file),
+            None,
+            CREDS,
+            None,
+            resolver=SportfahrplanResolver(),
+            lookahead_weeks=2,
+        )
+
+        # the holiday of training A is skipped, the daemon wakes up ahead of the enrollment of training B
+        assert daemon.run_once() == now + timedelta(
+            hours=1, seconds=-asvz_bot.DAEMON_PREPARE_SECONDS
+        )
+        key_a, key_b = daemon.trainings
+        assert daemon.handled == {key_a: tomorrow.date()}
+        assert list(daemon.scheduled) == [key_b]
+        assert enrolled == []
+
+        # the lesson of training A a week later is due, its enrollment starts right away
+        daemon.run_once()
+        daemon.running[key_a].join()
+        assert enrolled == [fake.lesson_url(1)]
+        assert list(daemon.scheduled) == [key_b]
+
+        # training B is dropped from the reloaded schedule, training A waits for the next week
+        schedule_file.write_text(json.dumps({"trainings": trainings[:1]}))
+        mtime = os.stat(schedule_file).st_mtime + 1
+        os.utime(schedule_file, (mtime, mtime))
+        assert daemon.run_once() >= now + timedelta(
+            seconds=asvz_bot.DAEMON_RESCAN_INTERVAL_SECONDS
+        )
+        assert list(daemon.trainings) == [key_a]
+        assert list(daemon.scheduled) == [key_a]
+        assert daemon.scheduled[key_a][1].lesson_url == fake.lesson_url(3)
+        assert enrolled == [fake.lesson_url(1)]
+
+
+def test_daemon_unknown_facility(tmp_path, monkeypatch):
+    now = datetime.today().replace(microsecond=0)
+    tomorrow = now + timedelta(days=1)
+    schedule_file = tmp_path / "schedule.json"
+    schedule_file.write_text(
+        json.dumps(
+            {
+                "trainings": [
+                    training(tomorrow),
+                    training(tomorrow, "Sport Center Irchel"),
+                ]
+            }
+        )
+    )
+
+    # the facility was removed from the catalog by a later sync
+    lookups = []
+    sportfahrplan_url = asvz_bot.sportfahrplan_url
+
+    def removed_facility_url(sport_id, facility, level, when):
+        lookups.append(facility)
+        if facility == "Sport Center Irchel":
+            raise ValueError("unknown facility 'Sport Center Irchel'")
+        return sportfahrplan_url(sport_id, facility, level, when)
+
+    monkeypatch.setattr(asvz_bot, "sportfahrplan_url", removed_facility_url)
+
+    with FakeAsvz() as fake:
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        monkeypatch.setattr(asvz_bot, "SPORTFAHRPLAN_BASE_URL", fake.sportfahrplan_url)
+        add_lesson(fake, 1, tomorrow, now + timedelta(hours=1))
+
+        daemon = TrainingDaemon(
+            str(schedule_file),
+            None,
+            CREDS,
+            None,
+            resolver=SportfahrplanResolver(),
+            lookahead_weeks=1,
+        )
+
+        # the other training is still scheduled, the failed one is not looked up again
+        daemon.run_once()
+        daemon.run_once()
+        key, failed_key = daemon.trainings
+        assert list(daemon.scheduled) == [key]
+        assert list(daemon.failed) == [failed_key]
+        assert lookups.count("Sport Center Irchel") == 1
+
+        # until the schedule changes
+        mtime = os.stat(schedule_file).st_mtime + 1
+        os.utime(schedule_file, (mtime, mtime))
+        daemon.run_once()
+        assert lookups.count("Sport Center Irchel") == 2
@@ -0,0 +1,31 @@
+from asvz_bot import AsvzEnroller
+
+
+def test_driver_options():
+    options = AsvzEnroller.get_driver_options()
+
+    assert options.page_load_strategy == "normal"
+    assert "--headless" in options.arguments
+    assert options.experimental_options["prefs"] == {"intl.accept_languages": "de"}
+
+
+def test_lean_driver_options():
+    options = AsvzEnroller.get_driver_options(lean=True)
+
+    assert options.page_load_strategy == "eager"
+    assert (
+        options.experimental_options["prefs"][
+            "profile.managed_default_content_settings.images"
+        ]
+        == 2
+    )
+    rules = next(a for a in options.arguments if a.startswith("--host-resolver-rules="))
+    assert rules.startswith("--host-resolver-rules=MAP * ~NOTFOUND")
+    assert "EXCLUDE *.asvz.ch" in rules
+
+
+def test_lean_driver_options_with_proxy():
+    options = AsvzEnroller.get_driver_options("proxy.ethz.ch:3128", lean=True)
+
+    assert "--proxy-server=proxy.ethz.ch:3128" in options.arguments
+    assert not any(a.startswith("--host-resolver-rules=") for a in options.arguments)
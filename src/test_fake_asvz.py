@@ -0,0 +1,132 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from lxml import html
+
+import asvz_bot
+from asvz_bot import SportfahrplanResolver, parse_saml_idp_cookie
+from fake_asvz import FakeAsvz, FakeLesson, idp_entity_id
+
+
+@pytest.fixture
+def fake():
+    with FakeAsvz() as fake:
+        fake.add_user("flbuetle", "password")
+        yield fake
+
+
+def lesson_at(enrollment_start, places_max=10, **kwargs):
+    return FakeLesson(
+        enrollment_start, enrollment_start + timedelta(hours=1), places_max, **kwargs
+    )
+
+
+def test_lesson_page_logged_out(fake):
+    now = datetime.today().replace(microsecond=0)
+    fake.add_lesson(1, lesson_at(now, participants=4))
+
+    page = html.fromstring(requests.get(fake.lesson_url(1)).content)
+
+    assert page.xpath("//dl[contains(., 'Freie Plätze')]/dd/span/text()") == ["6"]
+    assert page.xpath("//button[@title='Login']")
+    assert not page.xpath("//button[@id='btnRegister']")
+
+
+def test_asvz_login(fake):
+    now = datetime.today().replace(microsecond=0)
+    lesson = fake.add_lesson(1, lesson_at(now - timedelta(minutes=1)))
+    session = requests.Session()
+
+    response = session.post(
+        fake.base_url + "/Account/Login",
+        data={
+            "AsvzId": "flbuetle",
+            "Password": "password",
+            "returnUrl": fake.lesson_url(1),
+        },
+    )
+    page = html.fromstring(response.content)
+    assert response.url == fake.lesson_url(1)
+    assert page.xpath("//button[@id='btnRegister']")
+
+    # the web app enrolls with the access token of the session
+    token = next(iter(fake.sessions.values()))
+    response = session.post(
+        fake.api_base_url + "/Lessons/1/Enrollment",
+        headers={"Authorization": "Bearer " + token},
+    )
+    assert response.status_code == 201
+    assert lesson.enrollments == {token: 1}
+
+
+def test_organisation_login(fake):
+    session = requests.Session()
+    page = html.fromstring(
+        session.get(
+            fake.base_url + "/Account/Login", params={"returnUrl": "/tn/lessons/1"}
+        ).content
+    )
+    onclick = page.xpath("//button[@title='SwitchAai Account Login']/@onclick")[0]
+    wayf_url = onclick.split("'")[1]
+
+    page = html.fromstring(session.get(fake.base_url + wayf_url).content)
+    form = dict(page.forms[0].fields, user_idp="ETH Zürich")
+    response = session.get(fake.base_url + "/wayf/select", params=form)
+
+    assert "/idp/eth-z-rich/login" in response.url
+    assert parse_saml_idp_cookie(session.cookies["_saml_idp"]) == idp_entity_id(
+        "ETH Zürich"
+    )
+    response = session.post(
+        fake.base_url + "/idp/eth-z-rich/login",
+        data={"username": "flbuetle", "password": "password", "target": "/"},
+        allow_redirects=False,
+    )
+    assert response.status_code == 302
+    assert fake.sessions
+
+
+def test_wrong_password(fake):
+    response = requests.post(
+        fake.base_url + "/Account/Login",
+        data={"AsvzId": "flbuetle", "Password": "wrong", "returnUrl": "/"},
+    )
+    assert "Login failed" in response.text
+    assert not fake.sessions
+
+
+def test_sportfahrplan(fake, monkeypatch):
+    monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+    now = datetime.today().replace(microsecond=0)
+    for lesson_id, sport_id, trainer in [
+        (1, 45743, "Karin Hollenstein"),
+        (2, 45743, "Max Muster"),
+        (3, 12345, "Karin Hollenstein"),
+    ]:
+        fake.add_lesson(
+            lesson_id,
+            lesson_at(now + timedelta(days=1), sport_id=sport_id, trainer=trainer),
+        )
+
+    content = requests.get(
+        fake.sportfahrplan_url, params={"f[0]": "sport:45743"}
+    ).content
+
+    assert SportfahrplanResolver.parse_lesson_url(content, None) == fake.lesson_url(1)
+    assert SportfahrplanResolver.parse_lesson_url(
+        content, "Max Muster"
+    ) == fake.lesson_url(2)
+
+
+def test_competitors(fake):
+    enrollment_start = datetime.today() + timedelta(seconds=0.2)
+    lesson = fake.add_lesson(1, lesson_at(enrollment_start, places_max=1))
+
+    fake.add_competitors(lesson, [0.01, 0.05])
+    time.sleep(0.5)
+
+    assert lesson.enrollments == {"competitor-0": 1}
+    assert [status for _, _, status in lesson.requests] == [201, 422]
+    assert lesson.requests[0][0] >= enrollment_start.timestamp()
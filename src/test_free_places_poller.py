@@ -0,0 +1,99 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import asvz_bot
+from asvz_bot import (
+    FREE_PLACES_MAX_POLL_SECONDS,
+    FREE_PLACES_MIN_POLL_SECONDS,
+    FREE_PLACES_POLL_JITTER,
+    AsvzBotException,
+    FreePlacesPoller,
+    SchalterClient,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+ENROLLMENT_START = datetime(2023, 12, 4, 10, 0)
+LESSON_START = datetime(2023, 12, 6, 18, 15)
+
+
+def poller():
+    return FreePlacesPoller(None, "Lessons/1", ENROLLMENT_START, LESSON_START)
+
+
+def assert_interval(interval, expected):
+    assert (
+        expected * (1 - FREE_PLACES_POLL_JITTER)
+        <= interval
+        <= expected * (1 + FREE_PLACES_POLL_JITTER)
+    )
+
+
+def test_polls_fast_after_enrollment_opened():
+    p = poller()
+    p.unchanged_polls = 10
+    assert_interval(
+        p.next_interval(ENROLLMENT_START + timedelta(minutes=1)),
+        FREE_PLACES_MIN_POLL_SECONDS,
+    )
+
+
+def test_polls_fast_before_lesson_starts():
+    p = poller()
+    p.unchanged_polls = 10
+    assert_interval(
+        p.next_interval(LESSON_START - timedelta(minutes=10)),
+        FREE_PLACES_MIN_POLL_SECONDS,
+    )
+
+
+def test_backs_off_while_unchanged():
+    p = poller()
+    now = ENROLLMENT_START + timedelta(hours=5)
+
+    intervals = []
+    for unchanged_polls in range(10):
+        p.unchanged_polls = unchanged_polls
+        intervals.append(p.next_interval(now))
+
+    assert_interval(intervals[0], FREE_PLACES_MIN_POLL_SECONDS)
+    assert_interval(intervals[-1], FREE_PLACES_MAX_POLL_SECONDS)
+
+
+def test_wait_for_free_places(monkeypatch):
+    monkeypatch.setattr(asvz_bot, "FREE_PLACES_MAX_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(asvz_bot, "FREE_PLACES_MIN_POLL_SECONDS", 0.01)
+    now = datetime.today()
+
+    with FakeAsvz() as fake:
+        lesson = fake.add_lesson(
+            1, FakeLesson(now - timedelta(hours=1), now + timedelta(hours=1), 10, 10)
+        )
+        client = SchalterClient(fake.api_base_url)
+
+        # a participant cancels after a while
+        def cancel():
+            lesson.participants -= 1
+
+        timer = threading.Timer(0.2, cancel)
+        timer.start()
+        state = FreePlacesPoller(
+            client, "Lessons/1", now - timedelta(hours=1), now + timedelta(hours=1)
+        ).wait_for_free_places()
+        timer.join()
+
+    assert state.free_places == 1
+
+
+def test_wait_for_free_places_stops_at_lesson_start():
+    now = datetime.today()
+    with FakeAsvz() as fake:
+        fake.add_lesson(
+            1, FakeLesson(now - timedelta(hours=2), now - timedelta(hours=1), 10, 10)
+        )
+        client = SchalterClient(fake.api_base_url)
+        with pytest.raises(AsvzBotException):
+            FreePlacesPoller(
+                client, "Lessons/1", now - timedelta(hours=2), now - timedelta(hours=1)
+            ).wait_for_free_places()
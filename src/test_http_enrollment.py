@@ -0,0 +1,203 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+import asvz_bot
+from asvz_bot import (
+    BACKEND_HTTP,
+    CREDENTIALS_ORG,
+    CREDENTIALS_PW,
+    CREDENTIALS_UNAME,
+    ENROLLMENT_STATUS_ENROLLED,
+    ENROLLMENT_STATUS_REJECTED,
+    AccountSession,
+    AsvzBotException,
+    AsvzEnroller,
+    EnrollmentResult,
+    FreePlacesPoller,
+    SchalterClient,
+    SessionCache,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+ACCESS_TOKEN = "secret-token"
+CREDS = {
+    CREDENTIALS_ORG: "ETH Zürich",
+    CREDENTIALS_UNAME: "flbuetle",
+    CREDENTIALS_PW: "password",
+}
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        yield fake
+
+
+def enroller(fake, tmp_path, **kwargs):
+    session_cache = SessionCache(str(tmp_path / "session.json"))
+    session_cache.store(
+        CREDS[CREDENTIALS_ORG],
+        CREDS[CREDENTIALS_UNAME],
+        fake.base_url,
+        [],
+        {},
+        ACCESS_TOKEN,
+    )
+    return AsvzEnroller(
+        None,
+        fake.lesson_url(1),
+        CREDS,
+        backend=BACKEND_HTTP,
+        session_cache=session_cache,
+        **kwargs,
+    )
+
+
+def test_enroll_retries_network_error(fake, tmp_path, monkeypatch):
+    now = datetime.today().replace(microsecond=0)
+    lesson = fake.add_lesson(
+        1, FakeLesson(now - timedelta(seconds=1), now + timedelta(hours=1), 10)
+    )
+    enroll = SchalterClient.enroll
+    failures = [requests.ConnectionError("connection reset")]
+
+    def flaky_enroll(client, api_path):
+        if failures:
+            raise failures.pop()
+        return enroll(client, api_path)
+
+    monkeypatch.setattr(SchalterClient, "enroll", flaky_enroll)
+
+    result = enroller(fake, tmp_path).enroll()
+
+    assert result.status == ENROLLMENT_STATUS_ENROLLED
+    assert lesson.enrollments == {ACCESS_TOKEN: 1}
+
+
+def test_enroll_after_rejection_polls_right_away(fake, tmp_path, monkeypatch):
+    monkeypatch.setattr(asvz_bot, "FREE_PLACES_MIN_POLL_SECONDS", 0.01)
+    now = datetime.today().replace(microsecond=0)
+    lesson = fake.add_lesson(
+        1, FakeLesson(now - timedelta(minutes=1), now + timedelta(hours=1), 10)
+    )
+    enroll = SchalterClient.enroll
+    rejections = [EnrollmentResult(ENROLLMENT_STATUS_REJECTED, message="Taken")]
+
+    def enroll_once_rejected(client, api_path):
+        if rejections:
+            return rejections.pop()
+        return enroll(client, api_path)
+
+    monkeypatch.setattr(SchalterClient, "enroll", enroll_once_rejected)
+
+    started = time.monotonic()
+    result = enroller(fake, tmp_path).enroll()
+
+    assert result.status == ENROLLMENT_STATUS_ENROLLED
+    assert time.monotonic() - started < 5
+    assert lesson.enrollments == {ACCESS_TOKEN: 1}
+
+
+def test_hedge_only_first_attempt(fake, tmp_path, monkeypatch):
+    monkeypatch.setattr(asvz_bot, "ENROLLMENT_RETRY_INTERVAL_SECONDS", 0.01)
+    now = datetime.today().replace(microsecond=0)
+    lesson = fake.add_lesson(
+        1, FakeLesson(now - timedelta(seconds=1), now + timedelta(hours=1), 10, 10)
+    )
+    enroll = SchalterClient.enroll
+    responses = []
+
+    def enroll_counting(client, api_path):
+        result = enroll(client, api_path)
+        # a place is freed once the hedged requests were rejected
+        responses.append(result)
+        if len(responses) == 3:
+            lesson.participants -= 1
+        return result
+
+    monkeypatch.setattr(SchalterClient, "enroll", enroll_counting)
+
+    result = enroller(fake, tmp_path, hedge_attempts=3).enroll()
+
+    assert result.status == ENROLLMENT_STATUS_ENROLLED
+    # three hedged requests at first, single requests afterwards
+    assert [status for _, _, status in lesson.requests] == [422, 422, 422, 201]
+
+
+def test_login_checks_cached_session(fake, tmp_path, monkeypatch):
+    class BrowserLogin(Exception):
+        pass
+
+    def get_driver(*args, **kwargs):
+        raise BrowserLogin()
+
+    monkeypatch.setattr(AsvzEnroller, "get_driver", staticmethod(get_driver))
+    asvz_enroller = enroller(fake, tmp_path)
+
+    assert asvz_enroller.login() == ACCESS_TOKEN
+    assert fake.hits["/tn-api/api/MemberPerson"] == 1
+
+    # a revoked token is noticed before the enrollment, the browser logs in again
+    fake.access_tokens.clear()
+    with pytest.raises(BrowserLogin):
+        asvz_enroller.login()
+    assert (
+        asvz_enroller.session_cache.load(
+            CREDS[CREDENTIALS_ORG], CREDS[CREDENTIALS_UNAME]
+        )
+        is None
+    )
+
+
+def test_enroll_forbidden_logs_in_once(fake, tmp_path):
+    now = datetime.today().replace(microsecond=0)
+    lesson = fake.add_lesson(
+        1, FakeLesson(now - timedelta(seconds=1), now + timedelta(hours=1), 10)
+    )
+    logins = []
+
+    class ForbiddenAccountSession(AccountSession):
+        # every login succeeds, but the account may not enroll
+        def get_access_token(self, login, stale_access_token=None):
+            logins.append(stale_access_token)
+            self.access_token = "token-{}".format(len(logins))
+            fake.access_tokens.add(self.access_token)
+            fake.forbidden_tokens.add(self.access_token)
+            self.client.set_access_token(self.access_token)
+            return self.access_token
+
+    account_session = ForbiddenAccountSession(fake.base_url + "/tn-api/api")
+    with pytest.raises(AsvzBotException):
+        enroller(fake, tmp_path, account_session=account_session).enroll()
+
+    # one login again after the first rejection, the fresh token is rejected as well
+    assert logins == [None, "token-1"]
+    assert [status for _, _, status in lesson.requests] == [403, 403]
+
+
+def test_enroll_opening_in_server_time(fake, tmp_path, monkeypatch):
+    # the local clock is a minute behind the server, the enrollment opened 30 seconds ago
+    fake.clock_offset = 60.0
+    server_now = fake.now().replace(microsecond=0)
+    lesson = fake.add_lesson(
+        1,
+        FakeLesson(
+            server_now - timedelta(seconds=30), server_now + timedelta(hours=1), 10, 10
+        ),
+    )
+
+    def wait_for_free_places(poller, after_rejection=False):
+        lesson.participants -= 1
+
+    monkeypatch.setattr(FreePlacesPoller, "wait_for_free_places", wait_for_free_places)
+
+    result = enroller(fake, tmp_path).enroll()
+
+    # the booked out lesson is polled right away instead of being retried until the local clock catches up
+    assert result.status == ENROLLMENT_STATUS_ENROLLED
+    assert [status for _, _, status in lesson.requests] == [201]
@@ -0,0 +1,67 @@
+import base64
+from urllib.parse import parse_qs, quote, urlparse
+
+from asvz_bot import IdpShortcutCache, discovery_response_url, parse_saml_idp_cookie
+
+ENTITY_ID = "https://login.eduid.ch/idp/shibboleth"
+
+
+def encode(entity_id):
+    return base64.b64encode(entity_id.encode()).decode()
+
+
+def test_cache(tmp_path):
+    cache = IdpShortcutCache(str(tmp_path / "idp.json"))
+    assert cache.get("ETH Zürich") is None
+
+    cache.store("ETH Zürich", ENTITY_ID)
+    assert IdpShortcutCache(cache.filename).get("ETH Zürich") == ENTITY_ID
+
+    cache.invalidate("ETH Zürich")
+    assert cache.get("ETH Zürich") is None
+
+
+def test_corrupt_cache(tmp_path):
+    filename = tmp_path / "idp.json"
+    filename.write_text("{")
+    assert IdpShortcutCache(str(filename)).get("ETH Zürich") is None
+
+
+def test_discovery_response_url():
+    url = discovery_response_url(
+        "https://wayf.switch.ch/SWITCHaai/WAYF?entityID=https%3A%2F%2Fschalter.asvz.ch"
+        "&return=https%3A%2F%2Fschalter.asvz.ch%2FShibboleth.sso%2FLogin%3FSAMLDS%3D1%26target%3Dss%253Amem",
+        ENTITY_ID,
+    )
+    parsed = urlparse(url)
+    assert parsed.netloc == "schalter.asvz.ch"
+    assert parsed.path == "/Shibboleth.sso/Login"
+    assert parse_qs(parsed.query) == {
+        "SAMLDS": ["1"],
+        "target": ["ss:mem"],
+        "entityID": [ENTITY_ID],
+    }
+
+
+def test_discovery_response_url_id_param():
+    url = discovery_response_url(
+        "/wayf?return=%2FShibboleth.sso%2FLogin&returnIDParam=idp", ENTITY_ID
+    )
+    assert url == "/Shibboleth.sso/Login?idp=" + quote(ENTITY_ID, safe="")
+
+
+def test_discovery_response_url_no_discovery():
+    assert discovery_response_url("https://login.eduid.ch/", ENTITY_ID) is None
+
+
+def test_parse_saml_idp_cookie():
+    other = "https://idp.example.org/idp/shibboleth"
+    assert parse_saml_idp_cookie(quote(encode(ENTITY_ID))) == ENTITY_ID
+    # the most recently selected entity comes last
+    assert (
+        parse_saml_idp_cookie(quote(encode(other) + " " + encode(ENTITY_ID)))
+        == ENTITY_ID
+    )
+    assert parse_saml_idp_cookie("") is None
+    assert parse_saml_idp_cookie("not base64!") is None
+    assert parse_saml_idp_cookie(encode("no entity")) is None
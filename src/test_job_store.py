@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import asvz_bot
+from asvz_bot import (
+    BACKEND_HTTP,
+    CREDENTIALS_ORG,
+    CREDENTIALS_PW,
+    CREDENTIALS_UNAME,
+    ENROLLMENT_STATUS_ENROLLED,
+    ENROLLMENT_STATUS_REJECTED,
+    JOB_STATUS_WAITING,
+    AsvzEnroller,
+    EnrollmentResult,
+    JobStore,
+    PhaseTimer,
+    SessionCache,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+ACCESS_TOKEN = "secret-token"
+CREDS = {
+    CREDENTIALS_ORG: "ETH Zürich",
+    CREDENTIALS_UNAME: "flbuetle",
+    CREDENTIALS_PW: "password",
+}
+ACCOUNT = (CREDS[CREDENTIALS_ORG], CREDS[CREDENTIALS_UNAME])
+
+
+def test_jobs(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    now = datetime.today().replace(microsecond=0)
+    for lesson_id, opens_in in ((1, 30), (2, 10), (3, 90), (4, 20)):
+        url = "https://schalter.asvz.ch/tn/lessons/{}".format(lesson_id)
+        store.start_job(url, *ACCOUNT)
+        store.set_lesson_times(
+            url,
+            *ACCOUNT,
+            now + timedelta(minutes=opens_in),
+            now + timedelta(days=1),
+        )
+    store.add_attempt(
+        "https://schalter.asvz.ch/tn/lessons/4",
+        *ACCOUNT,
+        EnrollmentResult(ENROLLMENT_STATUS_REJECTED, message="Lesson is booked out"),
+    )
+    store.finish(
+        "https://schalter.asvz.ch/tn/lessons/4", *ACCOUNT, ENROLLMENT_STATUS_ENROLLED, 7
+    )
+    store.close()
+
+    # a restarted process reads the same state
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.get_job("https://schalter.asvz.ch/tn/lessons/4", *ACCOUNT)
+    assert job["status"] == ENROLLMENT_STATUS_ENROLLED
+    assert job["enrollment_number"] == 7
+    assert job["enrollment_start"] == now + timedelta(minutes=20)
+    assert [a["status"] for a in store.attempts(job["lesson_url"], *ACCOUNT)] == [
+        ENROLLMENT_STATUS_REJECTED
+    ]
+
+    upcoming = store.opening_between(now, now + timedelta(hours=1))
+    assert [job["lesson_url"][-1] for job in upcoming] == ["2", "1"]
+    assert upcoming[0]["status"] == JOB_STATUS_WAITING
+
+
+def test_phases(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    timer = PhaseTimer()
+    with timer.phase("login"):
+        pass
+    store.record_phases("https://schalter.asvz.ch/tn/lessons/1", *ACCOUNT, timer)
+
+    rows = store.connection.execute("SELECT phase, runs FROM phases").fetchall()
+    assert [tuple(row) for row in rows] == [("login", 1)]
+
+
+def test_lookups(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), ttl=60)
+    assert store.get("45743|Sport Center Hönggerberg") is None
+    store.store(
+        "45743|Sport Center Hönggerberg", "https://schalter.asvz.ch/tn/lessons/1"
+    )
+    assert (
+        store.get("45743|Sport Center Hönggerberg")
+        == "https://schalter.asvz.ch/tn/lessons/1"
+    )
+
+    store.ttl = 0
+    assert store.get("45743|Sport Center Hönggerberg") is None
+
+
+def test_resume_skips_enrolled_lesson(tmp_path, monkeypatch):
+    now = datetime.today().replace(microsecond=0)
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        lesson = fake.add_lesson(
+            1, FakeLesson(now - timedelta(hours=1), now + timedelta(hours=1), 10)
+        )
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        session_cache = SessionCache(str(tmp_path / "session.json"))
+        session_cache.store(*ACCOUNT, fake.base_url, [], {}, ACCESS_TOKEN)
+
+        def enroll():
+            store = JobStore(str(tmp_path / "jobs.db"))
+            try:
+                return AsvzEnroller(
+                    None,
+                    fake.lesson_url(1),
+                    CREDS,
+                    backend=BACKEND_HTTP,
+                    session_cache=session_cache,
+                    job_store=store,
+                ).enroll()
+            finally:
+                store.close()
+
+        assert enroll().enrollment_number == 1
+        requests = len(lesson.requests)
+
+        result = enroll()
+        assert result.status == ENROLLMENT_STATUS_ENROLLED
+        assert result.enrollment_number == 1
+        assert len(lesson.requests) == requests
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from asvz_bot import AsvzBotException, LessonSnapshot, parse_page_interval
+from fake_asvz import FakeAsvz, FakeLesson
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def snapshot(name):
+    return LessonSnapshot.from_html((FIXTURES / name).read_bytes())
+
+
+def test_open_lesson():
+    lesson = snapshot("lesson_open.html")
+
+    assert not lesson.not_found
+    assert lesson.complete
+    assert lesson.enrollment_start == datetime(2023, 12, 10, 18, 15)
+    assert lesson.enrollment_end == datetime(2023, 12, 11, 18, 0)
+    assert lesson.lesson_start == datetime(2023, 12, 11, 18, 15)
+    assert lesson.lesson_end == datetime(2023, 12, 11, 19, 30)
+    assert lesson.free_places == 3
+    assert lesson.logged_in
+    assert lesson.enrollment_open
+    assert lesson.alert is None
+    assert not lesson.enrolled
+
+
+def test_booked_out_lesson():
+    lesson = snapshot("lesson_booked_out.html")
+
+    assert lesson.free_places == 0
+    assert not lesson.enrollment_open
+
+
+def test_enrolled_lesson():
+    lesson = snapshot("lesson_enrolled.html")
+
+    assert lesson.alert == "Du hast dich erfolgreich eingeschrieben."
+    assert lesson.enrolled
+    assert lesson.enrollment_number == 17
+
+
+def test_event_logged_out():
+    event = snapshot("event_logged_out.html")
+
+    assert event.enrollment_start == datetime(2023, 12, 4, 10, 0)
+    assert event.lesson_start == datetime(2024, 1, 13, 7, 0)
+    assert event.lesson_end == datetime(2024, 1, 14, 17, 0)
+    assert event.free_places == 12
+    assert not event.logged_in
+    assert not event.enrollment_open
+
+
+def test_lesson_not_found():
+    lesson = snapshot("lesson_not_found.html")
+
+    assert lesson.not_found
+    assert lesson.complete
+    assert lesson.enrollment_start is None
+
+
+def test_lesson_not_rendered():
+    lesson = LessonSnapshot.from_html("<html><body><app-root></app-root></body></html>")
+
+    assert not lesson.complete
+
+
+@pytest.mark.parametrize("raw", ["", "Mo, 11.12.2023", "Mo, 31.02.2023 18:15 - 19:30"])
+def test_parse_invalid_interval(raw):
+    with pytest.raises(AsvzBotException):
+        parse_page_interval(raw)
+
+
+def test_fake_lesson_page():
+    # the stand-in renders the same elements as the schalter web app
+    lesson_start = datetime.today().replace(second=0, microsecond=0) + timedelta(days=1)
+    fake = FakeAsvz()
+    try:
+        content = fake.render_lesson_page(
+            "Lessons",
+            1,
+            FakeLesson(lesson_start - timedelta(days=1), lesson_start, 10, 4),
+            "token",
+            fake.lesson_url(1),
+        )
+    finally:
+        fake.server.server_close()
+
+    lesson = LessonSnapshot.from_html(content)
+    assert lesson.lesson_start == lesson_start
+    assert lesson.enrollment_start == lesson_start - timedelta(days=1)
+    assert lesson.free_places == 6
+    assert lesson.logged_in
@@ -0,0 +1,133 @@
+import json
+from datetime import datetime, timedelta
+
+import asvz_bot
+from asvz_bot import (
+    BACKEND_HTTP,
+    CREDENTIALS_ORG,
+    CREDENTIALS_PW,
+    CREDENTIALS_UNAME,
+    AsvzEnroller,
+    MetricsExporter,
+    PhaseTimer,
+    SessionCache,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+ACCESS_TOKEN = "secret-token"
+CREDS = {
+    CREDENTIALS_ORG: "ETH Zürich",
+    CREDENTIALS_UNAME: "flbuetle",
+    CREDENTIALS_PW: "password",
+}
+
+
+def test_phase_timer():
+    timer = PhaseTimer({"lesson": "1"})
+    for _ in range(2):
+        with timer.phase("free_places"):
+            pass
+    timer.record("submit_offset_seconds", 0.003)
+
+    total, runs = timer.durations()["free_places"]
+    assert runs == 2
+    assert total >= 0
+    assert timer.values == {"submit_offset_seconds": 0.003}
+
+
+def test_export(tmp_path):
+    jsonl_file = str(tmp_path / "metrics.jsonl")
+    prometheus_file = str(tmp_path / "metrics.prom")
+    exporter = MetricsExporter(jsonl_file, prometheus_file)
+
+    for lesson in ("1", '2"'):
+        timer = PhaseTimer({"lesson": lesson})
+        with timer.phase("login"):
+            pass
+        timer.record("submit_offset_seconds", 0.5)
+        exporter.export(timer)
+
+    records = [json.loads(line) for line in open(jsonl_file)]
+    assert [(r["type"], r["lesson"]) for r in records] == [
+        ("phase", "1"),
+        ("value", "1"),
+        ("phase", '2"'),
+        ("value", '2"'),
+    ]
+
+    prometheus = open(prometheus_file).read()
+    assert 'asvz_bot_phase_runs{lesson="1",phase="login"} 1' in prometheus
+    assert 'asvz_bot_submit_offset_seconds{lesson="2\\""} 0.5' in prometheus
+    assert "# TYPE asvz_bot_phase_duration_seconds gauge" in prometheus
+
+
+def test_enrollment_metrics(tmp_path, monkeypatch):
+    now = datetime.today().replace(microsecond=0)
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        fake.add_lesson(
+            1, FakeLesson(now - timedelta(hours=1), now + timedelta(hours=1), 10)
+        )
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+
+        session_cache = SessionCache(str(tmp_path / "session.json"))
+        session_cache.store(
+            CREDS[CREDENTIALS_ORG],
+            CREDS[CREDENTIALS_UNAME],
+            fake.base_url,
+            [],
+            {},
+            ACCESS_TOKEN,
+        )
+        jsonl_file = str(tmp_path / "metrics.jsonl")
+
+        AsvzEnroller(
+            None,
+            fake.lesson_url(1),
+            CREDS,
+            backend=BACKEND_HTTP,
+            session_cache=session_cache,
+            metrics=MetricsExporter(jsonl_file),
+        ).enroll()
+
+    records = [json.loads(line) for line in open(jsonl_file)]
+    phases = {r["phase"] for r in records if r["type"] == "phase"}
+    assert {"lesson_state", "clock_sync", "enroll_request"} <= phases
+    values = {r["name"] for r in records if r["type"] == "value"}
+    assert "submit_offset_seconds" in values
+
+
+def test_prewarm_metrics(tmp_path, monkeypatch):
+    # the enrollment opens after the clock sync, shortly before which the connection is pre-warmed
+    enrollment_start = datetime.today().replace(microsecond=0) + timedelta(seconds=6)
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        fake.add_lesson(
+            1, FakeLesson(enrollment_start, enrollment_start + timedelta(hours=1), 10)
+        )
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+
+        session_cache = SessionCache(str(tmp_path / "session.json"))
+        session_cache.store(
+            CREDS[CREDENTIALS_ORG],
+            CREDS[CREDENTIALS_UNAME],
+            fake.base_url,
+            [],
+            {},
+            ACCESS_TOKEN,
+        )
+        jsonl_file = str(tmp_path / "metrics.jsonl")
+
+        AsvzEnroller(
+            None,
+            fake.lesson_url(1),
+            CREDS,
+            backend=BACKEND_HTTP,
+            session_cache=session_cache,
+            metrics=MetricsExporter(jsonl_file),
+        ).enroll()
+
+    records = [json.loads(line) for line in open(jsonl_file)]
+    assert "prewarm" in {r["phase"] for r in records if r["type"] == "phase"}
+    values = {r["name"] for r in records if r["type"] == "value"}
+    assert "prewarm_api_handshake_seconds" in values
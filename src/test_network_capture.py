@@ -0,0 +1,109 @@
+import json
+from datetime import datetime
+
+from asvz_bot import (
+    ENROLLMENT_STATUS_ALREADY_ENROLLED,
+    ENROLLMENT_STATUS_ENROLLED,
+    ENROLLMENT_STATUS_REJECTED,
+    AsvzEnroller,
+    EnrollmentResult,
+    NetworkCapture,
+)
+
+LESSON = {
+    "enrollmentFrom": "2023-12-10T18:15:00+01:00",
+    "enrollmentUntil": "2023-12-11T18:00:00+01:00",
+    "starts": "2023-12-11T18:15:00+01:00",
+    "ends": "2023-12-11T19:30:00+01:00",
+    "participantsMax": 20,
+    "participantCount": 18,
+}
+
+
+class PerformanceLog:
+    """
+    Replays DevTools network events like the performance log of chromedriver.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.bodies = {}
+
+    def respond(self, request_id, url, status, payload):
+        for method, params in [
+            (
+                "Network.responseReceived",
+                {"requestId": request_id, "response": {"url": url, "status": status}},
+            ),
+            ("Network.loadingFinished", {"requestId": request_id}),
+        ]:
+            self.entries.append(
+                {
+                    "message": json.dumps(
+                        {"message": {"method": method, "params": params}}
+                    )
+                }
+            )
+        self.bodies[request_id] = json.dumps(payload)
+
+    def get_log(self, log_type):
+        assert log_type == "performance"
+        entries, self.entries = self.entries, []
+        return entries
+
+    def execute_cdp_cmd(self, cmd, params):
+        assert cmd == "Network.getResponseBody"
+        return {"body": self.bodies[params["requestId"]], "base64Encoded": False}
+
+
+def test_capture_lesson_state():
+    log = PerformanceLog()
+    capture = NetworkCapture(log, "Lessons/200949")
+
+    log.respond("1", "https://schalter.asvz.ch/tn-api/api/Lessons/1", 200, {})
+    log.respond(
+        "2",
+        "https://schalter.asvz.ch/tn-api/api/Lessons/200949",
+        200,
+        {"data": LESSON},
+    )
+
+    assert capture.poll()
+    assert capture.lesson_state.free_places == 2
+    assert capture.lesson_state.lesson_start == datetime.fromisoformat(
+        LESSON["starts"]
+    ).astimezone().replace(tzinfo=None)
+    assert capture.enrollment_result is None
+    assert not capture.poll()
+
+
+def test_capture_enrollment_result():
+    log = PerformanceLog()
+    capture = NetworkCapture(log, "Lessons/200949")
+
+    log.respond(
+        "1",
+        "https://schalter.asvz.ch/tn-api/api/Lessons/200949/Enrollment",
+        201,
+        {"data": {"placeNumber": 19}},
+    )
+
+    result = capture.wait_for("enrollment_result", 1)
+    assert result.status == ENROLLMENT_STATUS_ENROLLED
+    assert result.enrollment_number == 19
+
+
+def test_enrollment_result_from_api():
+    assert (
+        EnrollmentResult.from_api(409, {}).status == ENROLLMENT_STATUS_ALREADY_ENROLLED
+    )
+    rejected = EnrollmentResult.from_api(
+        422, {"errors": [{"message": "Lesson is booked out"}]}
+    )
+    assert rejected.status == ENROLLMENT_STATUS_REJECTED
+    assert rejected.message == "Lesson is booked out"
+
+
+def test_capture_network_options():
+    options = AsvzEnroller.get_driver_options(capture_network=True)
+    assert options.to_capabilities()["goog:loggingPrefs"] == {"performance": "ALL"}
@@ -0,0 +1,207 @@
+import base64
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from asvz_bot import (
+    ENROLLMENT_STATUS_ALREADY_ENROLLED,
+    ENROLLMENT_STATUS_ENROLLED,
+    ENROLLMENT_STATUS_REJECTED,
+    AsvzBotException,
+    HedgedEnrollment,
+    SchalterClient,
+    get_access_token_expiry,
+    http_session,
+    parse_lesson_url,
+    prewarm_connection,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+ACCESS_TOKEN = "secret-token"
+
+
+@pytest.fixture
+def fake():
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        yield fake
+
+
+def open_lesson(places_max=10, participants=0):
+    now = datetime.today().replace(microsecond=0)
+    return FakeLesson(
+        enrollment_start=now - timedelta(hours=1),
+        lesson_start=now + timedelta(hours=2),
+        places_max=places_max,
+        participants=participants,
+    )
+
+
+def test_parse_lesson_url():
+    assert parse_lesson_url("https://schalter.asvz.ch/tn/lessons/200949") == (
+        "https://schalter.asvz.ch/tn-api/api",
+        "Lessons/200949",
+    )
+    assert parse_lesson_url("https://schalter.asvz.ch/tn/events/536447") == (
+        "https://schalter.asvz.ch/tn-api/api",
+        "Events/536447",
+    )
+    with pytest.raises(AsvzBotException):
+        parse_lesson_url("https://asvz.ch/426-sportfahrplan")
+
+
+def test_get_lesson(fake):
+    lesson = fake.add_lesson(1, open_lesson(places_max=10, participants=7))
+    client = SchalterClient(fake.api_base_url)
+
+    state = client.get_lesson("Lessons/1")
+
+    assert state.enrollment_start == lesson.enrollment_start
+    assert state.lesson_start == lesson.lesson_start
+    assert state.free_places == 3
+
+
+def test_get_unknown_lesson(fake):
+    client = SchalterClient(fake.api_base_url)
+    with pytest.raises(AsvzBotException):
+        client.get_lesson("Lessons/404")
+
+
+def test_enroll(fake):
+    fake.add_lesson(1, open_lesson(places_max=10, participants=4))
+    client = SchalterClient(fake.api_base_url, access_token=ACCESS_TOKEN)
+
+    result = client.enroll("Lessons/1")
+    assert result.status == ENROLLMENT_STATUS_ENROLLED
+    assert result.enrollment_number == 5
+
+    result = client.enroll("Lessons/1")
+    assert result.status == ENROLLMENT_STATUS_ALREADY_ENROLLED
+
+
+def test_enroll_booked_out(fake):
+    fake.add_lesson(1, open_lesson(places_max=10, participants=10))
+    client = SchalterClient(fake.api_base_url, access_token=ACCESS_TOKEN)
+
+    result = client.enroll("Lessons/1")
+    assert result.status == ENROLLMENT_STATUS_REJECTED
+    assert result.message == "Lesson is booked out"
+
+
+def test_enroll_unauthorized(fake):
+    fake.add_lesson(1, open_lesson())
+    client = SchalterClient(fake.api_base_url, access_token="invalid")
+    with pytest.raises(AsvzBotException):
+        client.enroll("Lessons/1")
+
+
+def test_shared_connection_pool(fake):
+    fake.add_lesson(1, open_lesson())
+    first = SchalterClient(fake.api_base_url)
+    second = SchalterClient(fake.api_base_url, access_token=ACCESS_TOKEN)
+    adapter = first.session.get_adapter(fake.api_base_url)
+    assert second.session.get_adapter(fake.api_base_url) is adapter
+    assert "Authorization" not in first.session.headers
+
+    # closing a client keeps the connections of the others
+    first.get_lesson("Lessons/1")
+    first.close()
+    assert adapter.poolmanager.pools
+    assert second.get_lesson("Lessons/1").free_places == 10
+
+    dedicated = SchalterClient(fake.api_base_url, dedicated=True)
+    assert dedicated.session.get_adapter(fake.api_base_url) is not adapter
+    assert http_session().get_adapter(fake.api_base_url) is not adapter
+
+
+def test_prewarm_connection(fake):
+    fake.add_lesson(1, open_lesson())
+    client = SchalterClient(fake.api_base_url)
+    assert prewarm_connection(lambda: client.get_lesson("Lessons/1")) >= 0
+
+    # the first request opens the connection, the second one reuses it
+    durations = iter([0.05, 0.0])
+    assert prewarm_connection(lambda: time.sleep(next(durations))) >= 0.04
+
+    assert prewarm_connection(lambda: client.get_lesson("Lessons/2")) is None
+
+
+def hedge(fake, attempts, stagger=0.0, access_token=ACCESS_TOKEN):
+    return HedgedEnrollment(
+        [
+            SchalterClient(fake.api_base_url, access_token=access_token)
+            for _ in range(attempts)
+        ],
+        stagger,
+    )
+
+
+def test_hedged_enroll(fake):
+    lesson = fake.add_lesson(1, open_lesson())
+    hedged = hedge(fake, 3)
+    latencies = hedged.warm_up("Lessons/1")
+    assert len(latencies) == 3
+    assert all(latency >= 0 for latency in latencies)
+
+    result = hedged.enroll("Lessons/1")
+    hedged.close()
+
+    assert result.status == ENROLLMENT_STATUS_ENROLLED
+    assert result.enrollment_number == 1
+    assert lesson.enrollments == {ACCESS_TOKEN: 1}
+
+
+def test_hedged_enroll_stagger_cancels(fake):
+    lesson = fake.add_lesson(1, open_lesson())
+    hedged = hedge(fake, 3, stagger=0.2)
+
+    assert hedged.enroll("Lessons/1").status == ENROLLMENT_STATUS_ENROLLED
+    time.sleep(0.5)
+    hedged.close()
+
+    # the staggered attempts were not sent after the first one enrolled
+    assert [status for _, _, status in lesson.requests] == [201]
+
+
+def test_hedged_enroll_duplicate(fake):
+    lesson = fake.add_lesson(1, open_lesson())
+    lesson.enrollments[ACCESS_TOKEN] = 1
+
+    result = hedge(fake, 2).enroll("Lessons/1")
+    assert result.status == ENROLLMENT_STATUS_ALREADY_ENROLLED
+
+
+def test_hedged_enroll_unauthorized(fake):
+    fake.add_lesson(1, open_lesson())
+    with pytest.raises(AsvzBotException):
+        hedge(fake, 2, access_token="invalid").enroll("Lessons/1")
+
+
+def test_hedged_enroll_unauthorized_before_rejected(fake):
+    now = datetime.today().replace(microsecond=0)
+    fake.add_lesson(
+        1, FakeLesson(now + timedelta(minutes=1), now + timedelta(hours=2), 10)
+    )
+    hedged = HedgedEnrollment(
+        [
+            SchalterClient(fake.api_base_url, access_token=ACCESS_TOKEN),
+            SchalterClient(fake.api_base_url, access_token="invalid"),
+        ]
+    )
+
+    # the not yet open enrollment must not hide the missing authorization
+    with pytest.raises(AsvzBotException):
+        hedged.enroll("Lessons/1")
+
+
+def test_access_token_expiry():
+    expiry = datetime.today().replace(microsecond=0) + timedelta(hours=1)
+    payload = base64.urlsafe_b64encode(
+        json.dumps({"exp": int(expiry.timestamp())}).encode()
+    ).rstrip(b"=")
+    access_token = "header.{}.signature".format(payload.decode())
+
+    assert get_access_token_expiry(access_token) == expiry
+    assert get_access_token_expiry(ACCESS_TOKEN) is None
@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+import requests
+
+import asvz_bot
+from asvz_bot import ServerClock, sleep_until_monotonic
+from fake_asvz import FakeAsvz
+
+
+@pytest.fixture
+def fake():
+    with FakeAsvz() as fake:
+        yield fake
+
+
+@pytest.mark.parametrize("clock_offset", [0.0, 3.25, -42.7])
+def test_estimate_offset(fake, clock_offset):
+    fake.clock_offset = clock_offset
+    with requests.Session() as session:
+        clock = ServerClock.estimate(session, fake.base_url)
+
+    assert clock.offset == pytest.approx(clock_offset, abs=0.05)
+
+
+def test_estimate_offset_without_server():
+    with requests.Session() as session:
+        clock = ServerClock.estimate(session, "http://127.0.0.1:1")
+
+    assert clock.offset == 0.0
+
+
+def test_shared_estimate(fake, monkeypatch):
+    monkeypatch.setattr(asvz_bot, "_server_clocks", {})
+    fake.clock_offset = 3.25
+    estimates = []
+    estimate = ServerClock.estimate.__func__
+
+    def counting_estimate(cls, session, url):
+        estimates.append(url)
+        return estimate(cls, session, url)
+
+    monkeypatch.setattr(ServerClock, "estimate", classmethod(counting_estimate))
+
+    # concurrent jobs of the same server share a single estimate
+    with requests.Session() as session, ThreadPoolExecutor(4) as executor:
+        clocks = list(
+            executor.map(
+                lambda i: ServerClock.shared(session, f"{fake.base_url}/lessons/{i}"),
+                range(4),
+            )
+        )
+    assert len(estimates) == 1
+    assert all(clock is clocks[0] for clock in clocks)
+    assert clocks[0].offset == pytest.approx(3.25, abs=0.05)
+
+    # an outdated offset is estimated again
+    with requests.Session() as session:
+        ServerClock.shared(session, fake.base_url, max_age=0)
+    assert len(estimates) == 2
+
+
+def test_shared_estimate_without_server(monkeypatch):
+    monkeypatch.setattr(asvz_bot, "_server_clocks", {})
+    with requests.Session() as session:
+        ServerClock.shared(session, "http://127.0.0.1:1")
+
+    # a failed estimate is not cached
+    assert asvz_bot._server_clocks == {}
+
+
+def test_sleep_until_uses_server_time():
+    clock = ServerClock(offset=60.0)
+    target = clock.now() + timedelta(milliseconds=200)
+
+    start = time.monotonic()
+    lateness = clock.sleep_until(target, lead_time=0.05)
+
+    assert time.monotonic() - start == pytest.approx(0.15, abs=0.01)
+    assert 0 <= lateness < 0.005
+
+
+def test_sleep_until_monotonic_past_deadline():
+    start = time.monotonic()
+    sleep_until_monotonic(start - 10)
+    assert time.monotonic() - start < 0.001
@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from asvz_bot import SchalterClient, SessionCache
+
+ORG = "ETH Zürich"
+UNAME = "flbuetle"
+ORIGIN = "https://schalter.asvz.ch"
+STORAGE = {"sessionStorage": {"oidc.user:x": "{}"}, "localStorage": {}}
+
+
+def cookie(name, expires, domain="schalter.asvz.ch"):
+    return {
+        "name": name,
+        "value": "value",
+        "domain": domain,
+        "path": "/",
+        "expires": expires,
+    }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SessionCache(str(tmp_path / "session.json"))
+
+
+def test_store_and_load(cache):
+    expires = time.time() + 60
+    cache.store(ORG, UNAME, ORIGIN, [cookie("a", expires)], STORAGE, "token")
+
+    session = cache.load(ORG, UNAME)
+
+    assert session["access_token"] == "token"
+    assert session["origin"] == ORIGIN
+    assert session["storage"] == STORAGE
+    assert session["expires_at"] == expires
+    assert cache.load(ORG, "someone else") is None
+    assert os.stat(cache.filename).st_mode & 0o777 == 0o600
+
+
+def test_expiry_of_other_cookies_is_ignored(cache):
+    expires = time.time() + 60 * 60
+    cookies = [
+        cookie("a", expires),
+        cookie("b", expires + 60, domain=".auth.asvz.ch"),
+        cookie("_gat", time.time() + 60, domain=".asvz.ch"),
+        cookie("_saml_idp", time.time() + 60, domain="wayf.switch.ch"),
+    ]
+    cache.store(ORG, UNAME, ORIGIN, cookies, STORAGE, "token")
+
+    assert cache.load(ORG, UNAME)["expires_at"] == expires
+
+
+def test_session_cookies_use_default_ttl(cache):
+    cache.store(ORG, UNAME, ORIGIN, [cookie("a", -1)], STORAGE, "token")
+    assert cache.load(ORG, UNAME)["expires_at"] > time.time() + 30 * 60
+
+
+def test_expired_session_is_dropped(cache):
+    cache.store(ORG, UNAME, ORIGIN, [cookie("a", time.time() - 1)], STORAGE, "token")
+
+    assert cache.load(ORG, UNAME) is None
+    assert cache.load(ORG, UNAME) is None
+
+
+def test_invalidate(cache):
+    cache.store(ORG, UNAME, ORIGIN, [], STORAGE, "token")
+    cache.invalidate(ORG, UNAME)
+    assert cache.load(ORG, UNAME) is None
+
+
+def test_corrupt_cache_is_ignored(cache):
+    with open(cache.filename, "w") as f:
+        f.write("{")
+    assert cache.load(ORG, UNAME) is None
+
+
+def test_schalter_client_loads_session(cache):
+    cache.store(ORG, UNAME, ORIGIN, [cookie("a", -1)], STORAGE, "token")
+    client = SchalterClient(ORIGIN + "/tn-api/api")
+
+    client.load_session(cache.load(ORG, UNAME))
+
+    assert client.session.headers["Authorization"] == "Bearer token"
+    assert client.session.cookies.get("a", domain="schalter.asvz.ch") == "value"
@@ -0,0 +1,244 @@
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+import asvz_bot
+from asvz_bot import (
+    AsvzEnroller,
+    LessonLookupCache,
+    LessonNotFoundException,
+    NoLessonOnDateException,
+    SportfahrplanResolver,
+    parse_and_validate_start_time,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+CREDS = {"organisation": "ETH Zürich", "username": "flbuetle", "password": "pw"}
+
+
+def sportfahrplan(base_url, lessons):
+    items = "".join(
+        """<li class="btn-hover-parent">
+            <a href="https://asvz.ch/some/teaser">Volleyball</a>
+            <span>{trainer}</span>
+            <a href="{base_url}/tn/lessons/{lesson_id}">Anmelden</a>
+        </li>""".format(
+            base_url=base_url, lesson_id=lesson_id, trainer=trainer
+        )
+        for lesson_id, trainer in lessons
+    )
+    return """<html><body>
+        <div class="teaser-list-calendar__day"><ul>{}</ul></div>
+        <div class="teaser-list-calendar__day"><ul>
+            <li class="btn-hover-parent"><a href="{}/tn/lessons/999">Anmelden</a></li>
+        </ul></div>
+    </body></html>""".format(
+        items, base_url
+    )
+
+
+def test_parse_lesson_url():
+    content = sportfahrplan(
+        asvz_bot.LESSON_BASE_URL, [(1, "Karin Hollenstein"), (2, "Max O'Neill")]
+    )
+
+    assert (
+        SportfahrplanResolver.parse_lesson_url(content, None)
+        == "https://schalter.asvz.ch/tn/lessons/1"
+    )
+    assert (
+        SportfahrplanResolver.parse_lesson_url(content, "Max O'Neill")
+        == "https://schalter.asvz.ch/tn/lessons/2"
+    )
+    with pytest.raises(LessonNotFoundException):
+        SportfahrplanResolver.parse_lesson_url(content, "Nobody")
+
+
+def test_parse_lesson_url_not_rendered():
+    assert (
+        SportfahrplanResolver.parse_lesson_url("<html><body></body></html>", None)
+        is None
+    )
+
+
+def test_lookup_cache(tmp_path):
+    cache = LessonLookupCache(str(tmp_path / "lookup.json"))
+    key = LessonLookupCache.key(
+        45743, "Sport Center Hönggerberg", None, datetime(2023, 12, 11, 18, 15), None
+    )
+
+    assert cache.get(key) is None
+    cache.store(key, "https://schalter.asvz.ch/tn/lessons/1")
+    assert cache.get(key) == "https://schalter.asvz.ch/tn/lessons/1"
+
+
+def test_lookup_cache_expires(tmp_path):
+    cache = LessonLookupCache(str(tmp_path / "lookup.json"), ttl=-1)
+    cache.store("key", "https://schalter.asvz.ch/tn/lessons/1")
+    assert cache.get("key") is None
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    with FakeAsvz() as fake:
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        monkeypatch.setattr(asvz_bot, "SPORTFAHRPLAN_BASE_URL", fake.sportfahrplan_url)
+        yield fake
+
+
+def resolve(resolver, lesson_start):
+    return AsvzEnroller.from_lesson_attributes(
+        None,
+        "Mo",
+        parse_and_validate_start_time(lesson_start.strftime("%H:%M")),
+        "Karin Hollenstein",
+        "Sport Center Hönggerberg",
+        None,
+        45743,
+        None,
+        CREDS,
+        lesson_date=lesson_start,
+        resolver=resolver,
+    )
+
+
+def test_from_lesson_attributes(fake, tmp_path):
+    lesson_start = (datetime.today() + timedelta(days=2)).replace(
+        hour=18, minute=15, second=0, microsecond=0
+    )
+    fake.add_lesson(2, FakeLesson(lesson_start - timedelta(days=1), lesson_start, 10))
+    fake.sportfahrplan_html = sportfahrplan(
+        fake.base_url, [(1, "Someone Else"), (2, "Karin Hollenstein")]
+    )
+    resolver = SportfahrplanResolver(cache=LessonLookupCache(str(tmp_path / "l.json")))
+
+    enroller = resolve(resolver, lesson_start)
+    assert enroller.lesson_url == fake.lesson_url(2)
+
+    # the second lookup is answered by the cache
+    fake.sportfahrplan_html = None
+    enroller = resolve(resolver, lesson_start)
+    assert enroller.lesson_url == fake.lesson_url(2)
+
+
+def test_from_lesson_attributes_on_holiday(fake):
+    lesson_start = (datetime.today() + timedelta(days=2)).replace(
+        hour=18, minute=15, second=0, microsecond=0
+    )
+    # the Sportfahrplan lists the lesson of the next day instead
+    next_lesson_start = lesson_start + timedelta(days=1)
+    fake.add_lesson(
+        2, FakeLesson(next_lesson_start - timedelta(days=1), next_lesson_start, 10)
+    )
+    fake.sportfahrplan_html = sportfahrplan(fake.base_url, [(2, "Karin Hollenstein")])
+
+    with pytest.raises(NoLessonOnDateException):
+        resolve(SportfahrplanResolver(), lesson_start)
+
+
+TRAINING = {
+    "weekday": "Mo",
+    "start_time": parse_and_validate_start_time("18:15"),
+    "trainer": "Karin Hollenstein",
+    "facility": "Sport Center Hönggerberg",
+    "level": None,
+    "sport_id": 45743,
+}
+
+
+def add_training_lessons(fake, weeks, skipped_weeks=()):
+    """
+    Adds the weekly lessons of TRAINING and returns their start times, including the skipped weeks.
+    """
+    after = datetime.today()
+    lesson_starts = []
+    for week in range(weeks):
+        lesson_date = asvz_bot.next_training_date("Mo", TRAINING["start_time"], after)
+        after = datetime.combine(lesson_date, TRAINING["start_time"].time())
+        lesson_starts.append(after)
+        if week in skipped_weeks:
+            continue
+        for lesson_id, lesson_start, trainer in [
+            (week * 10 + 1, after, "Karin Hollenstein"),
+            (week * 10 + 2, after + timedelta(hours=1), "Karin Hollenstein"),
+            (week * 10 + 3, after, "Max Muster"),
+        ]:
+            fake.add_lesson(
+                lesson_id,
+                FakeLesson(
+                    lesson_start - timedelta(days=6),
+                    lesson_start,
+                    10,
+                    sport_id=TRAINING["sport_id"],
+                    facility_id=asvz_bot.FACILITIES[TRAINING["facility"]],
+                    trainer=trainer,
+                ),
+            )
+    return lesson_starts
+
+
+def test_find_training_lessons(fake, tmp_path):
+    lesson_starts = add_training_lessons(fake, 4, skipped_weeks=[1])
+    resolver = SportfahrplanResolver(cache=LessonLookupCache(str(tmp_path / "l.json")))
+
+    occurrences = asvz_bot.find_training_lessons(
+        resolver, TRAINING, datetime.today(), 4
+    )
+
+    assert [o.lesson_start for o in occurrences] == lesson_starts
+    assert [o.lesson_url for o in occurrences] == [
+        fake.lesson_url(1),
+        None,
+        fake.lesson_url(21),
+        fake.lesson_url(31),
+    ]
+    assert occurrences[0].enrollment_start == lesson_starts[0] - timedelta(days=6)
+
+
+def test_find_training_lessons_cached(fake, tmp_path):
+    add_training_lessons(fake, 2)
+    resolver = SportfahrplanResolver(cache=LessonLookupCache(str(tmp_path / "l.json")))
+    asvz_bot.find_training_lessons(resolver, TRAINING, datetime.today(), 2)
+
+    # the second lookup is answered by the cache
+    fake.sportfahrplan_html = "<html><body></body></html>"
+    occurrences = asvz_bot.find_training_lessons(
+        resolver, TRAINING, datetime.today(), 2
+    )
+    assert [o.lesson_url for o in occurrences] == [
+        fake.lesson_url(1),
+        fake.lesson_url(11),
+    ]
+
+
+def test_from_next_training_skips_holidays(fake):
+    add_training_lessons(fake, 3, skipped_weeks=[0, 1])
+
+    enroller = AsvzEnroller.from_next_training(
+        None, TRAINING, None, CREDS, weeks=3, resolver=SportfahrplanResolver()
+    )
+    assert enroller.lesson_url == fake.lesson_url(21)
+
+    with pytest.raises(NoLessonOnDateException):
+        AsvzEnroller.from_next_training(
+            None, TRAINING, None, CREDS, weeks=2, resolver=SportfahrplanResolver()
+        )
+
+
+def test_find_training_lessons_network_error(fake, monkeypatch):
+    add_training_lessons(fake, 3)
+    get_lesson = asvz_bot.SchalterClient.get_lesson
+
+    def flaky_get_lesson(client, api_path):
+        if api_path == "Lessons/1":
+            raise requests.ConnectionError("connection reset")
+        return get_lesson(client, api_path)
+
+    monkeypatch.setattr(asvz_bot.SchalterClient, "get_lesson", flaky_get_lesson)
+
+    # the lesson of the first week is not taken for a holiday
+    with pytest.raises(requests.ConnectionError):
+        AsvzEnroller.from_next_training(
+            None, TRAINING, None, CREDS, weeks=3, resolver=SportfahrplanResolver()
+        )
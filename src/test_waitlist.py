@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+import asvz_bot
+from asvz_bot import (
+    ENROLLMENT_STATUS_ENROLLED,
+    AsvzBotException,
+    RequestBudget,
+    SchalterClient,
+    WaitlistWatcher,
+    load_waitlist,
+)
+from fake_asvz import FakeAsvz, FakeLesson
+
+ACCESS_TOKEN = "secret-token"
+
+
+def write_waitlist(tmp_path, data):
+    filename = tmp_path / "waitlist.json"
+    filename.write_text(json.dumps(data))
+    return str(filename)
+
+
+def test_load_waitlist(tmp_path):
+    groups, requests_per_minute = load_waitlist(
+        write_waitlist(
+            tmp_path,
+            {
+                "requests_per_minute": 30,
+                "groups": [
+                    {
+                        "name": "Volleyball",
+                        "jobs": [
+                            {"type": "lesson", "lesson_id": 1},
+                            {"type": "lesson", "lesson_id": "2"},
+                        ],
+                    }
+                ],
+                "jobs": [{"type": "event", "event_id": 3}],
+            },
+        )
+    )
+
+    assert requests_per_minute == 30
+    assert groups == [
+        {
+            "name": "Volleyball",
+            "take": 1,
+            "jobs": [
+                {"type": "lesson", "lesson_id": 1},
+                {"type": "lesson", "lesson_id": 2},
+            ],
+        },
+        {"name": None, "take": 1, "jobs": [{"type": "event", "event_id": 3}]},
+    ]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {},
+        {"groups": [{"jobs": []}]},
+        {"groups": [{"take": 2, "jobs": [{"type": "lesson", "lesson_id": 1}]}]},
+        {"jobs": [{"type": "lesson"}]},
+        {
+            "jobs": [
+                {
+                    "type": "training",
+                    "weekday": "Mo",
+                    "start_time": "18:15",
+                    "facility": "Sport Center Hönggerberg",
+                    "sport_id": 45743,
+                }
+            ]
+        },
+        {"requests_per_minute": 0, "jobs": [{"type": "lesson", "lesson_id": 1}]},
+    ],
+)
+def test_load_invalid_waitlist(tmp_path, data):
+    with pytest.raises(AsvzBotException):
+        load_waitlist(write_waitlist(tmp_path, data))
+
+
+def test_request_budget():
+    budget = RequestBudget(requests_per_minute=600, burst=1)
+    started = time.monotonic()
+    for _ in range(3):
+        budget.acquire()
+    assert time.monotonic() - started >= 0.15
+
+    # an enrollment is never delayed, but the next poll waits for it
+    budget.charge()
+    started = time.monotonic()
+    budget.acquire()
+    assert time.monotonic() - started >= 0.05
+
+
+def test_watch_group(monkeypatch):
+    monkeypatch.setattr(asvz_bot, "FREE_PLACES_MIN_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(asvz_bot, "FREE_PLACES_MAX_POLL_SECONDS", 0.05)
+    now = datetime.today()
+
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        lessons = [
+            fake.add_lesson(
+                lesson_id,
+                FakeLesson(now - timedelta(hours=1), now + timedelta(hours=1), 10, 10),
+            )
+            for lesson_id in (1, 2)
+        ]
+        started = fake.add_lesson(
+            3, FakeLesson(now - timedelta(hours=2), now - timedelta(minutes=1), 10, 10)
+        )
+
+        # a participant of the second lesson cancels after a while
+        def cancel():
+            lessons[1].participants -= 1
+
+        timer = threading.Timer(0.2, cancel)
+        timer.start()
+
+        client = SchalterClient(fake.api_base_url)
+        watcher = WaitlistWatcher(
+            [
+                {
+                    "name": "Volleyball",
+                    "take": 1,
+                    "jobs": [
+                        {"type": "lesson", "lesson_id": 1},
+                        {"type": "lesson", "lesson_id": 2},
+                    ],
+                },
+                {"name": None, "take": 1, "jobs": [{"type": "lesson", "lesson_id": 3}]},
+            ],
+            client,
+            lambda use_cache: ACCESS_TOKEN,
+            requests_per_minute=6000,
+        )
+
+        assert not watcher.run()
+        timer.join()
+
+    first, second, third = watcher.lessons
+    assert first.result == "skipped"
+    assert second.result.status == ENROLLMENT_STATUS_ENROLLED
+    assert isinstance(third.result, AsvzBotException)
+    assert lessons[1].enrollments == {ACCESS_TOKEN: 10}
+    assert not started.requests
+
+
+def test_watch_enroll_network_error(monkeypatch):
+    monkeypatch.setattr(asvz_bot, "FREE_PLACES_MIN_POLL_SECONDS", 0.01)
+    now = datetime.today()
+
+    with FakeAsvz() as fake:
+        fake.access_tokens.add(ACCESS_TOKEN)
+        monkeypatch.setattr(asvz_bot, "LESSON_BASE_URL", fake.base_url)
+        lesson = fake.add_lesson(
+            1, FakeLesson(now - timedelta(hours=1), now + timedelta(hours=1), 10)
+        )
+
+        client = SchalterClient(fake.api_base_url)
+        enroll = SchalterClient.enroll
+        failures = [requests.ReadTimeout("read timed out")]
+
+        def flaky_enroll(api_path):
+            if failures:
+                raise failures.pop()
+            return enroll(client, api_path)
+
+        monkeypatch.setattr(client, "enroll", flaky_enroll)
+        watcher = WaitlistWatcher(
+            [{"name": None, "take": 1, "jobs": [{"type": "lesson", "lesson_id": 1}]}],
+            client,
+            lambda use_cache: ACCESS_TOKEN,
+            requests_per_minute=6000,
+        )
+
+        # the failed enrollment request is retried with the next poll
+        assert watcher.run()
+
+    assert watcher.lessons[0].result.status == ENROLLMENT_STATUS_ENROLLED
+    assert lesson.enrollments == {ACCESS_TOKEN: 1}